@@ -3,11 +3,14 @@ from tkinter import ttk
 import requests
 import json
 import os
+import threading
+from expense_core.storage import iter_json_array
+from expense_core.totals import CurrencyTotals
 
 def fetch_exchange_rates():
     url = "https://api.exchangerate-api.com/v4/latest/USD" 
     try:
-        response = requests.get(url)
+        response = requests.get(url, timeout=5)
         if response.status_code == 200:
             data = response.json()
             return data.get("rates", {})
@@ -19,7 +22,22 @@ def fetch_exchange_rates():
         return {}
 
 
-RATES_TO_USD = fetch_exchange_rates()
+# filled in by a background thread so the window doesn't wait on the network
+RATES_TO_USD = {}
+rates_ready = threading.Event()
+
+def fetch_rates_in_background():
+    def worker():
+        RATES_TO_USD.update(fetch_exchange_rates())
+        rates_ready.set()
+    threading.Thread(target=worker, daemon=True).start()
+
+# poll from the Tk loop; Tk itself must only be touched from this thread
+def wait_for_rates():
+    if rates_ready.is_set():
+        update_total()
+    else:
+        window.after(200, wait_for_rates)
 
 def convert_to_usd(amount_str, currency_code):
     try:
@@ -35,7 +53,12 @@ def convert_to_usd(amount_str, currency_code):
 # save & load by json 
 DATA_FILE = "expenses.json"
 
-def save_expenses():
+SAVE_DELAY_MS = 300        # changes within this window are saved once
+save_job = None
+save_thread = None
+save_lock = threading.Lock()
+
+def collect_expenses():
     expenses = []
     for iid in expense_table.get_children():
         values = expense_table.item(iid, "values")
@@ -47,17 +70,96 @@ def save_expenses():
             "category": values[2],
             "payment": values[3]
         })
-    with open(DATA_FILE, "w") as f:
-        json.dump(expenses, f)
+    return expenses
+
+def write_expenses(expenses):
+    # temp file + fsync + rename: a crash leaves the old file intact
+    with save_lock:
+        tmp = DATA_FILE + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(expenses, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, DATA_FILE)
+        except Exception as e:
+            print("Error saving:", e)
+
+def save_expenses():
+    # debounce: (re)start the timer, write once the edits stop
+    global save_job
+    if save_job is not None:
+        window.after_cancel(save_job)
+    save_job = window.after(SAVE_DELAY_MS, save_in_background)
+
+def save_in_background():
+    global save_job, save_thread
+    if loading:
+        # don't save a half-loaded table; try again later
+        save_job = window.after(SAVE_DELAY_MS, save_in_background)
+        return
+    save_job = None
+    expenses = collect_expenses()   # read the table on the Tk thread
+    save_thread = threading.Thread(target=write_expenses, args=(expenses,), daemon=True)
+    save_thread.start()
+
+def on_close():
+    # flush a pending save before exiting
+    if loading:
+        # read the rest of the file first, so the save keeps the rows
+        # that weren't in the table yet
+        window.after_cancel(load_job)
+        load_chunk(*load_args, limit=None)
+    if save_job is not None:
+        window.after_cancel(save_job)
+        write_expenses(collect_expenses())
+    elif save_thread is not None:
+        save_thread.join()  # a write that is still running
+    window.destroy()
+
+# running per-currency sums of the rows in the table
+totals = CurrencyTotals()
+
+LOAD_CHUNK = 500           # rows inserted per event-loop turn while loading
+loading = False
+load_job = None
+load_args = None
 
 def load_expenses():
+    # parse the file incrementally and insert it a chunk at a time from the
+    # event loop, so the window shows up straight away
+    global loading, load_job, load_args
     if not os.path.exists(DATA_FILE):
         return
-    with open(DATA_FILE, "r") as f:
-        expenses = json.load(f)
-    for expense in expenses:
-        expense_table.insert("", "end", values=(expense["amount"], expense["currency"],
-                                                expense["category"], expense["payment"]))
+    f = open(DATA_FILE, "r")
+    loading = True
+    load_args = (f, iter_json_array(f), 0)
+    load_job = window.after(1, load_chunk, *load_args)
+
+def load_chunk(f, expenses, count, limit=LOAD_CHUNK):
+    # limit=None reads everything that is left
+    global loading, load_job, load_args
+    remove_total_row()
+    stop = None if limit is None else count + limit
+    try:
+        while stop is None or count < stop:
+            expense = next(expenses)
+            expense_table.insert("", "end", values=(expense["amount"], expense["currency"],
+                                                    expense["category"], expense["payment"]))
+            totals.add(expense["amount"], expense["currency"])
+            count += 1
+    except StopIteration:
+        pass
+    except ValueError as e:
+        print("Error loading expenses:", e)
+    else:
+        expense_table.insert("", "end", values=("LOADING", f"{count} rows", "", ""), tags=("total",))
+        load_args = (f, expenses, count)
+        load_job = window.after(1, load_chunk, *load_args)
+        return
+    f.close()
+    loading = False
+    update_total()
         
 
 #create main window 
@@ -167,17 +269,7 @@ def remove_total_row():
 # update total
 def update_total():
     remove_total_row()
-    total_usd = 0.0
-    for iid in expense_table.get_children():
-
-        if "total" in expense_table.item(iid, "tags"):
-            continue
-        vals = expense_table.item(iid, "values")
-        if not vals:
-            continue
-        amount_str = vals[0]
-        currency_code = vals[1]
-        total_usd += convert_to_usd(amount_str, currency_code)
+    total_usd = totals.total_usd(convert_to_usd)
 
     expense_table.insert("", "end",
                          values=("TOTAL", f"{total_usd:.2f}", "USD", ""),
@@ -207,6 +299,7 @@ def add_expense():
 
     remove_total_row()
     expense_table.insert("", "end", values=(amount, currency, category, payment))
+    totals.add(amount, currency)
 
 
     amount_entry.delete(0, tk.END)
@@ -230,6 +323,8 @@ def delete_expense():
 
         if "total" in expense_table.item(iid, "tags"):
             continue
+        vals = expense_table.item(iid, "values")
+        totals.remove(vals[0], vals[1])
         expense_table.delete(iid)
 
     update_total()
@@ -240,5 +335,8 @@ delete_button.config(command=delete_expense)
 
 load_expenses()
 update_total()
+fetch_rates_in_background()
+wait_for_rates()
+window.protocol("WM_DELETE_WINDOW", on_close)
 
 window.mainloop()
\ No newline at end of file
@@ -1,86 +1,22 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import requests
-import json
+from tkinter import ttk, messagebox, filedialog
 import os
-import uuid
-from datetime import date
-
-# ============================================================
-# Configuration
-# ============================================================
-DATA_FILE = "expenses.json"          # persisted data
-API_URL   = "https://api.exchangerate-api.com/v4/latest/USD"
-
-# currencies offered in UI (first item blank = no selection)
-UI_CURRENCIES = ["", "USD", "GBP", "EUR", "EGP", "EURO"]  # EURO auto-mapped -> EUR
-UI_CATEGORIES = [
-    "", "Life expense", "Electricity", "Gas", "Rental",
-    "Grocery", "Saving", "Education", "Charity"
-]
-UI_PAYMENTS   = ["", "Cash", "Credit Card", "Paypal"]
-
-
-# ============================================================
-# Helpers
-# ============================================================
-def normalize_currency(code: str) -> str:
-    """Map UI value to API/standard 3-letter code."""
-    code = (code or "").strip().upper()
-    if code == "EURO":
-        return "EUR"
-    return code
-
-
-def safe_float(s, default=0.0):
-    try:
-        return float(s)
-    except Exception:
-        return default
-
-
-# ============================================================
-# Exchange Rates Manager
-# ============================================================
-class RateManager:
-    def __init__(self, url=API_URL):
-        self.url = url
-        self.rates = {"USD": 1.0}  # fallback minimal
-        # some fallback guesses in case offline
-        self.fallback = {"USD": 1.0, "GBP": 1.30, "EUR": 1.10, "EGP": 0.020}
-
-    def fetch(self):
-        try:
-            resp = requests.get(self.url, timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
-                rates = data.get("rates", {})
-                if isinstance(rates, dict) and rates:
-                    self.rates = rates
-                    return True
-            # fallthrough -> use fallback
-        except Exception as e:
-            print("Rate fetch error:", e)
-        # fallback
-        self.rates = self.fallback.copy()
-        return False
-
-    def to_usd(self, amount, currency):
-        """Convert an amount *in currency* to USD."""
-        amount = safe_float(amount, 0.0)
-        c = normalize_currency(currency)
-        if c == "USD":
-            return amount
-        rate = self.rates.get(c)
-        if not rate:
-            # unknown currency -> try fallback -> still maybe 0
-            rate = self.fallback.get(c, 0)
-        if not rate:
-            return 0.0
-        # API: 1 USD = rate (units of currency)
-        # amount is in currency; USD = amount / rate
-        return amount / rate
-
+import queue
+from datetime import date, datetime, timedelta
+
+from expense_core import (Ledger, SAVE_DELAY_SECONDS, UI_CATEGORIES, UI_CURRENCIES, UI_IMPORT_BATCH, UI_PAYMENTS,
+                          UI_REPEATS, day_ordinal, normalize_currency, safe_float)
+from expense_core import profiling
+from expense_core.client import RemoteLedger, server_address
+from expense_core.exporter import ExportJob
+from expense_core.importer import AmbiguousDates, import_chunks
+from expense_core.metrics import dump_on_exit, metrics
+from chart_panel import ChartPanel
+from metrics_panel import MetricsPanel
+from budget_panel import BudgetPanel
+from recurring_panel import RecurringPanel
+from report_panel import ReportPanel
+from virtual_table import VirtualTable
 
 # ============================================================
 # ExpenseTrackerApp
@@ -89,24 +25,60 @@ class ExpenseTrackerApp:
     def __init__(self, root=None):
         self.root = root or tk.Tk()
         self.root.title("Expense Tracker")
-        self.root.geometry("780x640")
+        self.root.geometry("1200x660")
+
+        # callbacks posted from worker threads, run on the Tk thread
+        self._ui_queue = queue.Queue()
+
+        # all data lives in the GUI-free ledger (expense_core); changes are
+        # written by its background saver, never on the Tk thread. With a
+        # server address set (EXPENSE_SERVER), the ledger is a shared one
+        # served by `python -m expense_core serve` and every handler below
+        # becomes a request to it.
+        address = server_address()
+        if address:
+            self.ledger = RemoteLedger(address, dispatch=self._call_in_ui)
+        else:
+            self.ledger = Ledger(save_delay=SAVE_DELAY_SECONDS)
+        self.ledger.subscribe(self._on_ledger_changed)
+        self.ledger.on_saved = self._on_saved
 
-        # rate manager
-        self.rate_mgr = RateManager()
-        self.rate_online = self.rate_mgr.fetch()  # fetch once at startup
+        # rate manager: start on cached/fallback rates, fetch in the background
+        self.rate_mgr = self.ledger.rate_mgr
+        self.rate_online = False
 
         # editing state
         self.editing_expense_id = None  # None means we're adding new
+        self._loader = None             # ledger.open_chunks() while loading
+        self.report_panel = None        # ReportPanel while its window is open
+        self.chart_panel = None         # ChartPanel while its window is open
+        self.budget_panel = None        # BudgetPanel while its window is open
+        self.recurring_panel = None     # RecurringPanel while its window is open
+        self._recurring_job = None      # the after-midnight apply_recurring()
+        self._budget_tags = {}          # (category, month) -> row tags, until the next change
+        self._budget_wanted = set()     # keys a render asked for, looked up after it
+        self._today = date.today().isoformat()   # rows dated later are tagged "upcoming"
+        self.export_job = None          # ExportJob while an export runs
+        self.metrics_panel = None       # MetricsPanel (F12) while open
+        self.filter_ids = None          # ids matching the filter bar, None = no filter
+        self._filter_job = None
+        self.sort_column = None         # table column the rows are sorted by
+        self.sort_desc = False
 
         # build UI
         self._build_inputs()
         self._build_buttons()
+        self._build_filter_bar()
         self._build_table()
         self._build_statusbar()
 
-        # load persisted data
+        # load persisted data (in chunks, after the window is up)
         self._load_expenses_from_file()
-        self._update_total_row()
+
+        self._drain_ui_queue()
+        self.rate_mgr.fetch_async(self._on_rates_fetched)
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.root.bind("<F12>", lambda _e: self._on_metrics())
 
     # ---------------- UI builders ----------------
     def _build_inputs(self):
@@ -122,8 +94,9 @@ class ExpenseTrackerApp:
         # Currency
         ttk.Label(f, text="Currency", font=("Arial", 12)).grid(row=1, column=0, sticky="w", padx=5, pady=3)
         self.currency_var = tk.StringVar()
-        ttk.Combobox(f, textvariable=self.currency_var, values=UI_CURRENCIES, state="readonly", width=18)\
-            .grid(row=1, column=1, padx=5, pady=3)
+        self.currency_combo = ttk.Combobox(f, textvariable=self.currency_var, values=UI_CURRENCIES,
+                                           state="readonly", width=18)
+        self.currency_combo.grid(row=1, column=1, padx=5, pady=3)
         self.currency_var.set("")
 
         # Category
@@ -149,6 +122,13 @@ class ExpenseTrackerApp:
         # Today shortcut
         ttk.Button(f, text="Today", command=self._fill_today).grid(row=4, column=2, padx=5, pady=3)
 
+        # Repeat: a recurring expense starting on Date (an RRULE such as
+        # FREQ=WEEKLY;BYDAY=MO,TH can be typed in)
+        ttk.Label(f, text="Repeat", font=("Arial", 12)).grid(row=5, column=0, sticky="w", padx=5, pady=3)
+        self.repeat_var = tk.StringVar()
+        ttk.Combobox(f, textvariable=self.repeat_var, values=UI_REPEATS, width=18)\
+            .grid(row=5, column=1, padx=5, pady=3)
+
     def _build_buttons(self):
         bf = ttk.Frame(self.root, padding=(10, 5))
         bf.pack(pady=5)
@@ -169,35 +149,113 @@ class ExpenseTrackerApp:
         self.clear_btn = tk.Button(bf, text="Clear All", width=10, bg="#FF9800", fg="white", command=self._on_clear_all)
         self.clear_btn.grid(row=0, column=4, padx=5)
 
+        self.recat_btn = tk.Button(bf, text="Recategorize", width=12, bg="#607D8B", fg="white", command=self._on_recategorize)
+        self.recat_btn.grid(row=0, column=5, padx=5)
+
+        self.report_btn = tk.Button(bf, text="Reports", width=10, bg="#795548", fg="white", command=self._on_reports)
+        self.report_btn.grid(row=0, column=6, padx=5)
+
+        self.import_btn = tk.Button(bf, text="Import...", width=10, bg="#009688", fg="white", command=self._on_import)
+        self.import_btn.grid(row=0, column=7, padx=5)
+
+        self.export_btn = tk.Button(bf, text="Export...", width=10, bg="#3F51B5", fg="white", command=self._on_export)
+        self.export_btn.grid(row=0, column=8, padx=5)
+
+        self.chart_btn = tk.Button(bf, text="Chart", width=10, bg="#00BCD4", fg="white", command=self._on_chart)
+        self.chart_btn.grid(row=0, column=9, padx=5)
+
+        self.budget_btn = tk.Button(bf, text="Budgets", width=10, bg="#8BC34A", fg="white", command=self._on_budgets)
+        self.budget_btn.grid(row=0, column=10, padx=5)
+
+        self.recurring_btn = tk.Button(bf, text="Recurring", width=10, bg="#FF5722", fg="white",
+                                       command=self._on_recurring)
+        self.recurring_btn.grid(row=0, column=11, padx=5)
+
+    def _build_filter_bar(self):
+        ff = ttk.Frame(self.root, padding=(10, 0))
+        ff.pack(fill="x")
+        self.filter_frame = ff
+
+        # every change re-queries the ledger's inverted indexes
+        ttk.Label(ff, text="Filter:").grid(row=0, column=0, padx=(0, 5))
+        self.filter_vars = {}
+        self.filter_combos = {}
+        col = 1
+        for key, label, values in (("category", "Category", UI_CATEGORIES),
+                                   ("payment", "Payment", UI_PAYMENTS),
+                                   ("currency", "Currency", UI_CURRENCIES)):
+            ttk.Label(ff, text=label).grid(row=0, column=col, padx=(5, 2))
+            var = tk.StringVar()
+            combo = ttk.Combobox(ff, textvariable=var, values=values, state="readonly", width=12)
+            combo.grid(row=0, column=col + 1)
+            self.filter_vars[key] = var
+            self.filter_combos[key] = combo
+            col += 2
+        for key, label, width in (("amount", "Amount", 8), ("date", "Date", 10)):
+            ttk.Label(ff, text=label).grid(row=0, column=col, padx=(5, 2))
+            var = tk.StringVar()
+            ttk.Entry(ff, textvariable=var, width=width).grid(row=0, column=col + 1)
+            self.filter_vars[key] = var
+            col += 2
+        ttk.Button(ff, text="Clear", width=6, command=self._clear_filter).grid(row=0, column=col, padx=5)
+
+        # date range (binary search on the sorted date index)
+        col = 1
+        for key, label in (("date_from", "From"), ("date_to", "To")):
+            ttk.Label(ff, text=label).grid(row=1, column=col, padx=(5, 2), pady=(3, 0))
+            var = tk.StringVar()
+            ttk.Entry(ff, textvariable=var, width=12).grid(row=1, column=col + 1, pady=(3, 0))
+            self.filter_vars[key] = var
+            col += 2
+        for var in self.filter_vars.values():
+            var.trace_add("write", lambda *_: self._schedule_filter())
+
+        # "last N days" total, from the per-day running totals
+        ttk.Label(ff, text="Last").grid(row=1, column=col, padx=(5, 2), pady=(3, 0))
+        self.recent_days_var = tk.StringVar(value="30")
+        days = ttk.Combobox(ff, textvariable=self.recent_days_var, values=("7", "30", "90", "365"),
+                            state="readonly", width=5)
+        days.grid(row=1, column=col + 1, pady=(3, 0))
+        days.bind("<<ComboboxSelected>>", lambda _e: self._update_recent_total())
+        self.recent_label = ttk.Label(ff, text="")
+        self.recent_label.grid(row=1, column=col + 2, columnspan=4, sticky="w", padx=5, pady=(3, 0))
+
+        # display currency of every total; offers whatever the rate table has
+        ttk.Label(ff, text="Show in").grid(row=1, column=col + 6, padx=(5, 2), pady=(3, 0))
+        self.display_currency_var = tk.StringVar(value=self.ledger.display_currency)
+        self.display_combo = ttk.Combobox(ff, textvariable=self.display_currency_var,
+                                          values=self.rate_mgr.currencies(), state="readonly", width=6)
+        self.display_combo.grid(row=1, column=col + 7, pady=(3, 0))
+        self.display_combo.bind("<<ComboboxSelected>>", lambda _e: self._on_display_currency())
+
     def _build_table(self):
         tf = ttk.Frame(self.root, padding=(10, 5))
         tf.pack(pady=10, fill="both", expand=True)
         self.table_frame = tf
 
-        cols = ("Amount", "Currency", "Category", "Payment")
-        tv = ttk.Treeview(tf, columns=cols, show="headings", height=10)
-        for c in cols:
-            tv.heading(c, text=c)
-            tv.column(c, width=150, anchor="center")
-        tv.pack(fill="both", expand=True)
-        self.expense_table = tv
-
-        # vertical scrollbar
-        vsb = ttk.Scrollbar(tf, orient="vertical", command=tv.yview)
-        tv.configure(yscroll=vsb.set)
-        vsb.pack(side="right", fill="y")
-
-        # tag styling
-        tv.tag_configure("total", background="yellow", font=("Arial", 12, "bold"))
+        # only the rows on screen exist as Treeview items; the table
+        # asks _row_values for each visible expense id
+        cols = ("Amount", "Currency", "Category", "Payment", "Date")
+        table = VirtualTable(tf, cols, self._row_values, height=10, sort_command=self._on_sort,
+                             end_command=self._on_table_end, row_tags=self._row_tags)
+        self.expense_table = table
+
+        # tag styling (TOTAL lives in the pinned footer row); rows whose
+        # category is over / near its budget for their month
+        table.footer.tag_configure("total", background="yellow", font=("Arial", 12, "bold"))
+        table.tree.tag_configure("over", background="#FFCDD2")
+        table.tree.tag_configure("near", background="#FFF9C4")
+        # rows dated after today (e.g. coming recurring expenses)
+        table.tree.tag_configure("upcoming", foreground="gray50")
 
         # double-click row triggers edit
-        tv.bind("<Double-1>", self._on_double_click_row)
+        table.tree.bind("<Double-1>", self._on_double_click_row)
 
     def _build_statusbar(self):
         sb = tk.Label(self.root, text="", anchor="w", relief="sunken")
         sb.pack(fill="x", side="bottom")
         self.status_bar = sb
-        self._set_status("Ready." if self.rate_online else "Using fallback currency rates (offline).")
+        self._set_status("Fetching exchange rates...")
 
     # ---------------- Placeholder & Today ----------------
     def _set_date_placeholder(self):
@@ -226,81 +284,266 @@ class ExpenseTrackerApp:
     def _set_status(self, msg):
         self.status_bar.config(text=msg)
 
+    # ---------------- Worker thread bridge ----------------
+    def _call_in_ui(self, fn, *args):
+        """Queue fn(*args) to run on the Tk thread (safe from any thread)."""
+        self._ui_queue.put((fn, args))
+
+    def _drain_ui_queue(self):
+        try:
+            while True:
+                fn, args = self._ui_queue.get_nowait()
+                fn(*args)
+        except queue.Empty:
+            pass
+        self.root.after(50, self._drain_ui_queue)
+
     # ============================================================
-    # Data storage: we keep a dict expense_id -> record in memory
-    # record = {id, amount, currency, category, payment, date}
-    # Treeview item iid maps to expense id via self._tree_id_to_expense_id
+    # Data: self.ledger (expense_core.Ledger) owns the records, the
+    # running totals and persistence; record = {id, amount, currency,
+    # category, payment, date}. The table holds expense ids in display
+    # order (see VirtualTable).
     # ============================================================
-    def _init_storage(self):
-        self.expenses = {}  # expense_id -> record
-        self._tree_id_to_expense_id = {}  # tree iid -> expense_id
-
-    # load from file called in __init__
+    # load from file called in __init__: one chunk per event-loop turn, so
+    # the window can be scrolled while a large ledger is still loading
     def _load_expenses_from_file(self):
-        self._init_storage()
-        if not os.path.exists(DATA_FILE):
-            self._set_status("No saved data found.")
-            return
+        self._set_loading(True)
+        self._loader = self.ledger.open_chunks()
+        self.root.after(1, self._load_next_chunk)
+
+    @metrics.timed("ui.load_chunk")
+    def _load_next_chunk(self):
         try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            changes = next(self._loader)
+        except StopIteration:
+            self._finish_loading()
+            return
         except Exception as e:
+            self._loader = None
+            self._set_loading(False)
             self._set_status(f"Error loading file: {e}")
             return
-        count = 0
-        for rec in data:
-            # backwards compatibility with old structure (no id)
-            exp_id = rec.get("id") or str(uuid.uuid4())
-            amount = rec.get("amount", "")
-            currency = normalize_currency(rec.get("currency", ""))
-            category = rec.get("category", "")
-            payment = rec.get("payment", "")
-            date_str = rec.get("date", "")
-            iid = self.expense_table.insert("", "end",
-                                            values=(amount, currency, category, payment))
-            self._tree_id_to_expense_id[iid] = exp_id
-            self.expenses[exp_id] = {
-                "id": exp_id,
-                "amount": amount,
-                "currency": currency,
-                "category": category,
-                "payment": payment,
-                "date": date_str,
-            }
-            count += 1
+        self._apply_table_changes(changes)
+        count = len(self.ledger)
+        progress = self.ledger.storage.load_progress
+        done = f" ({progress:.0%})" if progress is not None else ""
+        self.expense_table.set_footer(("LOADING", f"{count} rows{done}", "", "", ""), tags=("total",))
+        self._set_status(f"Loading expenses... {count}{done}")
+        self.root.after(1, self._load_next_chunk)
+
+    def _finish_loading(self):
+        self._loader = None
+        self._set_loading(False)
+        self._apply_recurring()
+        if self._filter_values() or self.sort_column:
+            self._apply_filter()
+        self._update_total_row()
+        self._refresh_report()
+        count = len(self.ledger)
+        older = self.ledger.count() - count
+        if not count and not older:
+            self._set_status("No saved data found.")
+            return
+        if older:
+            self._set_status(f"Loaded {count} recent expenses; {older} older ones load as you scroll.")
+            return
         self._set_status(f"Loaded {count} expenses from file.")
 
-    def _save_expenses_to_file(self):
-        data = list(self.expenses.values())
-        try:
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-            self._set_status(f"Saved {len(data)} expenses.")
-        except Exception as e:
-            self._set_status(f"Error saving: {e}")
+    def _set_loading(self, loading):
+        # no edits until the ledger is complete
+        state = "disabled" if loading else "normal"
+        for btn in (self.add_btn, self.delete_btn, self.recat_btn, self.clear_btn, self.report_btn,
+                    self.import_btn, self.chart_btn, self.budget_btn, self.recurring_btn):
+            btn.config(state=state)
+
+    def _on_saved(self, error, _count):
+        # called on the saver thread
+        self._call_in_ui(self._show_saved, error)
+
+    def _show_saved(self, error):
+        if error is not None:
+            self._set_status(f"Error saving: {error}")
+        elif not self.ledger.writer or not self.ledger.writer.pending():
+            self._set_status("All changes saved.")
+
+    def _report_save_error(self):
+        """Show a persistence error from the last ledger call; True if there was one."""
+        err = self.ledger.take_save_error()
+        if err is not None:
+            self._set_status(f"Error saving: {err}")
+        return err is not None
 
     # ============================================================
     # Total row handling
     # ============================================================
-    def _remove_total_row(self):
-        for iid in self.expense_table.get_children():
-            if "total" in self.expense_table.item(iid, "tags"):
-                self.expense_table.delete(iid)
-
+    @metrics.timed("ui.update_total_row")
     def _update_total_row(self):
-        self._remove_total_row()
-        total_usd = 0.0
-        for exp_id, rec in self.expenses.items():
-            total_usd += self.rate_mgr.to_usd(rec["amount"], rec["currency"])
-        self.expense_table.insert(
-            "", "end",
-            values=("TOTAL", f"{total_usd:.2f}", "USD", ""),
-            tags=("total",)
-        )
+        if self._loader is not None:
+            return  # the footer shows load progress until the totals are seeded
+        self._update_recent_total()
+        currency = self.ledger.display_currency
+        if self.filter_ids is not None:
+            # total of the filtered rows only
+            total = self.ledger.total(self.filter_ids)
+            shown = f"{len(self.filter_ids)} of {self.ledger.count()}"
+            self.expense_table.set_footer(("FILTERED", f"{total:.2f}", currency, shown, ""), tags=("total",))
+            return
+        # one conversion per currency, not per record
+        total = self.ledger.total()
+        self.expense_table.set_footer(("TOTAL", f"{total:.2f}", currency, "", ""), tags=("total",))
+
+    def _update_recent_total(self):
+        days = int(self.recent_days_var.get())
+        total = self.ledger.total_last_days(days)
+        self.recent_label.config(text=f"days: {total:.2f} {self.ledger.display_currency}")
+
+    @metrics.timed("ui.display_currency")
+    def _on_display_currency(self):
+        # re-totals the per-currency buckets; no record is read
+        self.ledger.set_display_currency(self.display_currency_var.get())
+        self._update_total_row()
+        self._budgets_changed()
+        self._refresh_report()
+
+    def _update_currency_choices(self):
+        # after a rate refresh: every currency the table knows, the usual ones first
+        codes = self.rate_mgr.currencies()
+        entry_codes = UI_CURRENCIES + [c for c in codes if c not in UI_CURRENCIES]
+        self.currency_combo.config(values=entry_codes)
+        self.filter_combos["currency"].config(values=entry_codes)
+        self.display_combo.config(values=codes)
+
+    # ---------------- filter bar ----------------
+    def _filter_values(self):
+        return {k: v.get().strip() for k, v in self.filter_vars.items() if v.get().strip()}
+
+    def _schedule_filter(self):
+        # typing re-filters once the keystrokes pause
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(150, self._apply_filter)
+
+    @metrics.timed("ui.apply_filter")
+    def _apply_filter(self):
+        self._filter_job = None
+        if self._loader is not None:
+            return  # applied by _finish_loading
+        try:
+            self.filter_ids = self.ledger.filter(**self._filter_values())
+        except ValueError as e:
+            self._set_status(str(e))
+            return
+        self._show_view()
+
+    def _show_view(self):
+        # table rows = filter result (or everything), in the chosen sort order
+        ids = self.filter_ids
+        if self.sort_column:
+            ids = self.ledger.sorted_ids(self.sort_column, self.sort_desc, exp_ids=ids)
+        self.expense_table.set_ids(self.ledger.ids() if ids is None else ids)
+        self._update_total_row()
+
+    @metrics.timed("ui.sort")
+    def _on_sort(self, column):
+        if self._loader is not None:
+            self._set_status("Still loading; sort when done.")
+            return
+        key = column.lower()
+        if key == self.sort_column:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column, self.sort_desc = key, False
+        self.expense_table.mark_sorted(column, self.sort_desc)
+        self._show_view()
+
+    def _clear_filter(self):
+        for var in self.filter_vars.values():
+            var.set("")
+
+    def _row_values(self, exp_id):
+        return self.ledger.row_values(exp_id)
+
+    def _row_tags(self, _exp_id, values):
+        # budget state of the row's (category, month), looked up once per
+        # change. Never from inside the render: a lookup may load a month,
+        # which notifies the table while it draws. Unknown ones are looked
+        # up right after and the rows redrawn.
+        if self._loader is not None:
+            return ()
+        key = (values[2], values[4][:7])
+        tags = self._budget_tags.get(key)
+        if tags is None:
+            if not self._budget_wanted:
+                self.root.after_idle(self._lookup_budget_tags)
+            self._budget_wanted.add(key)
+            tags = ()
+        if values[4] > self._today:
+            tags += ("upcoming",)
+        return tags
+
+    def _lookup_budget_tags(self):
+        wanted, self._budget_wanted = self._budget_wanted, set()
+        unloaded = self.ledger.unloaded
+        redraw = False
+        for key in wanted:
+            # a month still on disk isn't loaded just to colour rows
+            status = None if key[1] in unloaded else self.ledger.budget_status(*key)
+            tags = self._budget_tags[key] = (status.state,) if status and status.state != "ok" else ()
+            redraw = redraw or bool(tags)
+        if redraw:
+            self.expense_table.refresh()
+
+    def _budget_warning(self, category, date_str):
+        # status bar text when the expense left its category over / near budget
+        status = self.ledger.budget_status(category, date_str[:7])
+        if status is None or status.state == "ok":
+            return None
+        spent = f"{status.spent:.2f} of {status.limit:.2f} {self.ledger.display_currency}"
+        if status.state == "over":
+            return f"{category} is over its {status.month} budget: {spent}."
+        return f"{category} is near its {status.month} budget: {spent}."
+
+    def _budgets_changed(self):
+        self._budget_tags = {}
+        self._today = date.today().isoformat()
+        self.expense_table.refresh()
+
+    def _on_table_end(self):
+        # scrolled to the last row: bring in the next older month, if any
+        # (filters and sorts load the months they need themselves)
+        if self._loader is None and self.filter_ids is None and not self.sort_column \
+                and self.ledger.unloaded:
+            self.ledger.load_older()
+
+    @metrics.timed("ui.ledger_changed")
+    def _on_ledger_changed(self, changes):
+        # one table/total update per committed ledger batch
+        if self.filter_ids is not None or self.sort_column:
+            self._apply_filter()
+        else:
+            self._apply_table_changes(changes)
+            self._update_total_row()
+        if self._budget_tags:
+            self._budgets_changed()
+        self._refresh_report()
+
+    def _apply_table_changes(self, changes):
+        table = self.expense_table
+        if changes.cleared:
+            table.set_ids(self.ledger.ids())
+        else:
+            if changes.removed:
+                table.remove(changes.removed)
+            if changes.added:
+                table.extend(changes.added)
+            if changes.updated:
+                # re-render visible rows (no-op cost if the rows are off screen)
+                table.refresh()
 
     # ============================================================
     # Button Handlers
     # ============================================================
+    @metrics.timed("ui.add_update")
     def _on_add_update(self):
         """Add *or* update depending on editing state."""
         amount = self.amount_var.get()
@@ -319,9 +562,16 @@ class ExpenseTrackerApp:
             self._set_status("Amount must be numeric.")
             return
 
+        if not day_ordinal(date_str):
+            self._set_status("Date must be a valid YYYY-MM-DD.")
+            return
+
         # editing?
+        repeat = self.repeat_var.get().strip()
         if self.editing_expense_id:
             self._apply_edit(self.editing_expense_id, amount, currency, category, payment, date_str)
+        elif repeat:
+            self._add_recurring(amount, currency, category, payment, date_str, repeat)
         else:
             self._add_new(amount, currency, category, payment, date_str)
 
@@ -329,67 +579,52 @@ class ExpenseTrackerApp:
         self._reset_form()
 
     def _add_new(self, amount, currency, category, payment, date_str):
-        self._remove_total_row()
-        iid = self.expense_table.insert("", "end",
-                                        values=(amount, currency, category, payment))
-        exp_id = str(uuid.uuid4())
-        self._tree_id_to_expense_id[iid] = exp_id
-        self.expenses[exp_id] = {
-            "id": exp_id,
-            "amount": amount,
-            "currency": currency,
-            "category": category,
-            "payment": payment,
-            "date": date_str,
-        }
-        self._save_expenses_to_file()
-        self._update_total_row()
-        self._set_status("Expense added.")
+        exp_id = self.ledger.add(amount, currency, category, payment, date_str)
+        self.expense_table.see(exp_id)
+        if not self._report_save_error():
+            self._set_status(self._budget_warning(category, date_str) or "Expense added.")
+
+    def _add_recurring(self, amount, currency, category, payment, date_str, repeat):
+        # occurrences up to today are recorded now, the coming ones shown greyed
+        try:
+            self.ledger.add_recurring(amount, currency, category, payment, date_str, repeat)
+        except ValueError as e:
+            self._set_status(str(e))
+            return
+        if not self._report_save_error():
+            self._set_status(f"Recurring {category} expense added ({repeat.lower()} from {date_str}).")
+        self._refresh_recurring()
 
     def _apply_edit(self, exp_id, amount, currency, category, payment, date_str):
-        # update memory
-        rec = self.expenses.get(exp_id)
-        if not rec:
+        if not self.ledger.edit(exp_id, amount, currency, category, payment, date_str):
             self._set_status("Could not find expense to update.")
             return
-        rec.update({
-            "amount": amount,
-            "currency": currency,
-            "category": category,
-            "payment": payment,
-            "date": date_str,
-        })
-        # update table row (find iid)
-        for iid, eid in self._tree_id_to_expense_id.items():
-            if eid == exp_id:
-                # skip total row
-                if "total" in self.expense_table.item(iid, "tags"):
-                    continue
-                self.expense_table.item(iid, values=(amount, currency, category, payment))
-                break
-        self._save_expenses_to_file()
-        self._update_total_row()
-        self._set_status("Expense updated.")
+        if not self._report_save_error():
+            self._set_status(self._budget_warning(category, date_str) or "Expense updated.")
         self.editing_expense_id = None
         self.add_btn.config(text="Add")
 
+    @metrics.timed("ui.delete")
     def _on_delete(self):
         selection = self.expense_table.selection()
         if not selection:
             self._set_status("Select a row to delete.")
             return
-        deleted = 0
-        for iid in selection:
-            if "total" in self.expense_table.item(iid, "tags"):
-                continue
-            exp_id = self._tree_id_to_expense_id.pop(iid, None)
-            if exp_id and exp_id in self.expenses:
-                del self.expenses[exp_id]
-            self.expense_table.delete(iid)
-            deleted += 1
-        self._save_expenses_to_file()
-        self._update_total_row()
-        self._set_status(f"Deleted {deleted} expense(s).")
+        deleted = self.ledger.delete(selection)
+        if not self._report_save_error():
+            self._set_status(f"Deleted {deleted} expense(s).")
+
+    @metrics.timed("ui.recategorize")
+    def _on_recategorize(self):
+        """Move every selected row to the category chosen in the form."""
+        selection = self.expense_table.selection()
+        category = self.category_var.get()
+        if not selection or not category:
+            self._set_status("Select rows and a category to recategorize.")
+            return
+        changed = self.ledger.recategorize(selection, category)
+        if not self._report_save_error():
+            self._set_status(f"Moved {changed} expense(s) to {category}.")
 
     def _on_edit_selected(self):
         """Load first selected row into form for editing."""
@@ -397,15 +632,10 @@ class ExpenseTrackerApp:
         if not selection:
             self._set_status("Select a row to edit.")
             return
-        iid = selection[0]
-        if "total" in self.expense_table.item(iid, "tags"):
-            self._set_status("Cannot edit total row.")
-            return
-        exp_id = self._tree_id_to_expense_id.get(iid)
-        if not exp_id:
-            self._set_status("Internal ID missing; cannot edit.")
-            return
-        rec = self.expenses.get(exp_id)
+        self._start_edit(selection[0])
+
+    def _start_edit(self, exp_id):
+        rec = self.ledger.get(exp_id)
         if not rec:
             self._set_status("Expense record not found.")
             return
@@ -424,26 +654,229 @@ class ExpenseTrackerApp:
         self.add_btn.config(text="Update")
         self._set_status("Editing mode: make changes and click Update.")
 
-    def _on_double_click_row(self, _evt):
-        self._on_edit_selected()
+    def _on_double_click_row(self, evt):
+        # map the clicked on-screen row back to its expense id
+        exp_id = self.expense_table.id_at(evt.y)
+        if exp_id is None:
+            return
+        self._start_edit(exp_id)
+
+    def _on_reports(self):
+        if self.report_panel is not None:
+            self.report_panel.lift()
+            return
+        self.report_panel = ReportPanel(self.root, self.ledger, on_close=self._on_report_closed)
+
+    def _on_report_closed(self):
+        self.report_panel = None
+
+    def _refresh_report(self):
+        # rollups (and the chart's series) are only complete once loading has finished
+        if self._loader is not None:
+            return
+        if self.report_panel is not None:
+            self.report_panel.refresh()
+        if self.chart_panel is not None:
+            self.chart_panel.refresh()
+        if self.budget_panel is not None:
+            self.budget_panel.refresh()
+
+    def _on_budgets(self):
+        if self.budget_panel is not None:
+            self.budget_panel.lift()
+            return
+        self.budget_panel = BudgetPanel(self.root, self.ledger, on_close=self._on_budgets_closed,
+                                        on_changed=self._budgets_changed)
+
+    def _on_budgets_closed(self):
+        self.budget_panel = None
+
+    def _on_recurring(self):
+        if self.recurring_panel is not None:
+            self.recurring_panel.lift()
+            return
+        self.recurring_panel = RecurringPanel(self.root, self.ledger, on_close=self._on_recurring_closed)
+
+    def _on_recurring_closed(self):
+        self.recurring_panel = None
+
+    def _refresh_recurring(self):
+        if self.recurring_panel is not None:
+            self.recurring_panel.refresh()
+
+    def _apply_recurring(self):
+        # record the recurring expenses that have come due and show the
+        # coming ones; again just after every midnight while the app runs
+        try:
+            self.ledger.apply_recurring()
+        except Exception as e:
+            self._set_status(f"Recurring expenses failed: {e}")
+        self._refresh_recurring()
+        if self._recurring_job is None:
+            tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+            delay = int((tomorrow - datetime.now()).total_seconds() * 1000) + 1000
+            self._recurring_job = self.root.after(delay, self._on_new_day)
+
+    def _on_new_day(self):
+        self._recurring_job = None
+        self._budgets_changed()   # rows dated today are no longer upcoming
+        self._apply_recurring()
+
+    def _on_chart(self):
+        if self.chart_panel is not None:
+            self.chart_panel.lift()
+            return
+        self.chart_panel = ChartPanel(self.root, self.ledger, on_close=self._on_chart_closed)
+
+    def _on_chart_closed(self):
+        self.chart_panel = None
+
+    def _on_metrics(self):
+        if self.metrics_panel is not None:
+            self.metrics_panel.lift()
+            return
+        self.metrics_panel = MetricsPanel(self.root, on_close=self._on_metrics_closed)
+
+    def _on_metrics_closed(self):
+        self.metrics_panel = None
 
     def _on_refresh_rates(self):
-        online = self.rate_mgr.fetch()
+        self._set_status("Refreshing rates...")
+        self.rate_mgr.fetch_async(self._on_rates_fetched, force=True)
+
+    def _on_rates_fetched(self, online):
+        # called on the fetch worker thread
+        self._call_in_ui(self._apply_fetched_rates, online)
+
+    @metrics.timed("ui.apply_rates")
+    def _apply_fetched_rates(self, online):
         self.rate_online = online
+        # totals and the USD sort order depend on the rates
+        self.ledger.rates_changed()
+        self._update_currency_choices()
+        if self.sort_column == "amount" and self._loader is None:
+            self._show_view()
         self._update_total_row()
-        self._set_status("Rates refreshed." if online else "Rates refresh failed; using fallback.")
+        self._budgets_changed()
+        self._refresh_report()
+        if self.rate_mgr.source == "live":
+            self._set_status("Rates refreshed.")
+        elif self.rate_mgr.source == "cache":
+            self._set_status("Using cached rates." if online else "Rates refresh failed; using cached rates.")
+        else:
+            self._set_status("Rates refresh failed; using fallback.")
 
+    @metrics.timed("ui.clear_all")
     def _on_clear_all(self):
         if not messagebox.askyesno("Confirm", "Delete ALL expenses?"):
             return
-        # clear table
-        for iid in self.expense_table.get_children():
-            self.expense_table.delete(iid)
-        # clear memory
-        self._init_storage()
-        self._save_expenses_to_file()
-        self._update_total_row()
-        self._set_status("All expenses cleared.")
+        # memory, storage and (via _on_ledger_changed) the table
+        self.ledger.clear()
+        if not self._report_save_error():
+            self._set_status("All expenses cleared.")
+
+    # ---------------- bank statement import ----------------
+    # like loading: one batch per event-loop turn, so a large statement
+    # imports with the window responsive and the progress in the status bar
+    def _on_import(self):
+        path = filedialog.askopenfilename(
+            title="Import bank statement",
+            filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("All files", "*.*")])
+        if not path:
+            return
+        self._start_import(path)
+
+    def _start_import(self, path, date_format=None):
+        # rows that don't name a currency are taken to be in the display currency
+        self._importer = import_chunks(self.ledger, path, currency=self.ledger.display_currency,
+                                       date_format=date_format, batch_size=UI_IMPORT_BATCH)
+        self._import_path = path
+        self._import_stats = None
+        self._set_loading(True)
+        self._set_status(f"Importing {os.path.basename(path)}...")
+        self.root.after(1, self._import_next_batch)
+
+    @metrics.timed("ui.import_batch")
+    def _import_next_batch(self):
+        try:
+            self._import_stats = next(self._importer)
+        except StopIteration:
+            self._finish_import()
+            return
+        except AmbiguousDates as e:
+            # rows already imported come back as duplicates on the re-run
+            self._importer = None
+            self._set_loading(False)
+            day_first, month_first = e.formats[:2]
+            answer = messagebox.askyesnocancel(
+                "Date format", f"Is {e.sample} written day first ({day_first})?\n\nNo: month first ({month_first}).")
+            if answer is None:
+                self._set_status("Import cancelled.")
+            else:
+                self._start_import(self._import_path, day_first if answer else month_first)
+            return
+        except Exception as e:
+            self._importer = None
+            self._set_loading(False)
+            self._set_status(f"Import failed: {e}")
+            return
+        stats = self._import_stats
+        self._set_status(f"Importing {os.path.basename(stats.path)}... {stats.progress:.0%} "
+                         f"({stats.rows} rows, {stats.added} new)")
+        self.root.after(1, self._import_next_batch)
+
+    def _finish_import(self):
+        stats = self._import_stats
+        self._importer = None
+        self._set_loading(False)
+        if self._report_save_error():
+            return
+        msg = f"Imported {os.path.basename(stats.path)}: {stats.summary()}."
+        if stats.errors:
+            msg += f" First problem: {stats.errors[0]}"
+        self._set_status(msg)
+
+    # ---------------- export ----------------
+    # the rows shown (filter bar applied) with an amount column in the
+    # display currency, written by ExportJob on its own thread; the button
+    # cancels while it runs
+    def _on_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export expenses", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("NDJSON", "*.ndjson"), ("JSON", "*.json"), ("Parquet", "*.parquet")])
+        if not path:
+            return
+        try:
+            job = ExportJob(self.ledger, path, exp_ids=self.filter_ids,
+                            convert_to=(self.ledger.display_currency,))
+        except Exception as e:
+            self._set_status(f"Export failed: {e}")
+            return
+        self.export_job = job.start(on_done=lambda job: self._call_in_ui(self._finish_export, job))
+        self.export_btn.config(text="Cancel Export")
+        self._show_export_progress()
+
+    def _show_export_progress(self):
+        job = self.export_job
+        if job is None or not job.running:
+            return
+        self._set_status(f"Exporting to {os.path.basename(job.path)}... {job.progress:.0%} "
+                         f"({job.count} of {job.total})")
+        self.root.after(200, self._show_export_progress)
+
+    def _finish_export(self, job):
+        self.export_job = None
+        self.export_btn.config(text="Export...")
+        name = os.path.basename(job.path)
+        if job.error is not None:
+            self._set_status(f"Export failed: {job.error}")
+        elif job.cancelled:
+            self._set_status(f"Export to {name} cancelled.")
+        else:
+            self._set_status(f"Exported {job.count} expenses to {name}.")
 
     # ---------------- form reset ----------------
     def _reset_form(self):
@@ -453,9 +886,28 @@ class ExpenseTrackerApp:
         self.payment_var.set("")
         self.date_entry.delete(0, tk.END)
         self._restore_date_placeholder(None)
+        self.repeat_var.set("")
         self.editing_expense_id = None
         self.add_btn.config(text="Add")
 
+    def _on_close(self):
+        # flush queued writes before the window goes away
+        self._set_status("Saving...")
+        self.root.update_idletasks()
+        if self.export_job is not None:
+            # stopped at its next chunk; leaves no partial file
+            self.export_job.cancel()
+            self.export_job.wait()
+        try:
+            self.ledger.close()
+        except Exception as e:
+            # the ledger is still open and keeps retrying the write
+            if not messagebox.askyesno("Error saving", f"{e}\n\nClose anyway? Unsaved changes will be lost."):
+                self._set_status(f"Error saving: {e} (will retry)")
+                return
+            self.ledger.close(discard=True)
+        self.root.destroy()
+
     # ---------------- run ----------------
     def run(self):
         self.root.mainloop()
@@ -464,6 +916,10 @@ class ExpenseTrackerApp:
 # ============================================================
 # Run the app
 # ============================================================
+# EXPENSE_PROFILE=cprofile:FILE / sample:FILE profiles the whole session and
+# EXPENSE_METRICS=FILE saves the timing metrics (see expense_core.metrics).
 if __name__ == "__main__":
+    profiling.start_from_env()
+    dump_on_exit()
     app = ExpenseTrackerApp()
     app.run()
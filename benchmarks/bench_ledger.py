@@ -0,0 +1,422 @@
+"""Benchmarks for the ledger hot paths on synthetic ledgers.
+
+    python benchmarks/bench_ledger.py                        # 10k and 100k rows
+    python benchmarks/bench_ledger.py --sizes 1000000 --out results.json
+    python benchmarks/bench_ledger.py --compare baseline.json
+
+Runs without a display: ExpenseTrackerApp is built without calling its
+__init__, with the Tk widgets replaced by the stand-ins below, so the
+handlers run their real ledger/persistence code. Rates are the built-in
+fallback table (no network). With --compare, exits 1 if any timing is
+slower than the baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Expense_tracker_chatgpt import ExpenseTrackerApp  # noqa: E402
+from chart_panel import plot  # noqa: E402
+from expense_core import SAVE_DELAY_SECONDS, UI_CATEGORIES, UI_CURRENCIES, UI_PAYMENTS, Ledger  # noqa: E402
+from expense_core.client import RemoteLedger  # noqa: E402
+from expense_core.exporter import ExportJob  # noqa: E402
+from expense_core.importer import import_statement  # noqa: E402
+from expense_core.rates import RateManager  # noqa: E402
+from expense_core.server import ExpenseServer  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000)
+MUTATIONS = 1_000   # add / edit / delete / total operations per size
+REPEAT = 3          # side-effect-free timings keep the best of this many runs
+CLIENTS = 4         # concurrent connections in the server benchmark
+RULES = 50          # recurring expense rules
+
+
+# ============================================================
+# Synthetic ledgers
+# ============================================================
+def make_records(n, seed=1):
+    rng = random.Random(seed)
+    currencies = [c for c in UI_CURRENCIES if c]
+    categories = [c for c in UI_CATEGORIES if c]
+    payments = [p for p in UI_PAYMENTS if p]
+    first_day = date(2022, 1, 1).toordinal()
+    records = []
+    for i in range(n):
+        records.append({
+            "id": str(uuid.UUID(f"{seed:04x}{i:028x}")),  # uuid4-shaped, like the app's
+            "amount": f"{rng.randint(1, 500_000) / 100:.2f}",
+            "currency": rng.choice(currencies),
+            "category": rng.choice(categories),
+            "payment": rng.choice(payments),
+            "date": date.fromordinal(first_day + rng.randrange(3 * 365)).isoformat(),
+        })
+    return records
+
+
+def write_ledger(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2)
+
+
+def write_statement(path, records):
+    # a bank CSV export of the same expenses: money out is negative
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Date,Description,Amount,Currency\n")
+        for i, rec in enumerate(records):
+            f.write(f"{rec['date']},{rec['category']} shop {i % 500},-{rec['amount']},{rec['currency']}\n")
+
+
+# ============================================================
+# Headless app
+# ============================================================
+class _StubWidget:
+    def config(self, **_kw):
+        pass
+
+
+class _StubVar:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _StubRoot:
+    """Collects root.after() callbacks; pump() runs them until none are left."""
+
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, fn, *args):
+        # timers set further out than a run lasts (the after-midnight
+        # recurring check) never fire
+        if ms <= 60_000:
+            self.pending.append((fn, args))
+
+    def pump(self, limit=None):
+        while self.pending and limit != 0:
+            fn, args = self.pending.pop(0)
+            fn(*args)
+            if limit is not None:
+                limit -= 1
+
+
+class _StubTable:
+    """Stands in for VirtualTable: same calls, no Tk."""
+
+    def __init__(self):
+        self.ids = []
+        self.selected = []
+
+    def set_ids(self, ids):
+        self.ids = list(ids)
+
+    def extend(self, exp_ids):
+        self.ids.extend(exp_ids)
+
+    def remove(self, exp_ids):
+        gone = set(exp_ids)
+        self.ids = [i for i in self.ids if i not in gone]
+
+    def selection(self):
+        return list(self.selected)
+
+    def see(self, _exp_id):
+        pass
+
+    def refresh(self):
+        pass
+
+    def set_footer(self, _values, tags=()):
+        pass
+
+
+def make_app(data_file, backend="journal"):
+    rate_mgr = RateManager(store=None)
+    rate_mgr.rates = rate_mgr.fallback.copy()
+    app = ExpenseTrackerApp.__new__(ExpenseTrackerApp)
+    app.root = _StubRoot()
+    app.ledger = Ledger(backend=backend, data_file=data_file, rate_mgr=rate_mgr,
+                        save_delay=SAVE_DELAY_SECONDS,
+                        budget_file=os.path.splitext(data_file)[0] + "_budgets.json",
+                        recurring_file=os.path.splitext(data_file)[0] + "_recurring.json")
+    app.ledger.subscribe(app._on_ledger_changed)
+    app.rate_mgr = rate_mgr
+    app.rate_online = False
+    app.editing_expense_id = None
+    app._loader = None
+    app.report_panel = None
+    app.chart_panel = None
+    app.budget_panel = None
+    app.recurring_panel = None
+    app._recurring_job = None
+    app._budget_tags = {}
+    app._budget_wanted = set()
+    app._today = date.today().isoformat()
+    app.export_job = None
+    app.filter_ids = None
+    app.filter_vars = {}
+    app.sort_column = None
+    app.recent_days_var = _StubVar("30")
+    app.recent_label = _StubWidget()
+    app.expense_table = _StubTable()
+    app.status_bar = _StubWidget()
+    for name in ("add_btn", "delete_btn", "recat_btn", "clear_btn", "report_btn", "import_btn", "export_btn",
+                 "chart_btn", "budget_btn", "recurring_btn"):
+        setattr(app, name, _StubWidget())
+    return app
+
+
+# ============================================================
+# Timings
+# ============================================================
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def best_of(fn, *args):
+    return min(timed(fn, *args) for _ in range(REPEAT))
+
+
+def run_size(n, workdir):
+    records = make_records(n)
+    data_file = os.path.join(workdir, f"expenses_{n}.json")
+    write_ledger(data_file, records)
+    app = make_app(data_file)
+    rng = random.Random(n)
+    results = {}
+
+    def load_first_chunk():
+        # what stands between startup and a usable window
+        app._load_expenses_from_file()
+        app.root.pump(limit=1)
+    results["load_first_chunk"] = timed(load_first_chunk)
+
+    def load_all():
+        app._load_expenses_from_file()
+        app.root.pump()
+    app.root.pending = []
+    # (the JSON file is converted to a binary snapshot at the end of this load)
+    results["load_expenses_from_file"] = timed(load_all)
+    results["load_from_snapshot"] = timed(load_all)
+
+    def add_many():
+        for i in range(MUTATIONS):
+            app._add_new(f"{i % 997}.25", "EGP", "Grocery", "Cash", "2024-05-01")
+    results["add_new"] = timed(add_many) / MUTATIONS
+
+    ids = app.expense_table.ids
+    targets = rng.sample(ids, MUTATIONS)
+
+    def edit_many():
+        for exp_id in targets:
+            app._apply_edit(exp_id, "42.00", "GBP", "Rental", "Paypal", "2024-06-01")
+    results["apply_edit"] = timed(edit_many) / MUTATIONS
+    # the background saver's write of the whole burst
+    results["flush_burst"] = timed(app.ledger.flush)
+
+    def total_many():
+        for _ in range(MUTATIONS):
+            app._update_total_row()
+    results["update_total_row"] = best_of(total_many) / MUTATIONS
+
+    # the first filter builds the inverted indexes; later ones only query them
+    results["filter_build_index"] = timed(lambda: app.ledger.filter(category="Grocery"))
+
+    def filter_and_total():
+        ids = app.ledger.filter(category="Grocery", date="2023", currency="EUR")
+        app.ledger.total(ids)
+    results["filter_and_total"] = best_of(filter_and_total)
+
+    def sort_by(column):
+        app.ledger.sorted_ids(column)
+    results["sort_date_first"] = timed(sort_by, "date")
+    results["sort_date"] = best_of(sort_by, "date")
+    results["sort_amount_first"] = timed(sort_by, "amount")
+    results["sort_category"] = best_of(sort_by, "category")
+    results["total_last_30_days"] = best_of(app.ledger.total_last_days, 30)
+
+    def switch_currency(code):
+        app.ledger.set_display_currency(code)
+        app._update_total_row()
+    # first use of a currency looks its factors up; switching back reuses them
+    results["display_currency_first"] = timed(switch_currency, "EGP")
+    results["display_currency_switch"] = best_of(switch_currency, "USD")
+
+    # a budget on every category: the first check builds the spend per
+    # (category, month) from the rollups, later ones only read it
+    for category in UI_CATEGORIES[1:]:
+        app.ledger.set_budget(category, "500", "USD")
+    results["budget_first_check"] = timed(app._budget_warning, "Grocery", "2024-05-01")
+
+    def check_many():
+        for _ in range(MUTATIONS):
+            app._budget_warning("Grocery", "2024-05-01")
+    results["budget_check"] = best_of(check_many) / MUTATIONS
+
+    # recurring expenses: adding rules that started a while ago records
+    # their past occurrences; after that a load only projects the coming
+    # ones (what the window pays at every startup)
+    def add_rules():
+        for i in range(RULES):
+            app.ledger.add_recurring("120.00", "EGP", "Rental", "Cash", "2024-01-01",
+                                     "daily" if i % 5 == 0 else "monthly")
+    results["add_recurring_backfill"] = timed(add_rules) / RULES
+    results["apply_recurring"] = best_of(app._apply_recurring)
+
+    app.expense_table.selected = targets
+    results["on_delete"] = timed(app._on_delete) / MUTATIONS
+
+    # what the old _save_expenses_to_file paid on every change
+    snapshot = list(app.ledger.records())
+    results["save_full_snapshot"] = best_of(app.ledger.storage._write_snapshot, snapshot)
+
+    def convert_all():
+        to_usd = app.rate_mgr.to_usd
+        for rec in records:
+            to_usd(rec["amount"], rec["currency"], rec["date"])
+    results["rate_to_usd_bulk"] = best_of(convert_all)
+
+    # per statement row: parse, categorize, hash and commit; the second
+    # import of the same file finds every row already there
+    statement = os.path.join(workdir, f"statement_{n}.csv")
+    write_statement(statement, records)
+    results["import_statement_row"] = timed(import_statement, app.ledger, statement) / n
+    results["reimport_statement_row"] = timed(import_statement, app.ledger, statement) / n
+
+    # what an export holds the UI thread for (picking rows, copying the
+    # columns), then the worker's time per row written with a USD column
+    export_file = os.path.join(workdir, f"export_{n}.csv")
+    job = None
+
+    def export_setup():
+        nonlocal job
+        job = ExportJob(app.ledger, export_file, convert_to=("USD",))
+    results["export_setup"] = timed(export_setup)
+    results["export_csv_row"] = timed(job.run) / max(job.total, 1)
+
+    # the chart: the first daily series is built from the store, then a
+    # redraw only slices and downsamples it
+    results["spend_series_build"] = timed(app.ledger.spend_series, "day")
+
+    def chart_redraw():
+        series = app.ledger.spend_series("day")
+        plot(series, sorted(series), None, None, 760, 400)
+    results["chart_redraw_daily"] = best_of(chart_redraw)
+
+    app.ledger.close()
+
+    # partitioned backend: the first open splits the flat file by month;
+    # later opens read only the recent months and count the rest from
+    # the manifest (the synthetic dates are all older than that)
+    part_file = os.path.join(workdir, f"partitioned_{n}.json")
+    write_ledger(part_file, records)
+    part = make_app(part_file, backend="partitioned")
+
+    def part_load_all():
+        part._load_expenses_from_file()
+        part.root.pump()
+    results["partitioned_migrate"] = timed(part_load_all)
+    part.ledger.close()
+    part.root.pending = []
+    results["partitioned_load"] = timed(part_load_all)
+    results["partitioned_load_month"] = timed(part.ledger.load_older)
+    results["partitioned_total"] = best_of(part.ledger.total)
+    part.ledger.close()
+
+    # shared ledger: CLIENTS connections each alternating an add and a
+    # 30-day total (one round trip each); the figure is wall time per operation
+    results.update(bench_server(Ledger(backend="partitioned", data_file=part_file, rate_mgr=part.rate_mgr,
+                                       save_delay=SAVE_DELAY_SECONDS)))
+    return results
+
+
+def bench_server(ledger):
+    ledger.open(all_months=False)
+    server = ExpenseServer(ledger, port=0)
+    ready = threading.Event()
+    thread = threading.Thread(target=asyncio.run, args=(server.serve_forever(lambda _s: ready.set()),),
+                              daemon=True)
+    thread.start()
+    ready.wait()
+    address = f"127.0.0.1:{server.port}"
+    results = {}
+
+    def client_ops():
+        client = RemoteLedger(address)
+        for i in range(MUTATIONS // 2):
+            client.add(f"{i % 997}.25", "EGP", "Grocery", "Cash", "2024-05-01")
+            client.total_last_days(30)
+        client.close()
+
+    def concurrent_ops():
+        workers = [threading.Thread(target=client_ops) for _ in range(CLIENTS)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    results["server_op"] = timed(client_ops) / MUTATIONS
+    results["server_op_concurrent"] = timed(concurrent_ops) / (MUTATIONS * CLIENTS)
+    server.stop()
+    thread.join()
+    ledger.close()
+    return results
+
+
+def compare(current, baseline, tolerance):
+    """Return human-readable regressions of current against baseline."""
+    regressions = []
+    for size, timings in current.items():
+        for name, seconds in timings.items():
+            old = baseline.get(size, {}).get(name)
+            if old and seconds > old * (1 + tolerance):
+                regressions.append(f"{name} @ {size}: {old:.6f}s -> {seconds:.6f}s "
+                                   f"(+{(seconds / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                   help="comma-separated ledger sizes")
+    p.add_argument("--out", help="write results as JSON to this file")
+    p.add_argument("--compare", help="baseline JSON from an earlier --out")
+    p.add_argument("--tolerance", type=float, default=0.25,
+                   help="allowed slowdown before a timing counts as a regression (0.25 = 25%%)")
+    args = p.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in (int(s) for s in args.sizes.split(",") if s):
+            results[str(n)] = run_size(n, workdir)
+            for name, seconds in results[str(n)].items():
+                print(f"{n:>9}  {name:<26} {seconds * 1000:12.3f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import tkinter as tk
+from tkinter import ttk
+from datetime import date
+
+from expense_core import UI_CATEGORIES, UI_CURRENCIES, normalize_currency
+
+# ============================================================
+# BudgetPanel
+# ============================================================
+# A separate window listing each category's monthly budget against what
+# was spent in the chosen month, in the display currency, and a form to
+# set or remove a limit. The figures come from Ledger.budget_report(),
+# which reads the ledger's running per-(category, month) spend, so a
+# refresh after every change costs one lookup per budget.
+STATE_TEXT = {"ok": "", "near": "Near limit", "over": "Over budget"}
+
+
+class BudgetPanel:
+    def __init__(self, parent, ledger, on_close=None, on_changed=None):
+        self.ledger = ledger
+        self.on_close = on_close
+        self.on_changed = on_changed
+        self._refresh_pending = False
+
+        top = tk.Toplevel(parent)
+        top.title("Budgets")
+        top.geometry("560x380")
+        top.protocol("WM_DELETE_WINDOW", self.close)
+        self.top = top
+
+        cf = ttk.Frame(top, padding=(10, 10))
+        cf.pack(fill="x")
+        ttk.Label(cf, text="Month (YYYY-MM)").grid(row=0, column=0, sticky="w", padx=5)
+        self.month_var = tk.StringVar(value=date.today().isoformat()[:7])
+        ttk.Entry(cf, textvariable=self.month_var, width=9).grid(row=0, column=1, padx=5)
+        ttk.Button(cf, text="Apply", command=self.refresh).grid(row=0, column=2, padx=5)
+
+        tf = ttk.Frame(top, padding=(10, 0, 10, 5))
+        tf.pack(fill="both", expand=True)
+        cols = ("Category", "Budget", "Spent", "Left", "Status")
+        tv = ttk.Treeview(tf, columns=cols, show="headings", selectmode="browse")
+        for c, width, anchor in zip(cols, (140, 90, 90, 90, 100), ("w", "e", "e", "e", "w")):
+            tv.heading(c, text=c)
+            tv.column(c, width=width, anchor=anchor)
+        tv.pack(fill="both", expand=True)
+        tv.tag_configure("over", background="#FFCDD2")
+        tv.tag_configure("near", background="#FFF9C4")
+        tv.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree = tv
+
+        ef = ttk.Frame(top, padding=(10, 5, 10, 10))
+        ef.pack(fill="x")
+        self.category_var = tk.StringVar()
+        ttk.Combobox(ef, textvariable=self.category_var, values=UI_CATEGORIES[1:], state="readonly",
+                     width=14).grid(row=0, column=0, padx=5)
+        self.amount_var = tk.StringVar()
+        ttk.Entry(ef, textvariable=self.amount_var, width=10).grid(row=0, column=1, padx=5)
+        self.currency_var = tk.StringVar(value=ledger.display_currency)
+        ttk.Combobox(ef, textvariable=self.currency_var, values=UI_CURRENCIES[1:], width=6).grid(row=0, column=2,
+                                                                                              padx=5)
+        ttk.Button(ef, text="Set", command=self._on_set).grid(row=0, column=3, padx=5)
+        self.message = ttk.Label(ef, foreground="gray25")
+        self.message.grid(row=0, column=4, sticky="w", padx=5)
+
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the budgets on the next idle tick (coalesced)."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.top.after_idle(self._render)
+
+    def _render(self):
+        self._refresh_pending = False
+        month = self.month_var.get().strip()
+        tv = self.tree
+        tv.heading("Budget", text=f"Budget ({self.ledger.display_currency})")
+        tv.delete(*tv.get_children())
+        self.message.config(text="")
+        if len(month) != 7 or not month[:4].isdigit() or month[4] != "-" or not month[5:].isdigit():
+            self.message.config(text="Month must be YYYY-MM.")
+            return
+        for status in self.ledger.budget_report(month):
+            tv.insert("", "end", iid=status.category, tags=(status.state,),
+                      values=(status.category, f"{status.limit:.2f}", f"{status.spent:.2f}",
+                              f"{status.limit - status.spent:.2f}", STATE_TEXT[status.state]))
+        if not tv.get_children():
+            self.message.config(text="No budgets yet: pick a category and set a monthly limit.")
+
+    def _on_select(self, _evt):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        category = selection[0]
+        amount, currency = self.ledger.budget_limits().get(category, ("", self.ledger.display_currency))
+        self.category_var.set(category)
+        self.amount_var.set(amount)
+        self.currency_var.set(currency)
+
+    def _on_set(self):
+        category = self.category_var.get()
+        try:
+            self.ledger.set_budget(category, self.amount_var.get().strip(),
+                                   normalize_currency(self.currency_var.get()))
+        except Exception as e:
+            self.message.config(text=str(e))
+            return
+        self.refresh()
+        if self.on_changed is not None:
+            self.on_changed()
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        self.top.destroy()
+        if self.on_close is not None:
+            self.on_close()
@@ -0,0 +1,209 @@
+import math
+import tkinter as tk
+from tkinter import ttk
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from expense_core import UI_CATEGORIES, day_ordinal
+from expense_core.metrics import metrics
+from expense_core.series import decimate
+
+# ============================================================
+# ChartPanel
+# ============================================================
+# A separate window plotting spend per category over time (per day, week
+# or month) in the display currency on a plain Canvas. The points come
+# from Ledger.spend_series(), which the ledger keeps up to date itself,
+# so a redraw (resize, a control change, a ledger change) only slices the
+# date range, downsamples each line to the plot's pixel width (min/max
+# per pixel column, see series.decimate) and moves the existing line
+# items: it costs per pixel, not per expense.
+STEPS = {"Daily": "day", "Weekly": "week", "Monthly": "month"}
+ALL = "All categories"
+COLORS = ("#4CAF50", "#F44336", "#2196F3", "#FF9800", "#9C27B0", "#795548", "#009688",
+          "#607D8B", "#E91E63", "#3F51B5", "#CDDC39", "#00BCD4")
+PAD_LEFT, PAD_RIGHT, PAD_TOP, PAD_BOTTOM = 70, 15, 15, 28
+
+
+def _range_ordinals(date_from, date_to):
+    """(first, last) day ordinals of a YYYY-MM or YYYY-MM-DD range; None
+    for an open end. ValueError if a bound doesn't parse."""
+    lo = hi = None
+    if date_from:
+        lo = day_ordinal(date_from if len(date_from) > 7 else date_from + "-01")
+        if not lo:
+            raise ValueError("From must be YYYY-MM or YYYY-MM-DD.")
+    if date_to:
+        if len(date_to) > 7:
+            hi = day_ordinal(date_to)
+        else:
+            # last day of the month
+            first = day_ordinal(date_to + "-01")
+            hi = first and (date.fromordinal(first + 31).replace(day=1).toordinal() - 1)
+        if not hi:
+            raise ValueError("To must be YYYY-MM or YYYY-MM-DD.")
+    return lo, hi
+
+
+def plot(series, categories, lo, hi, width, height):
+    """Canvas polylines for the categories of series ({category: {period:
+    total}}) between day ordinals lo and hi (None = open): returns
+    ({category: [x0, y0, x1, y1, ...]}, (first, last) period, top of the y
+    axis). Each line has at most two points per pixel column."""
+    plot_w = max(width - PAD_LEFT - PAD_RIGHT, 10)
+    plot_h = max(height - PAD_TOP - PAD_BOTTOM, 10)
+    picked = {}
+    for category in categories:
+        points = series.get(category)
+        if not points:
+            continue
+        xs = sorted(points)
+        start = bisect_left(xs, lo) if lo is not None else 0
+        stop = bisect_right(xs, hi) if hi is not None else len(xs)
+        xs = xs[start:stop]
+        if xs:
+            picked[category] = (xs, [points[x] for x in xs])
+    if not picked:
+        return {}, None, 0.0
+    x_min = min(xs[0] for xs, _ys in picked.values())
+    x_max = max(xs[-1] for xs, _ys in picked.values())
+    y_max = _nice_ceiling(max(max(ys) for _xs, ys in picked.values()))
+    sx = plot_w / ((x_max - x_min) or 1)
+    sy = plot_h / y_max
+    bottom = PAD_TOP + plot_h
+    lines = {}
+    for category, (xs, ys) in picked.items():
+        xs, ys = decimate(xs, ys, x_min, x_max, plot_w)
+        coords = [0.0] * (2 * len(xs))
+        coords[0::2] = [PAD_LEFT + (x - x_min) * sx for x in xs]
+        coords[1::2] = [bottom - (y if y > 0 else 0.0) * sy for y in ys]
+        if len(coords) == 2:
+            coords *= 2   # a line needs two points
+        lines[category] = coords
+    return lines, (x_min, x_max), y_max
+
+
+def _color(category, n):
+    # the same color for a category whatever else is shown
+    if category in UI_CATEGORIES:
+        n = UI_CATEGORIES.index(category)
+    return COLORS[n % len(COLORS)]
+
+
+def _nice_ceiling(value):
+    """1, 2 or 5 times a power of ten, at least value (and above 0)."""
+    if value <= 0:
+        return 1.0
+    power = 10 ** math.floor(math.log10(value))
+    for m in (1, 2, 5, 10):
+        if value <= m * power:
+            return m * power
+    return 10 * power
+
+
+class ChartPanel:
+    def __init__(self, parent, ledger, on_close=None):
+        self.ledger = ledger
+        self.on_close = on_close
+        self._refresh_pending = False
+        self.lines = {}   # category -> canvas line item
+
+        top = tk.Toplevel(parent)
+        top.title("Spending over time")
+        top.geometry("760x440")
+        top.protocol("WM_DELETE_WINDOW", self.close)
+        self.top = top
+
+        cf = ttk.Frame(top, padding=(10, 10))
+        cf.pack(fill="x")
+        self.step_var = tk.StringVar(value="Monthly")
+        step = ttk.Combobox(cf, textvariable=self.step_var, values=list(STEPS), state="readonly", width=9)
+        step.grid(row=0, column=0, padx=5)
+        step.bind("<<ComboboxSelected>>", lambda _e: self.refresh())
+        self.category_var = tk.StringVar(value=ALL)
+        category = ttk.Combobox(cf, textvariable=self.category_var, values=[ALL] + UI_CATEGORIES[1:],
+                                state="readonly", width=14)
+        category.grid(row=0, column=1, padx=5)
+        category.bind("<<ComboboxSelected>>", lambda _e: self.refresh())
+        ttk.Label(cf, text="From").grid(row=0, column=2, sticky="w", padx=5)
+        self.from_var = tk.StringVar()
+        ttk.Entry(cf, textvariable=self.from_var, width=11).grid(row=0, column=3, padx=5)
+        ttk.Label(cf, text="To").grid(row=0, column=4, sticky="w", padx=5)
+        self.to_var = tk.StringVar()
+        ttk.Entry(cf, textvariable=self.to_var, width=11).grid(row=0, column=5, padx=5)
+        ttk.Button(cf, text="Apply", command=self.refresh).grid(row=0, column=6, padx=5)
+        self.message = ttk.Label(cf, foreground="gray25")
+        self.message.grid(row=0, column=7, sticky="w", padx=5)
+
+        self.canvas = tk.Canvas(top, background="white", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.canvas.bind("<Configure>", lambda _e: self.refresh())
+
+        self.refresh()
+
+    def refresh(self):
+        """Redraw on the next idle tick (coalesced)."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.top.after_idle(self._render)
+
+    @metrics.timed("chart.render")
+    def _render(self):
+        self._refresh_pending = False
+        canvas = self.canvas
+        try:
+            lo, hi = _range_ordinals(self.from_var.get().strip(), self.to_var.get().strip())
+        except ValueError as e:
+            self.message.config(text=str(e))   # the last good chart stays up
+            return
+        canvas.delete("axis")
+        series = self.ledger.spend_series(STEPS[self.step_var.get()])
+        chosen = self.category_var.get()
+        categories = sorted(series) if chosen == ALL else [chosen]
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        lines, span, y_max = plot(series, categories, lo, hi, width, height)
+        self.message.config(text="" if lines else "Nothing to show.")
+
+        for category in set(self.lines) - set(lines):
+            canvas.delete(self.lines.pop(category))
+        for n, (category, coords) in enumerate(sorted(lines.items())):
+            color = _color(category, n)
+            item = self.lines.get(category)
+            if item is None:
+                self.lines[category] = canvas.create_line(*coords, fill=color, width=2)
+            else:
+                canvas.coords(item, coords)
+            canvas.create_text(width - PAD_RIGHT, PAD_TOP + 14 * n, text=category, fill=color,
+                               anchor="ne", tags="axis")
+        if span is not None:
+            self._draw_axes(span, y_max, width, height)
+
+    def _draw_axes(self, span, y_max, width, height):
+        canvas = self.canvas
+        left, right, bottom = PAD_LEFT, width - PAD_RIGHT, height - PAD_BOTTOM
+        canvas.create_line(left, PAD_TOP, left, bottom, right, bottom, fill="gray40", tags="axis")
+        for i in range(5):
+            y = bottom - (bottom - PAD_TOP) * i / 4
+            canvas.create_line(left, y, right, y, fill="gray90", tags="axis")
+            canvas.create_text(left - 5, y, text=f"{y_max * i / 4:,.0f}", anchor="e", tags="axis")
+        canvas.create_text(left - 5, PAD_TOP - 8, text=self.ledger.display_currency, anchor="e",
+                           tags="axis")
+        x_min, x_max = span
+        ticks = min(6, x_max - x_min + 1)
+        for i in range(ticks):
+            day = x_min + (x_max - x_min) * i // max(ticks - 1, 1)
+            x = left + (right - left) * ((day - x_min) / ((x_max - x_min) or 1))
+            label = date.fromordinal(day).isoformat()
+            if self.step_var.get() == "Monthly":
+                label = label[:7]
+            canvas.create_text(x, bottom + 4, text=label, anchor="n", tags="axis")
+        canvas.tag_lower("axis")
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        self.top.destroy()
+        if self.on_close is not None:
+            self.on_close()
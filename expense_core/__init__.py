@@ -0,0 +1,11 @@
+"""GUI-free core of the expense tracker: storage, totals, rates and the CLI.
+
+Nothing here imports tkinter; `requests` (and NumPy, if installed) are
+only imported when first needed.
+"""
+from .config import (DATA_FILE, DB_FILE, SAVE_DELAY_SECONDS, STORAGE_BACKEND, UI_CATEGORIES,
+                     UI_CURRENCIES, UI_IMPORT_BATCH, UI_PAYMENTS, UI_REPEATS)
+from .helpers import normalize_currency, safe_float
+from .ledger import Ledger
+from .store import day_ordinal
+from .rates import RateManager
@@ -0,0 +1,124 @@
+import json
+import os
+from collections import namedtuple
+
+from .config import BUDGET_FILE, BUDGET_WARN_AT
+from .helpers import normalize_currency, safe_float
+from .store import MINOR_UNITS, to_minor
+
+# ============================================================
+# Monthly budgets
+# ============================================================
+# budgets.json = {category: {"amount": "500.00", "currency": "EUR"}}: one
+# limit per category, the same for every month. MonthlySpend keeps the
+# minor-unit sums per (category, month, currency), updated by the ledger
+# one mutation at a time like the Rollups, so checking one category's
+# month costs a factor lookup per currency it was paid in, whatever the
+# size of the ledger. The limits are converted into the display currency
+# once per rate refresh (Budgets.converted()), not on every check.
+BudgetStatus = namedtuple("BudgetStatus", "category month spent limit state")
+
+
+def budget_state(spent, limit, warn_at=BUDGET_WARN_AT):
+    """"over" past the limit, "near" from warn_at of it, else "ok"."""
+    if spent > limit:
+        return "over"
+    if spent >= limit * warn_at:
+        return "near"
+    return "ok"
+
+
+class MonthlySpend:
+    def __init__(self):
+        self.sums = {}   # (category, month) -> {currency: minor units}
+
+    @classmethod
+    def from_rollups(cls, rollups):
+        out = cls()
+        for (month, category, _payment, currency), minor in rollups.sums.items():
+            out._add(category, month, currency, minor)
+        return out
+
+    def _add(self, category, month, currency, minor):
+        bucket = self.sums.get((category, month))
+        if bucket is None:
+            bucket = self.sums[(category, month)] = {}
+        bucket[currency] = bucket.get(currency, 0) + minor
+
+    def add(self, rec, sign=1):
+        self._add(rec["category"], rec["date"][:7], rec["currency"], sign * to_minor(rec["amount"]))
+
+    def remove(self, rec):
+        self.add(rec, -1)
+
+    def spent(self, category, month, conversion, by_date=False):
+        """Spend of category in month (YYYY-MM), converted like the
+        reports: at the middle of the month's rate if by_date."""
+        bucket = self.sums.get((category, month))
+        if not bucket:
+            return 0.0
+        date_str = f"{month}-15" if by_date and len(month) == 7 else None
+        return sum(minor / MINOR_UNITS * conversion.factor(currency, date_str)
+                   for currency, minor in bucket.items())
+
+
+class Budgets:
+    def __init__(self, path=BUDGET_FILE):
+        self.path = path
+        self.limits = {}      # category -> (amount string, currency)
+        self._converted = {}  # target currency -> {category: limit in it}
+        self.load()
+
+    # ---------------- persistence ----------------
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception as e:
+            print("Budget file read error:", e)
+            return
+        self.limits = {category: (str(b["amount"]), normalize_currency(b["currency"]))
+                       for category, b in saved.items() if safe_float(b.get("amount")) > 0}
+        self._converted = {}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({category: {"amount": amount, "currency": currency}
+                       for category, (amount, currency) in sorted(self.limits.items())}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    # ---------------- limits ----------------
+    def set(self, category, amount, currency):
+        """Set category's monthly limit; an empty or zero amount removes it."""
+        if not category:
+            raise ValueError("A budget needs a category.")
+        value = safe_float(amount, None) if str(amount or "").strip() else 0.0
+        if value is None or value < 0:
+            raise ValueError("Budget must be a positive number.")
+        if value == 0:
+            self.limits.pop(category, None)
+        else:
+            currency = normalize_currency(currency)
+            if not currency:
+                raise ValueError("A budget needs a currency.")
+            self.limits[category] = (f"{value:.2f}", currency)
+        self._converted = {}
+        self.save()
+
+    def converted(self, conversion):
+        """{category: limit} in conversion's currency at the current rates;
+        computed once per target until rates_changed()."""
+        limits = self._converted.get(conversion.target)
+        if limits is None:
+            limits = self._converted[conversion.target] = {
+                category: safe_float(amount) * conversion.factor(currency)
+                for category, (amount, currency) in self.limits.items()}
+        return limits
+
+    def rates_changed(self):
+        self._converted = {}
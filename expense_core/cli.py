@@ -0,0 +1,335 @@
+import argparse
+import json
+import sys
+from datetime import date
+
+from .config import (DATA_FILE, DB_FILE, DISPLAY_CURRENCY, IMPORT_PAYMENT, SAVE_DELAY_SECONDS, SERVER_HOST,
+                     SERVER_PORT, STORAGE_BACKEND)
+from . import profiling
+from .exporter import ExportJob, format_for
+from .helpers import normalize_currency
+from .importer import CategoryRules, detect_format, import_statement
+from .ledger import Ledger
+from .metrics import dump_on_exit
+from .reports import ROLLUP_FIELDS
+from .store import day_ordinal
+
+
+# ============================================================
+# Command line interface
+# ============================================================
+# python -m expense_core [--backend partitioned|journal|sqlite] [--profile SPEC] [--metrics FILE] <command> ...
+#   add AMOUNT CURRENCY CATEGORY PAYMENT [DATE]
+#   list [--category C] [--currency C] [--payment P] [--from D] [--to D] [--limit N]
+#   total [--in CUR] [--offline]
+#   import FILE [--format json|csv|ofx] [--currency C] [--payment P] [--rules FILE]
+#               [--date-format FMT] [--all-expenses] [--column FIELD=HEADER ...]
+#                        JSON list (same shape as expenses.json), or a bank
+#                        CSV/OFX statement (importer.py); re-imports add no duplicates
+#   export FILE|- [--format csv|ndjson|json|parquet] [--convert CUR[,CUR...]]
+#                 [--category C] [--payment P] [--currency C] [--from D] [--to D]
+#                        format from the extension (JSON list for -); --convert
+#                        adds amount_<cur> columns (exporter.py)
+#   report [--by FIELD[,FIELD...]] [--from D] [--to D] [--category C] ... [--in CUR] [--offline]
+#          FIELD: month, category, payment, currency; dates are month-granular
+#   budget [CATEGORY [AMOUNT]] [--currency C] [--month YYYY-MM] [--in CUR] [--offline]
+#          with AMOUNT sets CATEGORY's monthly limit (0 removes it); otherwise
+#          lists the budgets against the month's spend (budgets.py)
+#   recurring [list | apply | add AMOUNT CURRENCY CATEGORY PAYMENT START [RULE] | remove ID]
+#          RULE: daily, weekly, monthly (default), yearly or RRULE-style
+#          "FREQ=WEEKLY;BYDAY=MO,TH" (recurring.py); apply records what has come due
+#   serve [--host H] [--port P]   share the ledger with local clients (server.py)
+# --profile cprofile:FILE|sample:FILE profiles the command (see profiling.py);
+# --metrics FILE writes the timers and counters as JSON when it finishes.
+def _check_saved(ledger):
+    err = ledger.take_save_error()
+    if err is not None:
+        raise err
+
+
+def _refresh_rates(ledger, offline):
+    # a fresh cache answers without touching the network
+    if not offline:
+        ledger.rate_mgr.fetch()
+
+
+def cmd_add(ledger, args):
+    date_str = args.date or date.today().isoformat()
+    # like the GUI: a bad date would become its own month in reports and budgets
+    if not day_ordinal(date_str):
+        raise ValueError("Date must be a valid YYYY-MM-DD.")
+    ledger.open(all_months=False)
+    exp_id = ledger.add(args.amount, args.currency, args.category, args.payment, date_str)
+    _check_saved(ledger)
+    print(exp_id)
+
+
+def cmd_list(ledger, args):
+    ledger.open()
+    shown = 0
+    currency = args.currency and normalize_currency(args.currency)
+    for rec in ledger.records(projected=False):
+        if args.category and rec["category"] != args.category:
+            continue
+        if currency and rec["currency"] != currency:
+            continue
+        if args.payment and rec["payment"] != args.payment:
+            continue
+        if args.date_from and rec["date"] < args.date_from:
+            continue
+        if args.date_to and rec["date"] > args.date_to:
+            continue
+        print("\t".join((rec["date"], rec["amount"], rec["currency"], rec["category"],
+                         rec["payment"], rec["id"])))
+        shown += 1
+        if args.limit and shown >= args.limit:
+            break
+
+
+def cmd_total(ledger, args):
+    count = ledger.open_totals_only()
+    _refresh_rates(ledger, args.offline)
+    currency = normalize_currency(args.in_currency)
+    print(f"{ledger.total(currency=currency):.2f} {currency} ({count} expenses, {ledger.rate_mgr.source} rates)")
+
+
+def _print_progress(stats):
+    print(f"\r{stats.progress:4.0%}  {stats.rows} rows", end="", file=sys.stderr, flush=True)
+
+
+def _print_export_progress(job):
+    print(f"\r{job.progress:4.0%}  {job.count} rows", end="", file=sys.stderr, flush=True)
+
+
+def cmd_import(ledger, args):
+    fmt = args.format or detect_format(args.file)
+    if fmt == "json":
+        ledger.open()
+        with open(args.file, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        count = ledger.import_records(records)
+        _check_saved(ledger)
+        print(f"Imported {count} expenses.")
+        return
+    columns = dict(c.split("=", 1) for c in args.column)
+    rules = CategoryRules.load(args.rules) if args.rules else None
+    ledger.open()
+    stats = import_statement(ledger, args.file, progress=_print_progress, fmt=fmt,
+                             currency=args.currency or "", payment=args.payment, rules=rules,
+                             date_format=args.date_format, expenses_negative=not args.all_expenses,
+                             columns=columns)
+    print(file=sys.stderr)
+    _check_saved(ledger)
+    for error in stats.errors:
+        print(error, file=sys.stderr)
+    print(f"Imported {stats.rows} rows: {stats.summary()}.")
+
+
+def cmd_export(ledger, args):
+    ledger.open()
+    fmt = args.format or ("json" if args.file == "-" else format_for(args.file))
+    convert_to = [c for c in (args.convert or "").split(",") if c.strip()]
+    if convert_to:
+        _refresh_rates(ledger, args.offline)
+    exp_ids = ledger.filter(category=args.category, payment=args.payment, currency=args.currency,
+                            date_from=args.date_from, date_to=args.date_to)
+    job = ExportJob(ledger, args.file, fmt, exp_ids, convert_to)
+    if args.file == "-":
+        job.run(sys.stdout.buffer if fmt == "parquet" else sys.stdout)
+        if fmt == "json":
+            print()
+        return
+    job.run(progress=_print_export_progress)
+    print(file=sys.stderr)
+    print(f"Exported {job.count} expenses.", file=sys.stderr)
+
+
+def cmd_report(ledger, args):
+    by = tuple(f.strip() for f in args.by.split(",") if f.strip())
+    unknown = [f for f in by if f not in ROLLUP_FIELDS]
+    if not by or unknown:
+        raise ValueError(f"--by takes {', '.join(ROLLUP_FIELDS)} (got {args.by!r})")
+    # report() loads the months it covers
+    ledger.open(all_months=False)
+    _refresh_rates(ledger, args.offline)
+    in_currency = normalize_currency(args.in_currency)
+    report = ledger.report(by=by, date_from=args.date_from, date_to=args.date_to, in_currency=in_currency,
+                           category=args.category, payment=args.payment,
+                           currency=args.currency and normalize_currency(args.currency))
+    rows = [("  ".join(v or "-" for v in key), total, count) for key, (total, count) in report.items()]
+    rows.sort()
+    width = max((len(label) for label, _, _ in rows), default=0)
+    for label, total, count in rows:
+        print(f"{label:<{width}}  {count:>7}  {total:>12.2f} {in_currency}")
+
+
+def cmd_budget(ledger, args):
+    if args.amount is not None:
+        ledger.set_budget(args.category, args.amount, args.currency)
+        limit = ledger.budget_limits().get(args.category)
+        print(f"{args.category}: {' '.join(limit)} a month" if limit else f"{args.category}: no budget")
+        return
+    # budget_report() loads the month if it is still on disk
+    ledger.open(all_months=False)
+    _refresh_rates(ledger, args.offline)
+    in_currency = normalize_currency(args.in_currency)
+    month = args.month or date.today().isoformat()[:7]
+    statuses = [s for s in ledger.budget_report(month, in_currency)
+                if not args.category or s.category == args.category]
+    width = max((len(s.category) for s in statuses), default=0)
+    for s in statuses:
+        state = "" if s.state == "ok" else s.state.upper()
+        print(f"{s.category:<{width}}  {s.spent:>12.2f} of {s.limit:>12.2f} {in_currency}  {state}".rstrip())
+
+
+def cmd_recurring(ledger, args):
+    if args.action == "list":
+        for rule in ledger.recurring_rules():
+            print("\t".join((rule["amount"], rule["currency"], rule["category"], rule["payment"], rule["rule"],
+                             f"next {rule['next'] or '-'}", rule["id"])))
+        return
+    if args.action == "remove":
+        if len(args.args) != 1:
+            raise ValueError("recurring remove takes a rule id.")
+        if not ledger.remove_recurring(args.args[0]):
+            raise ValueError(f"No recurring rule {args.args[0]!r}.")
+        print("Removed.")
+        return
+    # new records may land in any month, and their ids must be checked
+    # against the ones already on disk
+    ledger.open()
+    if args.action == "add":
+        if not 5 <= len(args.args) <= 6:
+            raise ValueError("recurring add takes AMOUNT CURRENCY CATEGORY PAYMENT START [RULE].")
+        rule_id = ledger.add_recurring(*args.args)
+        print(rule_id)
+    made = ledger.apply_recurring() if args.action == "apply" else 0
+    _check_saved(ledger)
+    if args.action == "apply":
+        print(f"Recorded {made} due expenses.")
+
+
+def cmd_serve(ledger, args):
+    from .server import serve
+    # writes are saved in the background, so requests never wait for the disk
+    ledger.save_delay = SAVE_DELAY_SECONDS
+    count = ledger.open(all_months=False)
+    ledger.apply_recurring()
+
+    def ready(server):
+        print(f"Serving {count} expenses on {server.host}:{server.port} (Ctrl+C to stop)",
+              file=sys.stderr, flush=True)
+    try:
+        serve(ledger, args.host, args.port, ready=ready)
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="expense_core", description="Headless expense tracker.")
+    p.add_argument("--backend", default=STORAGE_BACKEND, choices=("partitioned", "journal", "sqlite"))
+    p.add_argument("--data", default=DATA_FILE,
+                   help="JSON ledger (journal backend; partitioned keeps <name>_by_month/ next to it)")
+    p.add_argument("--db", default=DB_FILE, help="SQLite database (sqlite backend)")
+    p.add_argument("--profile", metavar="SPEC", help="cprofile:FILE or sample:FILE (default: $EXPENSE_PROFILE)")
+    p.add_argument("--metrics", metavar="FILE", help="write timing metrics as JSON on exit")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    a = sub.add_parser("add", help="add one expense")
+    a.add_argument("amount")
+    a.add_argument("currency")
+    a.add_argument("category")
+    a.add_argument("payment")
+    a.add_argument("date", nargs="?", help="YYYY-MM-DD (default: today)")
+    a.set_defaults(func=cmd_add)
+
+    ls = sub.add_parser("list", help="list expenses")
+    ls.add_argument("--category")
+    ls.add_argument("--currency")
+    ls.add_argument("--payment")
+    ls.add_argument("--from", dest="date_from")
+    ls.add_argument("--to", dest="date_to")
+    ls.add_argument("--limit", type=int)
+    ls.set_defaults(func=cmd_list)
+
+    t = sub.add_parser("total", help="grand total")
+    t.add_argument("--in", dest="in_currency", default=DISPLAY_CURRENCY,
+                   help=f"currency of the total (default: {DISPLAY_CURRENCY})")
+    t.add_argument("--offline", action="store_true", help="don't fetch rates")
+    t.set_defaults(func=cmd_total)
+
+    i = sub.add_parser("import", help="import a JSON list of expenses or a bank CSV/OFX statement")
+    i.add_argument("file")
+    i.add_argument("--format", choices=("json", "csv", "ofx", "qfx"), help="default: from the file")
+    i.add_argument("--currency", help="currency of rows that don't name one")
+    i.add_argument("--payment", default=IMPORT_PAYMENT, help=f"payment method (default: {IMPORT_PAYMENT})")
+    i.add_argument("--rules", help='JSON list of {"match": regex, "category": name} tried first')
+    i.add_argument("--date-format", help="strptime format of the dates (default: the one format that fits them all)")
+    i.add_argument("--all-expenses", action="store_true",
+                   help="every row is an expense (default: positive amounts are money in and skipped)")
+    i.add_argument("--column", action="append", default=[], metavar="FIELD=HEADER",
+                   help="CSV header of date, amount, debit, credit, currency or payer")
+    i.set_defaults(func=cmd_import)
+
+    e = sub.add_parser("export", help="export expenses as CSV, NDJSON, JSON or Parquet")
+    e.add_argument("file", help="output path (.csv, .ndjson, .json, .parquet), or - for stdout")
+    e.add_argument("--format", choices=("csv", "ndjson", "json", "parquet"), help="default: from the file name")
+    e.add_argument("--convert", metavar="CUR[,CUR...]", help="add the amount converted to these currencies")
+    e.add_argument("--category")
+    e.add_argument("--payment")
+    e.add_argument("--currency", help="only expenses in this currency")
+    e.add_argument("--from", dest="date_from", help="first date (YYYY-MM-DD)")
+    e.add_argument("--to", dest="date_to", help="last date (YYYY-MM-DD)")
+    e.add_argument("--offline", action="store_true", help="don't fetch rates")
+    e.set_defaults(func=cmd_export)
+
+    r = sub.add_parser("report", help="totals grouped by one or more fields")
+    r.add_argument("--by", default="category", help="comma-separated: " + ", ".join(ROLLUP_FIELDS))
+    r.add_argument("--from", dest="date_from", help="first month (YYYY-MM or a date)")
+    r.add_argument("--to", dest="date_to", help="last month (YYYY-MM or a date)")
+    r.add_argument("--category")
+    r.add_argument("--payment")
+    r.add_argument("--currency", help="only expenses in this currency")
+    r.add_argument("--in", dest="in_currency", default=DISPLAY_CURRENCY,
+                   help=f"currency of the totals (default: {DISPLAY_CURRENCY})")
+    r.add_argument("--offline", action="store_true", help="don't fetch rates")
+    r.set_defaults(func=cmd_report)
+
+    b = sub.add_parser("budget", help="set a category's monthly budget, or list the budgets")
+    b.add_argument("category", nargs="?")
+    b.add_argument("amount", nargs="?", help="monthly limit (0 removes it)")
+    b.add_argument("--currency", help=f"currency of the limit (default: {DISPLAY_CURRENCY})")
+    b.add_argument("--month", help="YYYY-MM to list (default: this month)")
+    b.add_argument("--in", dest="in_currency", default=DISPLAY_CURRENCY,
+                   help=f"currency of the listing (default: {DISPLAY_CURRENCY})")
+    b.add_argument("--offline", action="store_true", help="don't fetch rates")
+    b.set_defaults(func=cmd_budget)
+
+    rc = sub.add_parser("recurring", help="list, add or remove recurring expenses, or record the due ones")
+    rc.add_argument("action", nargs="?", default="list", choices=("list", "add", "remove", "apply"))
+    rc.add_argument("args", nargs="*", metavar="ARG")
+    rc.set_defaults(func=cmd_recurring)
+
+    s = sub.add_parser("serve", help="serve the ledger to local clients (the GUI with EXPENSE_SERVER=host:port)")
+    s.add_argument("--host", default=SERVER_HOST, help=f"address to listen on (default: {SERVER_HOST})")
+    s.add_argument("--port", type=int, default=SERVER_PORT)
+    s.set_defaults(func=cmd_serve)
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.start(args.profile)
+    else:
+        profiling.start_from_env()
+    dump_on_exit(args.metrics)
+    ledger = Ledger(backend=args.backend, data_file=args.data, db_file=args.db)
+    try:
+        args.func(ledger, args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        ledger.close()
+    return 0
@@ -0,0 +1,376 @@
+import itertools
+import json
+import os
+import socket
+import threading
+from collections import deque
+from datetime import date
+from types import SimpleNamespace
+
+from . import config
+from .helpers import normalize_currency
+from .budgets import BudgetStatus
+from .ledger import LOAD_CHUNK, ChangeSet
+from .metrics import metrics
+from .rates import CrossRates
+from .server import FIELDS, encode, parse_address
+from .store import ExpenseStore
+
+SERVER_ENV = "EXPENSE_SERVER"
+
+
+def server_address():
+    """"host:port" of the ledger server to use, or None to open the file directly."""
+    return os.environ.get(SERVER_ENV) or config.SERVER_ADDRESS
+
+
+class RemoteError(RuntimeError):
+    """An error the server reported for a request."""
+
+
+class Selection(list):
+    """filter() result: the ids, plus the query that produced them so
+    total()/sorted_ids() can send the query instead of every id."""
+
+    def __init__(self, ids, query):
+        super().__init__(ids)
+        self.query = query
+
+
+# ============================================================
+# RemoteLedger: a Ledger served by `python -m expense_core serve`
+# ============================================================
+# Has the Ledger methods the Tk app uses, so the app works unchanged
+# against a shared server: writes and queries are requests (see
+# server.py), and the rows themselves are mirrored locally from the
+# server's "changed" events so the table can render without a round trip.
+# Events are applied on the owning thread: by poll(), which the reader
+# thread asks `dispatch` to schedule (the app passes its _call_in_ui), and
+# after every request, so a request's answer never refers to rows the
+# mirror hasn't seen. Listeners get one merged ChangeSet per poll().
+class RemoteLedger:
+    def __init__(self, address=None, dispatch=None, timeout=10):
+        host, port = parse_address(address or server_address() or config.SERVER_PORT)
+        self.address = f"{host}:{port}"
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.dispatch = dispatch
+        self.display_currency = config.DISPLAY_CURRENCY
+        self.convert_at_expense_date = False   # the mirror only has current rates
+        self.expenses = ExpenseStore()
+        self.projected = set()   # ids of the server's coming recurring rows
+        self.rate_mgr = RemoteRates(self)
+        self.storage = SimpleNamespace(load_progress=None)
+        self.writer = None     # saving happens in the server
+        self.on_saved = None
+        self.listeners = []
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._responses = {}
+        self._events = deque()
+        self._loading = False
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    # ---------------- connection ----------------
+    def _read_loop(self):
+        # reader thread: responses wake their caller, events wait for poll()
+        try:
+            for line in self.sock.makefile("rb"):
+                msg = json.loads(line)
+                with self._cond:
+                    if "event" in msg:
+                        self._events.append(msg)
+                    else:
+                        self._responses[msg["id"]] = msg
+                        self._cond.notify_all()
+                if "event" in msg and self.dispatch is not None:
+                    self.dispatch(self.poll)
+        except (OSError, ValueError):
+            pass
+        with self._cond:
+            lost = not self._closed
+            self._closed = True
+            self._cond.notify_all()
+        if lost and self.on_saved is not None:
+            self.on_saved(ConnectionError(f"Lost connection to the expense server at {self.address}."), 0)
+
+    def call(self, method, **params):
+        """Send one request and wait for its result (RemoteError, or
+        ValueError for the ledger's validation errors, on failure)."""
+        rid = next(self._ids)
+        with metrics.timer("client." + method):
+            with self._send_lock:
+                if self._closed:
+                    raise ConnectionError(f"Not connected to the expense server at {self.address}.")
+                self.sock.sendall(encode({"id": rid, "method": method, "params": params}))
+            with self._cond:
+                while rid not in self._responses:
+                    if self._closed:
+                        raise ConnectionError(f"Lost connection to the expense server at {self.address}.")
+                    self._cond.wait()
+                msg = self._responses.pop(rid)
+        self.poll()
+        if "error" in msg:
+            raise (ValueError if msg.get("type") == "ValueError" else RemoteError)(msg["error"])
+        return msg["result"]
+
+    def poll(self):
+        """Apply the events received so far and notify the listeners."""
+        if self._loading:
+            return   # open_chunks() applies them once the mirror is complete
+        changes = ChangeSet()
+        while True:
+            with self._cond:
+                if not self._events:
+                    break
+                msg = self._events.popleft()
+            kind = msg["event"]
+            if kind == "changed":
+                self._apply_changes(msg, changes)
+            elif kind == "rates":
+                self.rate_mgr._fetched(msg["online"], msg["source"], msg["currencies"], msg["rates"])
+            elif kind == "saved" and self.on_saved is not None:
+                error = msg["error"]
+                self.on_saved(None if error is None else RemoteError(error), msg["count"])
+        if changes:
+            for listener in self.listeners:
+                listener(changes)
+
+    def _apply_changes(self, msg, changes):
+        if "projected" in msg:
+            self.projected = set(msg["projected"])
+        if msg["cleared"]:
+            self.expenses.clear()
+            changes.note("clear", ())
+        for exp_id in msg["removed"]:
+            if self.expenses.remove(exp_id) is not None:
+                changes.note("delete", (exp_id,))
+        for row in msg["added"]:
+            rec = dict(zip(FIELDS, row))
+            self.expenses.add(rec)
+            changes.note("add", (rec,))
+        for row in msg["updated"]:
+            rec = dict(zip(FIELDS, row))
+            if rec["id"] in self.expenses:
+                self.expenses.update(rec)
+                changes.note("update", (rec,))
+            else:
+                self.expenses.add(rec)
+                changes.note("add", (rec,))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def flush(self):
+        self.call("flush")
+
+    # ---------------- loading ----------------
+    def open(self, all_months=True):
+        for _changes in self.open_chunks():
+            pass
+        if all_months:
+            self.load_partitions()
+        return len(self.expenses)
+
+    def open_chunks(self, chunk_size=LOAD_CHUNK):
+        """Subscribe and mirror the server's rows, yielding a ChangeSet per
+        chunk like Ledger.open_chunks()."""
+        self._loading = True
+        try:
+            opened = self.call("open")
+            rows = opened["rows"]
+            self.rate_mgr.source = opened["source"]
+            self.rate_mgr.codes = opened["currencies"]
+            self.rate_mgr.cross = CrossRates(opened["rates"])
+            self.expenses = ExpenseStore()
+            self.projected = set(opened["projected"])
+            for start in range(0, len(rows), chunk_size):
+                changes = ChangeSet()
+                for row in rows[start:start + chunk_size]:
+                    self.expenses.add(dict(zip(FIELDS, row)))
+                    changes.added[row[0]] = None
+                self.storage.load_progress = min(start + chunk_size, len(rows)) / len(rows)
+                yield changes
+        finally:
+            self._loading = False
+        self.poll()
+
+    @property
+    def unloaded(self):
+        """Months the server still has on disk only."""
+        return self.call("unloaded")
+
+    def load_older(self):
+        return self.call("load_older")
+
+    def load_partitions(self, months=None):
+        return self.call("load_partitions", months=months)
+
+    def count(self):
+        return self.call("count")
+
+    # ---------------- reading ----------------
+    def __len__(self):
+        return len(self.expenses)
+
+    def __contains__(self, exp_id):
+        return exp_id in self.expenses
+
+    def ids(self, projected=True):
+        if projected or not self.projected:
+            return iter(self.expenses)
+        return (i for i in self.expenses if i not in self.projected)
+
+    def get(self, exp_id):
+        return self.expenses.get(exp_id)
+
+    def records(self, projected=True):
+        if projected or not self.projected:
+            return self.expenses.records()
+        return (rec for rec in self.expenses.records() if rec["id"] not in self.projected)
+
+    def row_values(self, exp_id):
+        # a row removed by another client may be drawn once more before
+        # its event reaches the table
+        if exp_id not in self.expenses:
+            return ("", "", "", "", "")
+        return self.expenses.row_values(exp_id)
+
+    @staticmethod
+    def _subset(exp_ids):
+        if exp_ids is None:
+            return {}
+        if isinstance(exp_ids, Selection):
+            return {"filter": exp_ids.query}
+        return {"ids": list(exp_ids)}
+
+    def set_display_currency(self, currency):
+        self.display_currency = normalize_currency(currency) or config.DISPLAY_CURRENCY
+
+    def total(self, exp_ids=None, currency=None):
+        return self.call("total", currency=currency or self.display_currency, **self._subset(exp_ids))
+
+    def total_between(self, date_from=None, date_to=None, currency=None):
+        return self.call("total_between", date_from=date_from, date_to=date_to,
+                         currency=currency or self.display_currency)
+
+    def total_last_days(self, days, today=None, currency=None):
+        return self.call("total_last_days", days=days, today=(today or date.today()).isoformat(),
+                         currency=currency or self.display_currency)
+
+    def filter(self, **filters):
+        ids = self.call("filter", **filters)
+        return None if ids is None else Selection(ids, filters)
+
+    def sorted_ids(self, column, descending=False, exp_ids=None):
+        return self.call("sort", column=column, descending=descending, **self._subset(exp_ids))
+
+    def rates_changed(self):
+        pass   # the server recomputes its factors when it fetches rates
+
+    def report(self, by="category", date_from=None, date_to=None, in_currency=None, **filters):
+        rows = self.call("report", by=by, date_from=date_from, date_to=date_to,
+                         in_currency=in_currency or self.display_currency, **filters)
+        return {tuple(key) if isinstance(key, list) else key: (usd, count) for key, usd, count in rows}
+
+    def spend_series(self, step="month", currency=None):
+        series = self.call("spend_series", step=step, currency=currency or self.display_currency)
+        return {category: dict(points) for category, points in series.items()}
+
+    def set_budget(self, category, amount, currency=None):
+        self.call("set_budget", category=category, amount=amount, currency=currency or self.display_currency)
+
+    def budget_limits(self):
+        return {category: tuple(limit) for category, limit in self.call("budget_limits").items()}
+
+    def budget_status(self, category, month, currency=None):
+        status = self.call("budget_status", category=category, month=month,
+                           currency=currency or self.display_currency)
+        return None if status is None else BudgetStatus(*status)
+
+    def budget_report(self, month, currency=None):
+        return [BudgetStatus(*s) for s in self.call("budget_report", month=month,
+                                                    currency=currency or self.display_currency)]
+
+    def recurring_rules(self):
+        return self.call("recurring")
+
+    def add_recurring(self, amount, currency, category, payment, start, rule="monthly"):
+        return self.call("add_recurring", amount=amount, currency=currency, category=category,
+                         payment=payment, start=start, rule=rule)
+
+    def remove_recurring(self, rule_id):
+        return self.call("remove_recurring", id=rule_id)
+
+    def apply_recurring(self):
+        return self.call("apply_recurring")
+
+    # ---------------- writing ----------------
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def take_save_error(self):
+        return None   # the server saves in the background; errors come through on_saved
+
+    def add(self, amount, currency, category, payment, date_str, exp_id=None):
+        return self.call("add", amount=amount, currency=currency, category=category,
+                         payment=payment, date=date_str, id=exp_id)
+
+    def edit(self, exp_id, amount, currency, category, payment, date_str):
+        return self.call("edit", id=exp_id, amount=amount, currency=currency, category=category,
+                         payment=payment, date=date_str)
+
+    def delete(self, exp_ids):
+        return self.call("delete", ids=list(exp_ids))
+
+    def recategorize(self, exp_ids, category):
+        return self.call("recategorize", ids=list(exp_ids), category=category)
+
+    def clear(self):
+        self.call("clear")
+
+    def import_records(self, records, replace=True):
+        return self.call("import", records=list(records), replace=replace)
+
+
+class RemoteRates:
+    """The part of RateManager the app uses; the server does the fetching
+    and sends its current rates along (no history)."""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.source = "fallback"
+        self.codes = ["USD"]
+        self.cross = CrossRates({})
+        self._callbacks = []
+
+    def currencies(self):
+        return self.codes
+
+    def factor(self, currency, to="USD", date_str=None):
+        src, dst = normalize_currency(currency), normalize_currency(to)
+        return 1.0 if src == dst else self.cross.factor(src, dst)
+
+    def fetch_async(self, callback, force=False):
+        """Ask the server to refresh; callback(online) runs on the "rates" event."""
+        if callback not in self._callbacks:
+            self._callbacks.append(callback)
+        self.ledger.call("refresh_rates", force=force)
+
+    def _fetched(self, online, source, codes, rates):
+        self.source = source
+        self.codes = codes
+        self.cross = CrossRates(rates)
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(online)
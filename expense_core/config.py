@@ -0,0 +1,53 @@
+# ============================================================
+# Configuration
+# ============================================================
+DATA_FILE = "expenses.json"          # persisted data
+DB_FILE   = "expenses.db"            # used when STORAGE_BACKEND = "sqlite"
+STORAGE_BACKEND = "partitioned"      # "partitioned" (per month), "journal" or "sqlite"
+# partitioned backend: months loaded at startup (this one and the one before);
+# older months are read when a filter, sort, report or scroll reaches them
+EAGER_MONTHS = 2
+API_URL   = "https://api.exchangerate-api.com/v4/latest/USD"
+# currency totals and reports are shown in (any code in the rate table)
+DISPLAY_CURRENCY = "USD"
+# convert each expense at the cached rate closest to its own date
+CONVERT_AT_EXPENSE_DATE = True
+# monthly limit per category, and the share of it that starts the warnings
+BUDGET_FILE = "budgets.json"
+BUDGET_WARN_AT = 0.9
+# recurring expenses: the rules, and how many days ahead the coming
+# occurrences are shown (and counted) before they are due
+RECURRING_FILE = "recurring.json"
+RECURRING_LOOKAHEAD_DAYS = 31
+# the GUI saves in the background, merging changes made within this many seconds
+SAVE_DELAY_SECONDS = 0.3
+# bank statement import: payment method of imported rows, and the category
+# of the first pattern (regex, case-insensitive) found in the payer
+IMPORT_PAYMENT = "Credit Card"
+IMPORT_DEFAULT_CATEGORY = "Life expense"
+IMPORT_RULES = [
+    (r"electric|power|edf", "Electricity"),
+    (r"\bgas\b|petrol|fuel", "Gas"),
+    (r"\brent\b|landlord|lease", "Rental"),
+    (r"grocer|supermarket|market|carrefour|spinneys|lidl|aldi|tesco", "Grocery"),
+    (r"school|universit|college|course|tuition|udemy|coursera", "Education"),
+    (r"charity|donation|zakat|unicef|red cross|red crescent", "Charity"),
+    (r"savings|deposit to|transfer to saving", "Saving"),
+]
+# shared ledger: `python -m expense_core serve` owns the data and the GUI
+# connects to it when SERVER_ADDRESS (or $EXPENSE_SERVER) is "host:port"
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_ADDRESS = None
+
+# currencies offered in UI (first item blank = no selection)
+UI_CURRENCIES = ["", "USD", "GBP", "EUR", "EGP", "EURO"]  # EURO auto-mapped -> EUR
+UI_CATEGORIES = [
+    "", "Life expense", "Electricity", "Gas", "Rental",
+    "Grocery", "Saving", "Education", "Charity"
+]
+UI_PAYMENTS   = ["", "Cash", "Credit Card", "Paypal"]
+# "Repeat" choices of the form (an RRULE-style rule can be typed in too)
+UI_REPEATS    = ["", "Daily", "Weekly", "Monthly", "Yearly"]
+# rows per event-loop turn when the window imports a statement
+UI_IMPORT_BATCH = 5_000
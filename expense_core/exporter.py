@@ -0,0 +1,205 @@
+import csv
+import json
+import os
+import threading
+from array import array
+from decimal import Decimal
+
+from .helpers import normalize_currency
+from .metrics import metrics
+from .rates import Conversion
+
+EXPORT_CHUNK = 10_000   # records decoded and written per step
+
+# ============================================================
+# Export
+# ============================================================
+# ExportJob writes the ledger (or a filter() result) as CSV, NDJSON, JSON
+# or Parquet. The rows are picked and the store's columns copied
+# (ExpenseStore.frozen(), a few memcpys) on the ledger's own thread; the
+# worker thread then decodes EXPORT_CHUNK records at a time from that copy
+# and hands them to the format's writer, so the ledger can keep changing
+# meanwhile and the full ledger never exists as one list of records.
+# convert_to adds an amount_<cur> column per currency, converted like the
+# totals (rates.Conversion). Output goes to "<path>.part" and is renamed
+# into place when complete; a cancelled or failed export leaves no file.
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "json",
+           ".parquet": "parquet", ".pq": "parquet"}
+
+
+def format_for(path):
+    """Export format named by path's extension."""
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Can't tell the export format of {path!r} (csv, ndjson, json, parquet).")
+    return fmt
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:  # optional: only Parquet export needs it
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).") from None
+    return pyarrow
+
+
+# ---------------- writers ----------------
+# writer(f, columns, chunks): chunks yields lists of rows (value lists in
+# column order); text formats get a text file, Parquet a binary one.
+def write_csv(f, columns, chunks):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows(chunk)
+
+
+def write_ndjson(f, columns, chunks):
+    for chunk in chunks:
+        f.write("".join(json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n"
+                        for row in chunk))
+
+
+def write_json(f, columns, chunks):
+    # the layout json.dump(records, f, indent=2) gives, one record at a time
+    sep = "[\n  "
+    for chunk in chunks:
+        for row in chunk:
+            f.write(sep + json.dumps(dict(zip(columns, row)), indent=2).replace("\n", "\n  "))
+            sep = ",\n  "
+    f.write("[]" if sep == "[\n  " else "\n]")
+
+
+def write_parquet(f, columns, chunks):
+    """One row group per chunk; amount as decimal(18, 2), the converted
+    amounts as doubles, everything else as strings."""
+    pa = _pyarrow()
+    types = [pa.decimal128(18, 2) if c == "amount" else pa.float64() if c.startswith("amount_")
+             else pa.string() for c in columns]
+    schema = pa.schema(list(zip(columns, types)))
+    with pa.parquet.ParquetWriter(f, schema) as writer:
+        for chunk in chunks:
+            arrays = []
+            for name, typ, values in zip(columns, types, zip(*chunk)):
+                if name == "amount":
+                    values = [Decimal(v) for v in values]
+                elif name.startswith("amount_"):
+                    values = [float(v) for v in values]
+                arrays.append(pa.array(values, type=typ))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+WRITERS = {"csv": write_csv, "ndjson": write_ndjson, "json": write_json, "parquet": write_parquet}
+
+
+def _open(path, fmt):
+    if fmt == "parquet":
+        return open(path, "wb")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+# ---------------- job ----------------
+class ExportJob:
+    """One export. run() writes it on the calling thread, start() on a
+    worker thread; progress, count, error and cancelled can be read from
+    any thread meanwhile."""
+
+    def __init__(self, ledger, path, fmt=None, exp_ids=None, convert_to=(), chunk_size=EXPORT_CHUNK):
+        self.path = path
+        self.fmt = fmt or format_for(path)
+        if self.fmt not in WRITERS:
+            raise ValueError(f"Unsupported export format {self.fmt!r} ({', '.join(WRITERS)}).")
+        if self.fmt == "parquet":
+            _pyarrow()   # fail now, not on the worker thread
+        if exp_ids is None:
+            ledger.load_partitions()
+        store = ledger.expenses
+        if ledger.projected:
+            # coming recurring rows are not expenses yet
+            exp_ids = [i for i in (store if exp_ids is None else exp_ids) if i not in ledger.projected]
+        self.rows = None if exp_ids is None else array("q", map(store.row_of, exp_ids))
+        self.store = store.frozen()
+        self.total = len(self.store) if self.rows is None else len(self.rows)
+        targets = [normalize_currency(c) for c in convert_to]
+        self.conversions = [Conversion(ledger.rate_mgr, c) for c in targets]
+        self.by_date = ledger.convert_at_expense_date
+        self.columns = ["id", "amount", "currency", "category", "payment", "date"]
+        self.columns += ["amount_" + c.lower() for c in targets]
+        self.chunk_size = chunk_size
+        self.count = 0          # records written so far
+        self.error = None
+        self.cancelled = False
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def progress(self):
+        return self.count / self.total if self.total else 1.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def cancel(self):
+        """Stop after the chunk being written; the partial file is removed."""
+        self._cancel.set()
+
+    def _chunks(self, progress):
+        conversions, by_date = self.conversions, self.by_date
+        for records in self.store.chunks(self.rows, self.chunk_size):
+            if self._cancel.is_set():
+                self.cancelled = True
+                return
+            rows = []
+            for rec in records:
+                row = list(rec.values())
+                for convert in conversions:
+                    row.append(f"{convert(rec['amount'], rec['currency'], rec['date'] if by_date else None):.2f}")
+                rows.append(row)
+            yield rows
+            self.count += len(rows)
+            metrics.incr("export.rows", len(rows))
+            if progress is not None:
+                progress(self)
+
+    @metrics.timed("export.run")
+    def run(self, out=None, progress=None):
+        """Write the export to path (or to out, an open file of the right
+        kind); progress(job) after each chunk. Returns the count written."""
+        write = WRITERS[self.fmt]
+        if out is not None:
+            write(out, self.columns, self._chunks(progress))
+            return self.count
+        part = self.path + ".part"
+        try:
+            with _open(part, self.fmt) as f:
+                write(f, self.columns, self._chunks(progress))
+            if self.cancelled:
+                os.remove(part)
+            else:
+                os.replace(part, self.path)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        return self.count
+
+    def start(self, on_done=None):
+        """Run on a worker thread; on_done(job) is called on that thread
+        when it finishes (check job.error and job.cancelled)."""
+        self._thread = threading.Thread(target=self._work, args=(on_done,), daemon=True)
+        self._thread.start()
+        return self
+
+    def _work(self, on_done):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+        if on_done is not None:
+            on_done(self)
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
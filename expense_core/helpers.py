@@ -0,0 +1,16 @@
+# ============================================================
+# Helpers
+# ============================================================
+def normalize_currency(code: str) -> str:
+    """Map UI value to API/standard 3-letter code."""
+    code = (code or "").strip().upper()
+    if code == "EURO":
+        return "EUR"
+    return code
+
+
+def safe_float(s, default=0.0):
+    try:
+        return float(s)
+    except Exception:
+        return default
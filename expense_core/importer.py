@@ -0,0 +1,421 @@
+import csv
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from .config import IMPORT_DEFAULT_CATEGORY, IMPORT_PAYMENT, IMPORT_RULES
+from .helpers import normalize_currency
+from .metrics import metrics
+from .store import format_minor, to_minor
+
+IMPORT_BATCH = 50_000   # rows per ledger batch (one persistence write each)
+DATE_SAMPLE = 10_000    # rows held back at most while the date format is unclear
+
+# ============================================================
+# Bank statement import
+# ============================================================
+# A statement streams through generator stages, one row at a time, so a
+# file of any size is never held in memory:
+#   read_csv / read_ofx   raw rows {line, date, amount, currency, payer}
+#   normalize             currency codes (normalize_currency), amounts
+#                         (money out becomes a positive expense; money in
+#                         is skipped) and dates (YYYY-MM-DD)
+#   categorize            first CategoryRules pattern matching the payer
+#   validate              drops rows without a usable amount or date
+#   with_ids              content-hash ids (see below)
+# import_chunks() commits the rows in batches through
+# Ledger.import_records(replace=False): one batch, one persistence write.
+#
+# Readers take (path, stats, columns) and count what they consume in
+# stats.consumed for the progress bar.
+#
+# Duplicates: a row's id is a (uuid4-shaped) UUID derived from a hash of (date, amount,
+# currency, payer) and the number of identical rows before it in the same
+# file. Re-importing a statement, or one that overlaps an earlier one,
+# produces the same ids, and the ledger skips ids it already has; two
+# genuinely identical purchases on one day stay two rows.
+_CSV_COLUMNS = {
+    "date": ("date", "transaction date", "posting date", "booking date", "value date", "posted"),
+    "amount": ("amount", "transaction amount", "value"),
+    "debit": ("debit", "withdrawal", "money out", "paid out"),
+    "credit": ("credit", "deposit", "money in", "paid in"),
+    "currency": ("currency", "ccy", "currency code"),
+    "payer": ("description", "payee", "name", "merchant", "details", "narrative", "memo", "reference"),
+}
+# the formats a statement's dates may be in when none is given
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y%m%d",
+                 "%m/%d/%Y", "%d %b %Y", "%d %B %Y")
+_AMBIGUOUS = object()
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+# most amounts are already canonical ("-12.50"): no Decimal round trip
+_PLAIN_AMOUNT = re.compile(r"(-?)((?:[1-9]\d*|0)\.\d\d)")
+
+
+class ImportStats:
+    """Counts for one import; import_chunks() yields it after every batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.consumed = 0      # bytes (characters) read so far
+        self.rows = 0          # transactions read
+        self.added = 0
+        self.duplicates = 0
+        self.skipped = 0       # money in, not an expense
+        self.invalid = 0
+        self.errors = []       # first few "line N: reason" messages
+
+    @property
+    def progress(self):
+        return min(self.consumed / self.size, 1.0) if self.size else 1.0
+
+    def reject(self, row, reason):
+        self.invalid += 1
+        if len(self.errors) < 20:
+            self.errors.append(f"line {row['line']}: {reason}")
+
+    def summary(self):
+        parts = [f"{self.added} added", f"{self.duplicates} duplicates"]
+        if self.skipped:
+            parts.append(f"{self.skipped} incoming skipped")
+        if self.invalid:
+            parts.append(f"{self.invalid} invalid")
+        return ", ".join(parts)
+
+
+# ---------------- readers ----------------
+def _counted_lines(f, stats):
+    for line in f:
+        stats.consumed += len(line)
+        yield line
+
+
+def _find_column(fieldnames, names):
+    lowered = {(name or "").strip().lower(): name for name in fieldnames}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    return None
+
+
+def read_csv(path, stats, columns=None):
+    """Rows of a bank CSV export. Columns are found by their header names
+    (see _CSV_COLUMNS) unless columns maps field -> header."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(_counted_lines(f, stats))
+        header = next(reader, None)
+        if header is None:
+            return
+        found = {field: _find_column(header, names) for field, names in _CSV_COLUMNS.items()}
+        found.update(columns or {})
+        pos = {field: header.index(name) for field, name in found.items() if name in header}
+        if "date" not in pos or not ("amount" in pos or "debit" in pos):
+            raise ValueError(f"{path}: no date/amount columns in header {header}")
+        date_i, payer_i, currency_i = pos.get("date"), pos.get("payer"), pos.get("currency")
+        amount_i, debit_i, credit_i = pos.get("amount"), pos.get("debit"), pos.get("credit")
+        width = len(header)
+        for line, values in enumerate(reader, start=2):
+            if not values or not any(values):
+                continue
+            if len(values) < width:
+                values += [""] * (width - len(values))
+            if amount_i is not None:
+                amount = values[amount_i]
+            elif values[debit_i].strip():
+                amount = "-" + values[debit_i].strip().lstrip("-")   # money out
+            else:
+                amount = values[credit_i] if credit_i is not None else ""
+            yield {"line": line, "date": values[date_i], "amount": amount,
+                   "currency": values[currency_i] if currency_i is not None else "",
+                   "payer": values[payer_i] if payer_i is not None else ""}
+
+
+def read_ofx(path, stats, columns=None):
+    """Transactions of an OFX/QFX file (SGML 1.x or XML 2.x), tag by tag."""
+    currency = ""
+    txn = None
+    line = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for text in _counted_lines(f, stats):
+            line += 1
+            for closing, tag, value in _OFX_TAG.findall(text):
+                tag = tag.upper()
+                value = value.strip()
+                if tag == "STMTTRN":
+                    if not closing:
+                        txn = {"line": line, "date": "", "amount": "", "currency": currency, "payer": ""}
+                    elif txn is not None:
+                        yield txn
+                        txn = None
+                elif closing:
+                    continue
+                elif tag == "CURDEF":
+                    currency = value
+                elif txn is None:
+                    continue
+                elif tag == "DTPOSTED":
+                    txn["date"] = value[:8]
+                elif tag == "TRNAMT":
+                    txn["amount"] = value
+                elif tag == "CURSYM":
+                    txn["currency"] = value
+                elif tag == "NAME" or (tag == "MEMO" and not txn["payer"]):
+                    txn["payer"] = value
+
+
+READERS = {"csv": read_csv, "ofx": read_ofx, "qfx": read_ofx}
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in READERS or ext == "json":
+        return ext
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.read(512).lstrip()
+    if head.startswith(("[", "{")):
+        return "json"
+    return "ofx" if "OFXHEADER" in head or "<OFX>" in head.upper() else "csv"
+
+
+# ---------------- stages ----------------
+def parse_amount(text):
+    """Decimal for a bank amount ("-1,234.50", "(12.00)", "12,50 EGP",
+    "$8"), or None."""
+    s = re.sub(r"[^\d,.\-()]", "", text or "")
+    negative = s.startswith("(") and s.endswith(")") or s.startswith("-") or s.endswith("-")
+    s = s.strip("()-")
+    if "," in s:
+        # "1,234.50" / "1.234,50" / "12,50": the last separator is the decimal one
+        if "." in s and s.rfind(".") > s.rfind(","):
+            s = s.replace(",", "")
+        elif len(s) - s.rfind(",") - 1 in (1, 2):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    try:
+        value = Decimal(s)
+    except InvalidOperation:
+        return None
+    if not value.is_finite():
+        return None
+    return -value if negative else value
+
+
+class AmbiguousDates(ValueError):
+    """The statement's dates read differently in more than one format
+    (05/03/2024: day or month first) and none of them tells which."""
+
+    def __init__(self, sample, formats):
+        super().__init__(f"Can't tell how dates like {sample} are written; "
+                         f"give the date format ({' or '.join(formats)}).")
+        self.sample = sample
+        self.formats = formats
+
+
+class DateParser:
+    """Raw date -> YYYY-MM-DD (or None), memoized: a statement has few
+    distinct dates.
+
+    One format holds for the whole file. self.formats keeps those that
+    every date so far parses with; while they read a date differently
+    (05/03/2024) it is _AMBIGUOUS, until a later date (25/03/2024) rules
+    out all but one."""
+
+    def __init__(self, date_format=None):
+        self.formats = (date_format,) if date_format else _DATE_FORMATS
+        self.cache = {}     # text -> date, for dates no format left can change
+        self.readings = {}  # text -> {format: date} for the others
+
+    def __call__(self, text):
+        text = (text or "").strip()
+        iso = self.cache.get(text)
+        if iso is not None or text in self.cache:
+            return iso
+        readings = self.readings.get(text)
+        if readings is None:
+            readings = {}
+            for fmt in self.formats:
+                try:
+                    readings[fmt] = datetime.strptime(text, fmt).date().isoformat()
+                except ValueError:
+                    continue
+        fitting = tuple(fmt for fmt in self.formats if fmt in readings)
+        if not fitting:
+            self.cache[text] = None
+            return None
+        self.formats = fitting
+        dates = {readings[fmt] for fmt in fitting}
+        if len(dates) > 1:
+            self.readings[text] = readings
+            return _AMBIGUOUS
+        self.readings.pop(text, None)
+        iso = self.cache[text] = dates.pop()
+        return iso
+
+
+def normalize(rows, stats, currency="", date_format=None, expenses_negative=True):
+    """Currency codes, positive expense amounts and ISO dates. With
+    expenses_negative (the usual bank sign), rows with a positive amount
+    are incoming money and are skipped; otherwise every row is an expense.
+    Rows from the first ambiguous date on wait (up to DATE_SAMPLE of them)
+    until a later date settles the format; AmbiguousDates if none does."""
+    default = normalize_currency(currency)
+    parse_date = DateParser(date_format)
+    currencies = {}
+    held = []
+    for row in rows:
+        stats.rows += 1
+        plain = _PLAIN_AMOUNT.fullmatch(row["amount"].strip())
+        if plain is not None:
+            negative, amount = plain.groups()
+            if expenses_negative and not negative and amount != "0.00":
+                stats.skipped += 1
+                continue
+        else:
+            amount = parse_amount(row["amount"])
+            if amount is not None:
+                if expenses_negative and amount > 0:
+                    stats.skipped += 1
+                    continue
+                amount = format_minor(to_minor(abs(amount)))
+        row["amount"] = amount
+        code = row["currency"]
+        if code not in currencies:
+            currencies[code] = normalize_currency(code) or default
+        row["currency"] = currencies[code]
+        row["payer"] = " ".join(row["payer"].split())
+        date = parse_date(row["date"])
+        if date is _AMBIGUOUS or held:
+            held.append(row)
+            if len(parse_date.formats) > 1:
+                if len(held) >= DATE_SAMPLE:
+                    raise AmbiguousDates(held[0]["date"], parse_date.formats)
+                continue
+            for row in held:
+                row["date"] = parse_date(row["date"])
+                yield row
+            held = []
+            continue
+        row["date"] = date
+        yield row
+    if held:
+        raise AmbiguousDates(held[0]["date"], parse_date.formats)
+
+
+class CategoryRules:
+    """[(pattern, category), ...]: the first pattern found (case-insensitive
+    regex search) in the payer wins."""
+
+    def __init__(self, rules=IMPORT_RULES, default=IMPORT_DEFAULT_CATEGORY):
+        self.rules = [(re.compile(pattern, re.IGNORECASE), category) for pattern, category in rules]
+        self.default = default
+        self.cache = {}
+
+    @classmethod
+    def load(cls, path, default=IMPORT_DEFAULT_CATEGORY):
+        """Rules from a JSON list of {"match": regex, "category": name},
+        tried before the built-in ones."""
+        with open(path, "r", encoding="utf-8") as f:
+            extra = [(r["match"], r["category"]) for r in json.load(f)]
+        return cls(extra + list(IMPORT_RULES), default)
+
+    def category(self, payer):
+        found = self.cache.get(payer)
+        if found is None:
+            found = next((category for pattern, category in self.rules if pattern.search(payer)),
+                         self.default)
+            if len(self.cache) > 100_000:
+                self.cache.clear()
+            self.cache[payer] = found
+        return found
+
+
+def categorize(rows, rules):
+    for row in rows:
+        row["category"] = rules.category(row["payer"])
+        yield row
+
+
+def validate(rows, stats):
+    for row in rows:
+        if row["amount"] is None:
+            stats.reject(row, "amount is not a number")
+        elif not row["amount"] or row["amount"] == "0.00":
+            stats.reject(row, "amount is zero")
+        elif not row["date"]:
+            stats.reject(row, "date not recognized")
+        elif not row["currency"]:
+            stats.reject(row, "no currency (pass one for the statement)")
+        else:
+            yield row
+
+
+_VARIANT = {c: "89ab"[int(c, 16) & 3] for c in "0123456789abcdef"}
+
+
+def with_ids(rows):
+    """Give each row its content-hash id (see the notes at the top)."""
+    seen = {}   # digest of (date, amount, currency, payer) -> rows so far
+    for row in rows:
+        key = "\x1f".join((row["date"], row["amount"], row["currency"], row["payer"].lower()))
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        if n:
+            digest = hashlib.blake2b(digest + n.to_bytes(4, "little"), digest_size=16).digest()
+        # str(uuid.UUID(bytes=digest, version=4)), without the UUID object
+        h = digest.hex()
+        row["id"] = f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{_VARIANT[h[16]]}{h[17:20]}-{h[20:]}"
+        yield row
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------- import ----------------
+def import_chunks(ledger, path, fmt=None, currency="", payment=IMPORT_PAYMENT, rules=None,
+                  date_format=None, expenses_negative=True, columns=None, batch_size=IMPORT_BATCH):
+    """Import a CSV/OFX statement into ledger, committing batch_size rows at
+    a time; yields the ImportStats after each batch (for progress).
+    columns maps CSV fields (date, amount, debit, credit, currency, payer)
+    to header names the auto-detection doesn't know."""
+    fmt = fmt or detect_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported statement format {fmt!r} (csv, ofx, qfx).")
+    stats = ImportStats(path)
+    rows = READERS[fmt](path, stats, columns)
+    rows = normalize(rows, stats, currency, date_format, expenses_negative)
+    rows = categorize(rows, rules or CategoryRules())
+    rows = with_ids(validate(rows, stats))
+    for batch in _batches(rows, batch_size):
+        records = [{"id": row["id"], "amount": row["amount"], "currency": row["currency"],
+                    "category": row["category"], "payment": payment, "date": row["date"]}
+                   for row in batch]
+        with metrics.timer("import.batch"):
+            added = ledger.import_records(records, replace=False)
+        stats.added += added
+        stats.duplicates += len(records) - added
+        metrics.incr("import.rows", len(records))
+        yield stats
+    stats.consumed = stats.size
+    yield stats
+
+
+def import_statement(ledger, path, progress=None, **options):
+    """import_chunks() run to the end; progress(stats) after each batch."""
+    stats = None
+    for stats in import_chunks(ledger, path, **options):
+        if progress is not None:
+            progress(stats)
+    return stats
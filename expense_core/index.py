@@ -0,0 +1,189 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from .store import MINOR_UNITS
+
+INDEXED_FIELDS = ("category", "payment", "currency")
+
+
+# ============================================================
+# Inverted indexes for filtering
+# ============================================================
+# value -> set of expense ids, per field. Dates are indexed under each
+# of their prefixes ("2024", "2024-03", "2024-03-01") so a year, month
+# or day filter is one lookup; amounts are indexed by their integer
+# part ("12" for 12.50) and a prefix query unions the tokens in a
+# bisected range of the sorted token list. A query intersects the
+# candidate sets smallest-first, so its cost follows the matches, not
+# the ledger size.
+def date_keys(date_str):
+    if len(date_str) == 10 and date_str[4] == "-" and date_str[7] == "-":
+        return (date_str[:4], date_str[:7], date_str)
+    return (date_str,) if date_str else ()
+
+
+def amount_token(amount):
+    return amount.split(".", 1)[0]
+
+
+def _minor_token(minor):
+    """amount_token() of an amount given in minor units."""
+    whole = str(abs(minor) // MINOR_UNITS)
+    return "-" + whole if minor < 0 else whole
+
+
+def _group(keys, ids):
+    """(key, set of ids) pairs for parallel key/id columns; None ids
+    (deleted rows) are skipped."""
+    groups = {}
+    for key, exp_id in zip(keys, ids):
+        group = groups.get(key)
+        if group is None:
+            groups[key] = group = []
+        group.append(exp_id)
+    for key, group in groups.items():
+        group = set(group)
+        group.discard(None)
+        if group:
+            yield key, group
+
+
+class ExpenseIndex:
+    def __init__(self):
+        self.fields = {f: {} for f in INDEXED_FIELDS}
+        self.dates = {}
+        self.amounts = {}
+        self._amount_tokens = None   # sorted self.amounts keys, rebuilt on demand
+
+    @classmethod
+    def from_store(cls, store):
+        """Build straight from an ExpenseStore's columns: rows are grouped by
+        their codes first, so each distinct value is decoded only once."""
+        index = cls()
+        ids = store.ids
+        for f, interner in zip(INDEXED_FIELDS, (store.categories, store.payments, store.currencies)):
+            index.fields[f] = {interner[code]: group for code, group in _group(getattr(store, f), ids)}
+        days = [day or store.date_str(row) for row, day in enumerate(store.days)]
+        for key, group in _group(days, ids):
+            for k in date_keys(date.fromordinal(key).isoformat() if isinstance(key, int) else key):
+                if k in index.dates:
+                    index.dates[k] |= group
+                else:
+                    index.dates[k] = group if k == key else set(group)
+        index.amounts = dict(_group(map(_minor_token, store.amounts), ids))
+        return index
+
+    @staticmethod
+    def _put(table, key, exp_id):
+        ids = table.get(key)
+        if ids is None:
+            table[key] = {exp_id}
+            return True
+        ids.add(exp_id)
+        return False
+
+    @staticmethod
+    def _take(table, key, exp_id):
+        ids = table.get(key)
+        if ids is None:
+            return False
+        ids.discard(exp_id)
+        if not ids:
+            del table[key]
+            return True
+        return False
+
+    def add(self, rec):
+        exp_id = rec["id"]
+        for f in INDEXED_FIELDS:
+            self._put(self.fields[f], rec[f], exp_id)
+        for key in date_keys(rec["date"]):
+            self._put(self.dates, key, exp_id)
+        if self._put(self.amounts, amount_token(rec["amount"]), exp_id):
+            self._amount_tokens = None
+
+    def remove(self, rec):
+        exp_id = rec["id"]
+        for f in INDEXED_FIELDS:
+            self._take(self.fields[f], rec[f], exp_id)
+        for key in date_keys(rec["date"]):
+            self._take(self.dates, key, exp_id)
+        if self._take(self.amounts, amount_token(rec["amount"]), exp_id):
+            self._amount_tokens = None
+
+    def _amount_prefix(self, prefix):
+        if self._amount_tokens is None:
+            self._amount_tokens = sorted(self.amounts)
+        tokens = self._amount_tokens
+        out = set()
+        for i in range(bisect_left(tokens, prefix), len(tokens)):
+            if not tokens[i].startswith(prefix):
+                break
+            out |= self.amounts[tokens[i]]
+        return out
+
+    def lookup(self, category=None, payment=None, currency=None, date=None, amount=None,
+               within=None):
+        """Ids matching every given filter, or None if no filter is set.
+
+        date is a year, month or day prefix; amount matches on the integer
+        part's prefix (callers check any decimals themselves); within is an
+        extra candidate set, e.g. a date range from a SortedIndex."""
+        candidates = [] if within is None else [within]
+        for f, value in zip(INDEXED_FIELDS, (category, payment, currency)):
+            if value:
+                candidates.append(self.fields[f].get(value, set()))
+        if date:
+            candidates.append(self.dates.get(date, set()))
+        if amount:
+            candidates.append(self._amount_prefix(amount_token(amount)))
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
+
+
+# ============================================================
+# Sorted index
+# ============================================================
+# Ids ordered by a numeric key (date ordinal, USD amount), as two
+# parallel lists so range queries are two bisects and a slice. Adding or
+# removing one id is a bisect plus one list insert/delete (a memmove,
+# fast even at a million rows); equal keys keep insertion order.
+class SortedIndex:
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+
+    @classmethod
+    def build(cls, keys, ids):
+        """From parallel key/id columns; None ids (deleted rows) are skipped."""
+        index = cls()
+        order = sorted((i for i, exp_id in enumerate(ids) if exp_id is not None),
+                       key=keys.__getitem__)
+        index.keys = [keys[i] for i in order]
+        index.ids = [ids[i] for i in order]
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, key, exp_id):
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, exp_id)
+
+    def remove(self, key, exp_id):
+        lo, hi = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        try:
+            i = self.ids.index(exp_id, lo, hi)
+        except ValueError:
+            return
+        del self.keys[i]
+        del self.ids[i]
+
+    def range(self, lo=None, hi=None):
+        """Ids with lo <= key <= hi (either bound optional), in key order."""
+        start = 0 if lo is None else bisect_left(self.keys, lo)
+        end = len(self.keys) if hi is None else bisect_right(self.keys, hi)
+        return self.ids[start:end]
@@ -0,0 +1,875 @@
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from .budgets import Budgets, BudgetStatus, MonthlySpend, budget_state
+from .config import (BUDGET_FILE, CONVERT_AT_EXPENSE_DATE, DATA_FILE, DB_FILE, DISPLAY_CURRENCY,
+                     RECURRING_FILE, RECURRING_LOOKAHEAD_DAYS, STORAGE_BACKEND)
+from .helpers import normalize_currency
+from .index import ExpenseIndex, SortedIndex
+from .metrics import metrics
+from .rate_store import RATE_CACHE_FILE, RateStore
+from .rates import Conversion, RateManager
+from .recurring import RecurringRule, RecurringRules
+from .reports import Rollups
+from .series import DailySums, SpendSeries
+from .storage import open_storage
+from .store import MINOR_UNITS, ExpenseStore, day_ordinal, format_minor, to_minor
+from .totals import CurrencyTotals
+from .writer import WriteBehind
+
+LOAD_CHUNK = 2000   # records per open_chunks() step
+
+
+# ============================================================
+# Batches
+# ============================================================
+class ChangeSet:
+    """Net effect of one committed batch, handed to ledger listeners."""
+
+    def __init__(self):
+        self.added = {}       # ordered set of new ids
+        self.updated = set()  # existing ids whose fields changed
+        self.removed = set()  # ids that existed before the batch and are gone
+        self.cleared = False  # everything before the batch was dropped
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.removed or self.cleared)
+
+    def note(self, op, args):
+        if op == "add":
+            exp_id = args[0]["id"]
+            if exp_id in self.removed:
+                self.removed.discard(exp_id)
+                self.updated.add(exp_id)
+            else:
+                self.added[exp_id] = None
+        elif op == "update":
+            exp_id = args[0]["id"]
+            if exp_id not in self.added:
+                self.updated.add(exp_id)
+        elif op == "delete":
+            exp_id = args[0]
+            if exp_id in self.added:
+                del self.added[exp_id]
+            else:
+                self.removed.add(exp_id)
+                self.updated.discard(exp_id)
+        elif op == "clear":
+            self.__init__()
+            self.cleared = True
+
+
+class MonthsOnDisk(Exception):
+    """Raised instead of reading months from disk while Ledger.defer_loads
+    is set; the caller reads them with read_partitions() (e.g. on a worker
+    thread), puts them in ledger.prefetched and retries."""
+
+    def __init__(self, months):
+        super().__init__(f"Months still on disk: {', '.join(months)}.")
+        self.months = months
+
+
+class _Batch:
+    def __init__(self):
+        self.ops = []      # (op, args) to persist at commit
+        self.undo = []     # callables restoring memory, applied in reverse
+        self.changes = ChangeSet()
+
+
+# ============================================================
+# Ledger: the expense book without any UI
+# ============================================================
+# Owns the in-memory store, the running totals, the report rollups and the persistence
+# backend. The Tk app and the CLI are both thin clients of this class.
+# Mutations update memory first and are persisted when their batch
+# commits; if persisting fails memory stays updated and the first error
+# is kept until the caller collects it with take_save_error().
+# With save_delay set, commits are handed to a WriteBehind worker instead
+# and write errors are reported through on_saved(error, op_count) (called
+# on the worker thread) rather than take_save_error().
+class Ledger:
+    def __init__(self, backend=STORAGE_BACKEND, data_file=DATA_FILE, db_file=DB_FILE,
+                 rate_mgr=None, convert_at_expense_date=CONVERT_AT_EXPENSE_DATE, save_delay=None,
+                 budget_file=BUDGET_FILE, recurring_file=RECURRING_FILE):
+        self.backend = backend
+        self.data_file = data_file
+        self.db_file = db_file
+        self.rate_mgr = rate_mgr or RateManager(store=RateStore(RATE_CACHE_FILE))
+        self.convert_at_expense_date = convert_at_expense_date
+        self.display_currency = DISPLAY_CURRENCY
+        self._conversions = {}   # target currency -> Conversion, until the rates change
+        self.budgets = Budgets(budget_file)
+        self.recurring = RecurringRules(recurring_file)
+        self.storage = None
+        self.save_delay = save_delay
+        self.writer = None
+        self.on_saved = None
+        self.save_error = None
+        self.listeners = []
+        self.defer_loads = False   # raise MonthsOnDisk rather than block on a partition read
+        self._batch = None
+        self._reset()
+
+    def _reset(self):
+        self.expenses = ExpenseStore()
+        self.totals = CurrencyTotals()
+        self.rollups = Rollups()
+        self.index = None   # ExpenseIndex, built by the first filter()
+        self.by_date = None  # SortedIndex on date ordinal, built on first use
+        self.by_usd = None   # SortedIndex on USD amount; dropped by rates_changed()
+        self.daily = None    # DailySums, built by the first spend_series()
+        self.series = {}     # (step, currency) -> SpendSeries; dropped by rates_changed()
+        self.spend = None    # MonthlySpend, built by the first budget check
+        self.projected = {}  # id -> rule id of coming recurring occurrences (memory only)
+        self.unloaded = {}   # month -> {(currency, date): (minor, count)} still on disk
+        self.prefetched = {}  # month -> records read by read_partitions(), not loaded yet
+
+    # ---------------- loading ----------------
+    def open(self, all_months=True):
+        """Open the backend and load every record (with all_months=False, only
+        what open_chunks() loads). Returns the number loaded."""
+        for _changes in self.open_chunks():
+            pass
+        if all_months:
+            self.load_partitions()
+        return len(self.expenses)
+
+    def open_chunks(self, chunk_size=LOAD_CHUNK):
+        """open() as a generator, for loading without blocking a UI: each step
+        reads up to chunk_size entries from the backend and yields the
+        ChangeSet of that step. storage.load_progress says how far it got.
+        The totals are only valid once the generator is exhausted."""
+        self._reset()
+        step = time.perf_counter()
+        busy = 0.0
+        self._open_storage()
+        changes = ChangeSet()
+        # a columnar snapshot becomes the store as-is; when it carries its
+        # sums the totals are seeded from them and the journal on top is
+        # counted entry by entry, so no pass over the rows is needed
+        base, entries = self.storage.open_columns()
+        seeded = base is not None and base.saved_sums is not None
+        if base is not None:
+            self.expenses = base
+            changes.added = dict.fromkeys(base.ids)
+        if seeded:
+            self._seed_sums(*base.saved_sums)
+        for op, args in entries:
+            if op == "add" or op == "update":
+                rec = self._clean(args[0])
+                exists = rec["id"] in self.expenses
+                if seeded and exists:
+                    self._replace(rec)
+                elif seeded:
+                    self._insert(rec)
+                elif exists:
+                    self.expenses.update(rec)
+                else:
+                    self.expenses.add(rec)
+                op, args = ("update" if exists else "add"), (rec,)
+            elif op == "delete":
+                if (self._drop(args[0]) if seeded else self.expenses.remove(args[0])) is None:
+                    continue
+            elif op == "clear":
+                self.expenses.clear()
+                self.totals.clear()
+                self.rollups.clear()
+            changes.note(op, args)
+            if len(changes.added) >= chunk_size:
+                elapsed = time.perf_counter() - step
+                busy += elapsed
+                metrics.observe("ledger.load_chunk", elapsed)
+                yield changes
+                changes = ChangeSet()
+                step = time.perf_counter()
+        if self.storage.needs_rewrite:
+            self.storage.rewrite(self.expenses.records())
+        if not seeded:
+            # seed the running totals and rollups from passes over the columns
+            self._seed_sums(self.expenses.bucket_sums(), self.expenses.rollup_sums())
+        # months a partitioned backend left on disk count from its manifest
+        self.unloaded = self.storage.unloaded_totals()
+        for buckets in self.unloaded.values():
+            for (currency, date_str), (minor, count) in buckets.items():
+                self.totals.add_bucket(currency, date_str, format_minor(minor), count)
+        # records were added behind their backs
+        self.index = self.by_date = self.by_usd = self.spend = None
+        elapsed = time.perf_counter() - step
+        metrics.observe("ledger.load_chunk", elapsed)
+        # time spent loading, not counting the UI's work between chunks
+        metrics.observe("ledger.load", busy + elapsed)
+        metrics.incr("ledger.loaded_records", len(self.expenses))
+        yield changes
+
+    def _seed_sums(self, bucket_sums, rollup_sums):
+        for (currency, date_str), (minor, count) in bucket_sums.items():
+            self.totals.add_bucket(currency, date_str, format_minor(minor), count)
+        for key, (minor, count) in rollup_sums.items():
+            self.rollups.add_bucket(key, minor, count)
+
+    def open_totals_only(self):
+        """Seed just the totals, from the backend's own aggregates when it has
+        them (no records or rollups loaded); falls back to open(). Returns the count."""
+        self._reset()
+        self._open_storage()
+        buckets = self.storage.bucket_totals()
+        if buckets is None:
+            return self.open()
+        count = 0
+        for (currency, date_str), (minor, n) in buckets.items():
+            self.totals.add_bucket(normalize_currency(currency), date_str, format_minor(minor), n)
+            count += n
+        return count
+
+    # ---------------- partitions ----------------
+    # With a partitioned backend, open_chunks() loads only the recent months;
+    # the others stay in self.unloaded (counted in self.totals from the
+    # manifest) until a query needs them. filter(), report() and sorted_ids()
+    # load the months they touch and tell the listeners about the new rows.
+    def load_partitions(self, months=None):
+        """Load the given months (default: every one still on disk).
+        Returns the number of records added."""
+        months = sorted(self.unloaded if months is None else set(months) & self.unloaded.keys(),
+                        reverse=True)
+        for month in self.prefetched.keys() - self.unloaded.keys():
+            del self.prefetched[month]
+        if not months:
+            return 0
+        missing = [m for m in months if m not in self.prefetched]
+        if missing:
+            if self.defer_loads:
+                raise MonthsOnDisk(missing)
+            # the month's journal must include anything still queued for it
+            self.flush()
+        changes = ChangeSet()
+        with metrics.timer("ledger.load_partitions"):
+            for month in months:
+                for (currency, date_str), (minor, count) in self.unloaded.pop(month).items():
+                    self.totals.remove_bucket(currency, date_str, format_minor(minor), count)
+                records = self.prefetched.pop(month, None)
+                # a row added to the month since it was read is in memory
+                # already, so the id check below covers it
+                for rec in self.storage.load_partition(month) if records is None else records:
+                    rec = self._clean(rec)
+                    if rec["id"] in self.expenses:
+                        continue   # added this session and already counted
+                    self._insert(rec)
+                    changes.note("add", (rec,))
+        if changes:
+            for listener in self.listeners:
+                listener(changes)
+        return len(changes.added)
+
+    def read_partitions(self, months):
+        """{month: records} of months still on disk, read but not loaded:
+        safe on another thread while the ledger keeps serving. Put the
+        result in self.prefetched and load_partitions() uses it."""
+        self.flush()
+        return {month: self.storage.load_partition(month) for month in months}
+
+    def load_older(self):
+        """Load the most recent month still on disk (e.g. when the table is
+        scrolled to its end). Returns the number of records added."""
+        return self.load_partitions([max(self.unloaded)]) if self.unloaded else 0
+
+    def _load_months(self, prefix=None, date_from=None, date_to=None):
+        # months that a date prefix / range query could reach
+        if self.unloaded:
+            self.load_partitions([m for m in self.unloaded
+                                  if (not prefix or m.startswith(prefix[:7]))
+                                  and (not date_from or m >= date_from[:7])
+                                  and (not date_to or m <= date_to[:7])])
+
+    def count(self):
+        """Number of expenses, including months not loaded yet."""
+        return len(self.expenses) + sum(n for buckets in self.unloaded.values()
+                                        for _minor, n in buckets.values())
+
+    def _open_storage(self):
+        self.close()
+        self.storage = open_storage(self.backend, self.data_file, self.db_file)
+        if self.save_delay is not None:
+            self.writer = WriteBehind(self.storage, self.save_delay, on_done=self._on_written)
+
+    def close(self, discard=False):
+        """Write out anything still queued, then close the backend. If that
+        write fails, raises and stays open with the changes still queued
+        (and retried); discard=True closes anyway, dropping them."""
+        writer = self.writer
+        if writer is not None and not discard:
+            writer.flush()
+            if writer.last_error is not None:
+                raise writer.last_error
+        self.writer = None
+        if writer is not None:
+            writer.close(discard)
+        if self.storage is not None:
+            self.storage.close()
+            self.storage = None
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    @staticmethod
+    def _clean(rec):
+        return {
+            "id": rec.get("id") or str(uuid.uuid4()),
+            "amount": rec.get("amount", ""),
+            "currency": normalize_currency(rec.get("currency", "")),
+            "category": rec.get("category", ""),
+            "payment": rec.get("payment", ""),
+            "date": rec.get("date", ""),
+        }
+
+    # ---------------- reading ----------------
+    def __len__(self):
+        return len(self.expenses)
+
+    def __contains__(self, exp_id):
+        return exp_id in self.expenses
+
+    def ids(self, projected=True):
+        """Loaded ids; projected=False leaves out the coming recurring
+        occurrences, which exist in memory only (see apply_recurring)."""
+        if projected or not self.projected:
+            return iter(self.expenses)
+        return (i for i in self.expenses if i not in self.projected)
+
+    def get(self, exp_id):
+        return self.expenses.get(exp_id)
+
+    def records(self, projected=True):
+        if projected or not self.projected:
+            return self.expenses.records()
+        return (rec for rec in self.expenses.records() if rec["id"] not in self.projected)
+
+    def row_values(self, exp_id):
+        return self.expenses.row_values(exp_id)
+
+    # ---------------- totals ----------------
+    # Totals are in `currency`, default self.display_currency. They are
+    # sums over the per-(currency, day) buckets, each converted with a
+    # factor looked up once per rate refresh (see rates.Conversion), so
+    # switching the display currency re-totals the buckets and never
+    # touches the records.
+    def set_display_currency(self, currency):
+        self.display_currency = normalize_currency(currency) or DISPLAY_CURRENCY
+
+    def _conversion(self, currency=None):
+        target = normalize_currency(currency or self.display_currency)
+        conversion = self._conversions.get(target)
+        if conversion is None:
+            conversion = self._conversions[target] = Conversion(self.rate_mgr, target)
+        return conversion
+
+    @metrics.timed("ledger.total")
+    def total(self, exp_ids=None, currency=None):
+        """Total of everything, or of just exp_ids (e.g. a filter() result)."""
+        if exp_ids is None:
+            return self.totals.total(self._conversion(currency), by_date=self.convert_at_expense_date)
+        subset = CurrencyTotals()
+        for (cur, date_str), (minor, count) in self.expenses.bucket_sums(exp_ids).items():
+            subset.add_bucket(cur, date_str, format_minor(minor), count)
+        return subset.total(self._conversion(currency), by_date=self.convert_at_expense_date)
+
+    def total_between(self, date_from=None, date_to=None, currency=None):
+        """Total of the expenses dated date_from..date_to (inclusive
+        YYYY-MM-DD), from the per-day running totals, not the records."""
+        subset = self.totals.between(date_from, date_to)
+        return subset.total(self._conversion(currency), by_date=self.convert_at_expense_date)
+
+    def total_last_days(self, days, today=None, currency=None):
+        today = today or date.today()
+        return self.total_between((today - timedelta(days=days - 1)).isoformat(), today.isoformat(),
+                                  currency)
+
+    @metrics.timed("ledger.filter")
+    def filter(self, category=None, payment=None, currency=None, date=None, amount=None,
+               date_from=None, date_to=None):
+        """Ids (in table order) matching all the given filters, or None when
+        no filter is set. date is a YYYY, YYYY-MM or YYYY-MM-DD prefix;
+        amount matches amounts that start with it; date_from/date_to are an
+        inclusive YYYY-MM-DD range answered by binary search."""
+        if self.index is None:
+            self.index = ExpenseIndex.from_store(self.expenses)
+        within = None
+        if date_from or date_to:
+            lo, hi = (day_ordinal((d or "").strip()) for d in (date_from, date_to))
+            if (date_from and not lo) or (date_to and not hi):
+                raise ValueError("Date range must be YYYY-MM-DD.")
+            self._load_months(date_from=(date_from or "").strip(), date_to=(date_to or "").strip())
+            # 1 skips rows without a real date (key 0)
+            within = set(self._date_index().range(lo or 1, hi or None))
+        date = (date or "").strip()
+        amount = (amount or "").strip()
+        if within is None and (category or payment or currency or date or amount):
+            self._load_months(prefix=date)
+        found = self.index.lookup(category=category, payment=payment,
+                                  currency=currency and normalize_currency(currency),
+                                  date=date, amount=amount, within=within)
+        if found is None:
+            return None
+        if "." in amount:
+            # the index only knows the integer part
+            found = [i for i in found if self.expenses.row_values(i)[0].startswith(amount)]
+        return sorted(found, key=self.expenses.row_of)
+
+    # ---------------- sorting ----------------
+    @metrics.timed("ledger.sort")
+    def sorted_ids(self, column, descending=False, exp_ids=None):
+        """Ids ordered by a table column: date, amount (by USD value),
+        currency, category or payment. With exp_ids (e.g. a filter()
+        result) only those are returned. Loads every month still on disk."""
+        self.load_partitions()
+        if column == "date":
+            order = self._date_index().ids
+        elif column == "amount":
+            order = self._usd_index().ids
+        else:
+            order = self.expenses.order_by(column)
+        if exp_ids is not None:
+            keep = set(exp_ids)
+            order = [i for i in order if i in keep]
+        return order[::-1] if descending else list(order)
+
+    def rates_changed(self):
+        """Call after a rate refresh: conversion factors, USD sort keys,
+        spend series and converted budgets must be recomputed."""
+        self._conversions = {}
+        self.by_usd = None
+        self.series = {}
+        self.budgets.rates_changed()
+
+    def _date_index(self):
+        if self.by_date is None:
+            self.by_date = SortedIndex.build(self.expenses.days, self.expenses.ids)
+        return self.by_date
+
+    def _usd_index(self):
+        if self.by_usd is None:
+            st = self.expenses
+            factors = {}   # one rate lookup per (currency, day)
+            keys = []
+            for row, (minor, cur, day) in enumerate(zip(st.amounts, st.currency, st.days)):
+                factor = factors.get((cur, day))
+                if factor is None:
+                    factor = self._usd_factor(st.currencies[cur], st.date_str(row))
+                    if day:
+                        factors[(cur, day)] = factor
+                keys.append(minor * factor)
+            self.by_usd = SortedIndex.build(keys, st.ids)
+        return self.by_usd
+
+    def _usd_factor(self, currency, date_str):
+        # USD per minor unit; the one formula behind every by_usd key. The
+        # factors come from the USD Conversion, which rates_changed() drops
+        # together with by_usd, so a row is removed under the key it was
+        # added with even if the fetch thread has swapped the rates since.
+        date_str = date_str if self.convert_at_expense_date else None
+        return self._conversion("USD").factor(currency, date_str) / MINOR_UNITS
+
+    def _usd_key(self, rec):
+        return to_minor(rec["amount"]) * self._usd_factor(rec["currency"], rec["date"])
+
+    # ---------------- batches ----------------
+    # Every mutation runs inside a batch; outside begin()/commit() each
+    # call is its own one-operation batch. Memory and totals change right
+    # away; persistence and listener notification happen once, at commit.
+    def subscribe(self, listener):
+        """listener(changes: ChangeSet) is called after every commit."""
+        self.listeners.append(listener)
+
+    def begin(self):
+        if self._batch is not None:
+            raise RuntimeError("A batch is already open.")
+        self._batch = _Batch()
+
+    @metrics.timed("ledger.commit")
+    def commit(self):
+        batch, self._batch = self._batch, None
+        if batch is None:
+            raise RuntimeError("No batch is open.")
+        if batch.ops:
+            self._persist_batch(batch.ops)
+        if batch.changes:
+            for listener in self.listeners:
+                listener(batch.changes)
+
+    def rollback(self):
+        """Undo the open batch in memory; nothing was persisted yet."""
+        batch, self._batch = self._batch, None
+        if batch is None:
+            raise RuntimeError("No batch is open.")
+        for undo in reversed(batch.undo):
+            undo()
+
+    @contextmanager
+    def batch(self):
+        """with ledger.batch(): ...  -- commit on success, rollback on error."""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def _record(self, op, args, undo, persist=True, change=None):
+        # persist=False: a change to memory only (a projected occurrence);
+        # change: what listeners are told, when it differs from op
+        implicit = self._batch is None
+        if implicit:
+            self._batch = _Batch()
+        if persist:
+            self._batch.ops.append((op, args))
+        self._batch.undo.append(undo)
+        self._batch.changes.note(change or op, args)
+        if implicit:
+            self.commit()
+
+    def _persist_batch(self, ops):
+        if self.writer is not None:
+            self.writer.submit(ops)
+            return
+        try:
+            with metrics.timer("storage.save"):
+                self.storage.apply_batch(ops)
+            metrics.incr("storage.saved_ops", len(ops))
+        except Exception as e:
+            if self.save_error is None:
+                self.save_error = e
+
+    def _on_written(self, error, count):
+        # worker thread
+        if self.on_saved is not None:
+            self.on_saved(error, count)
+        elif error is not None and self.save_error is None:
+            self.save_error = error
+
+    def take_save_error(self):
+        """Return (and forget) the first persistence error since the last call."""
+        err, self.save_error = self.save_error, None
+        return err
+
+    # ---------------- mutation primitives (memory only) ----------------
+    def _count(self, rec):
+        self.totals.add(rec["amount"], rec["currency"], rec["date"])
+        self.rollups.add(rec)
+        if self.index is not None:
+            self.index.add(rec)
+        if self.by_date is not None:
+            self.by_date.add(day_ordinal(rec["date"]), rec["id"])
+        if self.by_usd is not None:
+            self.by_usd.add(self._usd_key(rec), rec["id"])
+        if self.daily is not None:
+            self.daily.add(rec)
+            for series in self.series.values():
+                series.add(rec)
+        if self.spend is not None:
+            self.spend.add(rec)
+
+    def _uncount(self, rec):
+        self.totals.remove(rec["amount"], rec["currency"], rec["date"])
+        self.rollups.remove(rec)
+        if self.index is not None:
+            self.index.remove(rec)
+        if self.by_date is not None:
+            self.by_date.remove(day_ordinal(rec["date"]), rec["id"])
+        if self.by_usd is not None:
+            self.by_usd.remove(self._usd_key(rec), rec["id"])
+        if self.daily is not None:
+            self.daily.remove(rec)
+            for series in self.series.values():
+                series.remove(rec)
+        if self.spend is not None:
+            self.spend.remove(rec)
+
+    def _insert(self, rec):
+        self.expenses.add(rec)
+        rec = self.expenses.get(rec["id"])
+        self._count(rec)
+        return rec
+
+    def _replace(self, rec):
+        self._uncount(self.expenses.get(rec["id"]))
+        self.expenses.update(rec)
+        rec = self.expenses.get(rec["id"])
+        self._count(rec)
+        return rec
+
+    def _drop(self, exp_id):
+        old = self.expenses.remove(exp_id)
+        if old is not None:
+            self._uncount(old)
+        return old
+
+    def _revive(self, row, generation, rec):
+        self.expenses.revive(row, generation, rec)
+        self._count(rec)
+
+    def _restore(self, state):
+        (self.expenses, self.totals, self.rollups, self.index, self.by_date,
+         self.by_usd, self.daily, self.series, self.spend, self.projected, self.unloaded) = state
+
+    # ---------------- mutation ----------------
+    def add(self, amount, currency, category, payment, date_str, exp_id=None):
+        """Add one expense and return its id."""
+        rec = self._insert(self._clean({"id": exp_id, "amount": amount, "currency": currency,
+                                        "category": category, "payment": payment, "date": date_str}))
+        self._record("add", (rec,), lambda: self._drop(rec["id"]))
+        return rec["id"]
+
+    def edit(self, exp_id, amount, currency, category, payment, date_str):
+        """Replace the fields of exp_id. False if it doesn't exist."""
+        old = self.expenses.get(exp_id)
+        if old is None:
+            return False
+        rec = self._replace(self._clean({"id": exp_id, "amount": amount, "currency": currency,
+                                         "category": category, "payment": payment, "date": date_str}))
+        rule_id = self._unproject(exp_id, old["date"])
+        if rule_id is not None:
+            # a coming occurrence edited early is saved from now on
+            self._record("add", (rec,), lambda: (self._replace(old), self._project(exp_id, rule_id, old["date"])),
+                         change="update")
+        else:
+            self._record("update", (rec,), lambda: self._replace(old))
+        return True
+
+    def delete(self, exp_ids):
+        """Delete the given ids (as one batch); returns how many existed."""
+        deleted = 0
+        with self._implicit_batch():
+            for exp_id in exp_ids:
+                row, generation = self.expenses.row_of(exp_id), self.expenses.generation
+                old = self._drop(exp_id)
+                if old is None:
+                    continue
+                rule_id = self._unproject(exp_id, old["date"])
+                if rule_id is not None:
+                    # never saved: the rule just skips that date
+                    self._record("delete", (exp_id,),
+                                 lambda r=row, g=generation, o=old, i=rule_id: (
+                                     self._revive(r, g, o), self._project(o["id"], i, o["date"])),
+                                 persist=False)
+                else:
+                    self._record("delete", (exp_id,),
+                                 lambda r=row, g=generation, o=old: self._revive(r, g, o))
+                deleted += 1
+        return deleted
+
+    def recategorize(self, exp_ids, category):
+        """Set the category of every given expense (one batch); returns the count."""
+        changed = 0
+        with self._implicit_batch():
+            for exp_id in exp_ids:
+                rec = self.expenses.get(exp_id)
+                if rec is None or rec["category"] == category:
+                    continue
+                if self.edit(exp_id, rec["amount"], rec["currency"], category,
+                             rec["payment"], rec["date"]):
+                    changed += 1
+        return changed
+
+    def clear(self):
+        state = (self.expenses, self.totals, self.rollups, self.index, self.by_date, self.by_usd,
+                 self.daily, self.series, self.spend, self.projected, self.unloaded)
+        self._reset()
+        self._record("clear", (), lambda: self._restore(state))
+
+    def import_records(self, records, replace=True):
+        """Add records (dicts in the expenses.json shape) as one batch;
+        returns the count. Records whose id already exists replace it, or
+        with replace=False are skipped (and not counted)."""
+        # an id may live in a month that is still on disk
+        self.load_partitions()
+        count = 0
+        with self._implicit_batch():
+            for rec in records:
+                rec = self._clean(rec)
+                if rec["id"] in self.expenses:
+                    if not replace:
+                        continue
+                    self.edit(rec["id"], rec["amount"], rec["currency"], rec["category"],
+                              rec["payment"], rec["date"])
+                else:
+                    self.add(rec["amount"], rec["currency"], rec["category"], rec["payment"],
+                             rec["date"], exp_id=rec["id"])
+                count += 1
+        return count
+
+    @contextmanager
+    def _implicit_batch(self):
+        # join the caller's batch if one is open, else run as our own
+        if self._batch is not None:
+            yield
+        else:
+            with self.batch():
+                yield
+
+    # ---------------- reports ----------------
+    @metrics.timed("ledger.report")
+    def report(self, by="category", date_from=None, date_to=None, in_currency=None, **filters):
+        """{group: (total, count)} from the rollups, in in_currency (default:
+        the display currency), grouping by one or more of month/category/
+        payment/currency (see Rollups.total). Loads the months of the range
+        that are still on disk."""
+        self._load_months(date_from=date_from, date_to=date_to)
+        return self.rollups.total(self._conversion(in_currency), by, by_date=self.convert_at_expense_date,
+                                  date_from=date_from, date_to=date_to, **filters)
+
+    @metrics.timed("ledger.spend_series")
+    def spend_series(self, step="month", currency=None):
+        """{category: {period: total}} in currency (default: the display
+        currency) per day, week or month (see series.py); period is the
+        ordinal of the period's first day. The first call loads every month
+        still on disk and makes one pass over the rows; after that the
+        series are updated with each change. Don't modify the result."""
+        conversion = self._conversion(currency)
+        key = (step, conversion.target)
+        series = self.series.get(key)
+        if series is None:
+            if self.daily is None:
+                self.load_partitions()
+                self.daily = DailySums.from_store(self.expenses)
+            series = SpendSeries(self.daily, conversion, step, by_date=self.convert_at_expense_date)
+            self.series[key] = series
+        return series.points
+
+    # ---------------- budgets ----------------
+    def set_budget(self, category, amount, currency=None):
+        """Monthly limit for category in currency (default: the display
+        currency); an empty or zero amount removes it. Saved right away."""
+        self.budgets.set(category, amount, currency or self.display_currency)
+
+    def budget_limits(self):
+        """{category: (amount, currency)} as set."""
+        return dict(self.budgets.limits)
+
+    def budget_status(self, category, month, currency=None):
+        """BudgetStatus of category in month (YYYY-MM), spend and limit in
+        currency (default: the display currency); None without a budget.
+        Loads the month if it is still on disk."""
+        conversion = self._conversion(currency)
+        limit = self.budgets.converted(conversion).get(category)
+        if limit is None:
+            return None
+        if month in self.unloaded:
+            self.load_partitions([month])
+        if self.spend is None:
+            self.spend = MonthlySpend.from_rollups(self.rollups)
+        spent = self.spend.spent(category, month, conversion, by_date=self.convert_at_expense_date)
+        return BudgetStatus(category, month, spent, limit, budget_state(spent, limit))
+
+    def budget_report(self, month, currency=None):
+        """BudgetStatus of every category with a budget, for month."""
+        return [self.budget_status(category, month, currency) for category in sorted(self.budgets.limits)]
+
+    # ---------------- recurring ----------------
+    # The rules live in recurring.json (see recurring.py), not in the
+    # ledger. apply_recurring() turns the occurrences that have come due
+    # since a rule last ran into ordinary records (one batch), and puts
+    # the ones due within RECURRING_LOOKAHEAD_DAYS in memory only
+    # (self.projected): they show in the table, totals and reports like
+    # any row but are never saved. Editing a projected row saves it as a
+    # real record and deleting it drops it; either way its rule skips that
+    # date from then on. Ids are derived from (rule, date), so an
+    # occurrence is never recorded twice.
+    def apply_recurring(self, today=None, rules=None):
+        """Record the due occurrences of every rule (or just rules) and
+        project the coming ones. Returns the number of records made."""
+        today = today or date.today()
+        horizon = (today + timedelta(days=RECURRING_LOOKAHEAD_DAYS)).isoformat()
+        today = today.isoformat()
+        rules = list(self.recurring) if rules is None else rules
+        made = 0
+        with metrics.timer("ledger.apply_recurring"):
+            with self._implicit_batch():
+                for rule in rules:
+                    for date_str in rule.dates(_next_day(rule.done), today):
+                        rec = rule.record(date_str)
+                        if self._unproject(rec["id"]) is not None:
+                            rec = self.expenses.get(rec["id"])
+                            self._record("add", (rec,), lambda r=rec, i=rule.id: self._project(r["id"], i),
+                                         change="update")
+                        elif rec["id"] not in self.expenses:
+                            rec = self._insert(rec)
+                            self._record("add", (rec,), lambda i=rec["id"]: self._drop(i))
+                        else:
+                            continue
+                        made += 1
+                    if rule.done < today:
+                        # a rollback makes the rows due again
+                        self._batch.undo.append(lambda r=rule, d=rule.done: self._set_done(r, d))
+                        rule.done = today
+            changes = ChangeSet()
+            for rule in rules:
+                for date_str in rule.dates(_next_day(max(rule.done, today)), horizon):
+                    rec = rule.record(date_str)
+                    if rec["id"] not in self.expenses:
+                        self._insert(rec)
+                        self.projected[rec["id"]] = rule.id
+                        changes.note("add", (rec,))
+        if rules:
+            self.recurring.save()
+        self._notify(changes)
+        return made
+
+    def _set_done(self, rule, done):
+        rule.done = done
+        self.recurring.save()
+
+    def _project(self, exp_id, rule_id, date_str=None):
+        self.projected[exp_id] = rule_id
+        if date_str is not None:
+            self.recurring.get(rule_id).skip.discard(date_str)
+            self.recurring.save()
+
+    def _unproject(self, exp_id, date_str=None):
+        # rule id of a projected row (now a real one or gone), else None;
+        # with date_str its rule skips that date from now on
+        rule_id = self.projected.pop(exp_id, None)
+        if rule_id is not None and date_str is not None:
+            self.recurring.get(rule_id).skip.add(date_str)
+            self.recurring.save()
+        return rule_id
+
+    def _notify(self, changes):
+        if changes:
+            for listener in self.listeners:
+                listener(changes)
+
+    def add_recurring(self, amount, currency, category, payment, start, rule="monthly", today=None):
+        """Add a rule (see recurring.py for the rule strings) and apply it:
+        occurrences from start to today become records. Returns its id."""
+        rule = RecurringRule(amount, currency, category, payment, start, rule)
+        self.recurring.add(rule)
+        self.apply_recurring(today, rules=[rule])
+        return rule.id
+
+    def remove_recurring(self, rule_id):
+        """Remove a rule and its projected rows; the records it already
+        made stay. False if there is no such rule."""
+        if self.recurring.remove(rule_id) is None:
+            return False
+        changes = ChangeSet()
+        for exp_id in [i for i, r in self.projected.items() if r == rule_id]:
+            del self.projected[exp_id]
+            self._drop(exp_id)
+            changes.note("delete", (exp_id,))
+        self._notify(changes)
+        return True
+
+    def recurring_rules(self, today=None):
+        """The rules as dicts (recurring.json's shape) plus "next", the
+        date of the next occurrence after today (None if it has ended)."""
+        today = (today or date.today()).isoformat()
+        return [dict(rule.to_json(), next=rule.next_date(max(rule.done, today)))
+                for rule in self.recurring]
+
+
+def _next_day(date_str):
+    # the day after a YYYY-MM-DD string; None for "" (no bound)
+    return (date.fromisoformat(date_str) + timedelta(days=1)).isoformat() if date_str else None
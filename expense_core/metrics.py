@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# ============================================================
+# Metrics: timers, counters and latency histograms
+# ============================================================
+# One process-wide registry (`metrics`). Timing an operation costs two
+# perf_counter() calls, a bisect and a locked dict update, cheap enough
+# to leave on for every hot path. Percentiles come from log-scale
+# histogram buckets (each bucket is sqrt(2) wide, interpolated within),
+# which is plenty to spot a slow path in the field.
+#   EXPENSE_METRICS=metrics.json   write a JSON snapshot on exit
+#   EXPENSE_METRICS=off            disable collection
+METRICS_ENV = "EXPENSE_METRICS"
+_BOUNDS_US = [2 ** (k / 2) for k in range(56)]   # 1 us .. ~190 s
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(_BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.buckets[bisect_left(_BOUNDS_US, seconds * 1e6)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Estimated q-quantile in seconds (linear within its bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lo = _BOUNDS_US[i - 1] / 1e6 if i else 0.0
+                hi = _BOUNDS_US[i] / 1e6 if i < len(_BOUNDS_US) else self.max
+                return min(max(lo + (hi - lo) * (rank - seen) / n, self.min), self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram()
+            h.record(seconds)
+
+    def incr(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator form of timer()."""
+        def wrap(fn):
+            @wraps(fn)
+            def inner(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return inner
+        return wrap
+
+    def snapshot(self):
+        """{"operations": {name: summary}, "counters": {name: n}}."""
+        with self._lock:
+            return {
+                "operations": {name: h.summary() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def dump(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(self.snapshot(), written_at=time.time()), f, indent=2)
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+metrics = Metrics(enabled=os.environ.get(METRICS_ENV, "").lower() not in ("off", "0", "false"))
+
+
+def dump_on_exit(path=None):
+    """Write metrics to path (default: $EXPENSE_METRICS, if it names a file)
+    when the interpreter exits."""
+    import atexit
+    path = path or os.environ.get(METRICS_ENV, "")
+    if not path or path.lower() in ("on", "1", "true", "off", "0", "false"):
+        return
+    atexit.register(metrics.dump, path)
@@ -0,0 +1,84 @@
+import atexit
+import os
+import sys
+import threading
+
+# ============================================================
+# Whole-session profiling
+# ============================================================
+# EXPENSE_PROFILE (or the CLI's --profile) picks a profiler and an output file:
+#   cprofile:session.prof   deterministic, read with `python -m pstats`
+#   sample:session.txt      samples the main thread's stack every few ms
+#                           and writes flamegraph-style collapsed stacks
+#   session.prof            same as cprofile:
+# Results are written when the process exits.
+PROFILE_ENV = "EXPENSE_PROFILE"
+SAMPLE_INTERVAL = 0.005
+
+
+def start(spec):
+    """Start profiling per spec ("mode:path" or "path"); returns the profiler."""
+    mode, sep, path = spec.partition(":")
+    if not sep or mode not in ("cprofile", "sample"):
+        mode, path = "cprofile", spec
+    profiler = SamplingProfiler(path) if mode == "sample" else _CProfile(path)
+    profiler.start()
+    atexit.register(profiler.stop)
+    return profiler
+
+
+def start_from_env():
+    spec = os.environ.get(PROFILE_ENV)
+    return start(spec) if spec else None
+
+
+class _CProfile:
+    def __init__(self, path):
+        import cProfile
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        print(f"Profile written to {self.path}", file=sys.stderr)
+
+
+class SamplingProfiler:
+    """Counts the main thread's call stacks on a timer thread; low overhead,
+    so it can stay on for a whole interactive session."""
+
+    def __init__(self, path, interval=SAMPLE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stacks = {}
+        self._target = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, n in sorted(self.stacks.items(), key=lambda kv: -kv[1]):
+                f.write(f"{stack} {n}\n")
+        print(f"Profile samples written to {self.path} "
+              f"({sum(self.stacks.values())} samples every {self.interval * 1000:g} ms)", file=sys.stderr)
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from datetime import date
+
+# ============================================================
+# On-disk exchange-rate cache
+# ============================================================
+# rates_cache.json = {"tables": [{"ts": epoch, "date": "YYYY-MM-DD",
+#                                 "rates": {code: units per USD}}, ...]}
+# One table is kept per calendar day (the newest fetch of that day),
+# oldest first. The latest table answers "current" rates while it is
+# younger than the TTL; the whole series answers "rate on date X".
+RATE_CACHE_FILE = "rates_cache.json"
+RATE_TTL_SECONDS = 6 * 60 * 60
+
+
+def date_ordinal(date_str):
+    """Ordinal of a YYYY-MM-DD string, or None if it doesn't parse."""
+    try:
+        return date.fromisoformat(str(date_str).strip()).toordinal()
+    except ValueError:
+        return None
+
+
+class RateStore:
+    def __init__(self, path=RATE_CACHE_FILE, ttl=RATE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.tables = []
+        self._index = {}  # currency -> ([day ordinals], [rates]) sorted by day
+        self.load()
+
+    # ---------------- persistence ----------------
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                tables = json.load(f).get("tables", [])
+        except Exception as e:
+            print("Rate cache read error:", e)
+            return
+        self.tables = sorted((t for t in tables if date_ordinal(t.get("date")) and t.get("rates")),
+                             key=lambda t: t["date"])
+        self._rebuild_index()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"tables": self.tables}, f)
+        os.replace(tmp, self.path)
+
+    # ---------------- recording ----------------
+    def record(self, rates, ts=None):
+        """Store a freshly fetched table (replaces an earlier one from the same day)."""
+        ts = time.time() if ts is None else ts
+        day = date.fromtimestamp(ts).isoformat()
+        table = {"ts": ts, "date": day, "rates": dict(rates)}
+        tables = [t for t in self.tables if t["date"] != day] + [table]
+        tables.sort(key=lambda t: t["date"])
+        self.tables = tables
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        # built aside and swapped in whole: record() runs on the fetch
+        # thread while the UI thread may be converting
+        index = {}
+        for table in self.tables:
+            day = date_ordinal(table["date"])
+            for currency, rate in table["rates"].items():
+                if not rate:
+                    continue
+                days, rates = index.setdefault(currency, ([], []))
+                days.append(day)
+                rates.append(rate)
+        self._index = index
+
+    # ---------------- lookups ----------------
+    def latest(self):
+        return self.tables[-1] if self.tables else None
+
+    def is_fresh(self, now=None):
+        latest = self.latest()
+        if latest is None:
+            return False
+        now = time.time() if now is None else now
+        return now - latest["ts"] < self.ttl
+
+    def rate_on(self, currency, day):
+        """Rate for currency from the table closest to ordinal day, or None."""
+        series = self._index.get(currency)
+        if not series:
+            return None
+        days, rates = series
+        i = bisect_left(days, day)
+        if i == 0:
+            return rates[0]
+        if i == len(days):
+            return rates[-1]
+        # pick the nearer neighbour; ties go to the earlier table
+        return rates[i] if days[i] - day < day - days[i - 1] else rates[i - 1]
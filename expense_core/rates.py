@@ -0,0 +1,182 @@
+import threading
+
+from .config import API_URL
+from .helpers import normalize_currency, safe_float
+from .metrics import metrics
+from .rate_store import date_ordinal
+
+
+# ============================================================
+# Cross rates
+# ============================================================
+class CrossRates:
+    """Every pair of currencies in one USD-based table (units per USD):
+    matrix[i][j] is how many units of codes[j] one unit of codes[i] buys.
+    Built once per rate refresh, so converting between any two currencies
+    is a lookup instead of two divisions per amount."""
+
+    def __init__(self, rates):
+        per_usd = {normalize_currency(c): float(r) for c, r in rates.items() if safe_float(r) > 0}
+        per_usd["USD"] = 1.0
+        self.codes = sorted(per_usd)
+        self.index = {c: i for i, c in enumerate(self.codes)}
+        units = [per_usd[c] for c in self.codes]
+        self.matrix = [[dst / src for dst in units] for src in units]
+
+    def factor(self, src, dst):
+        """Units of dst per unit of src; 0 if either currency is unknown."""
+        i, j = self.index.get(src), self.index.get(dst)
+        if i is None or j is None:
+            return 0.0
+        return self.matrix[i][j]
+
+
+class Conversion:
+    """Converts into one currency, looking each (currency, date) factor up
+    once; the ledger keeps one per target until the rates change."""
+    __slots__ = ("target", "factors", "_factor")
+
+    def __init__(self, rate_mgr, target):
+        self.target = target
+        self.factors = {}   # (currency, date or None) -> units of target per unit
+        self._factor = rate_mgr.factor
+
+    def factor(self, currency, date_str=None):
+        key = (currency, date_str)
+        f = self.factors.get(key)
+        if f is None:
+            f = self.factors[key] = self._factor(currency, self.target, date_str)
+        return f
+
+    def __call__(self, amount, currency, date_str=None):
+        return safe_float(amount, 0.0) * self.factor(currency, date_str)
+
+
+# ============================================================
+# Exchange Rates Manager
+# ============================================================
+class RateManager:
+    def __init__(self, url=API_URL, store=None):
+        self.url = url
+        # some fallback guesses in case offline (units per USD, like the API)
+        self.fallback = {"USD": 1.0, "GBP": 0.79, "EUR": 0.92, "EGP": 48.5}
+        self.rates = {"USD": 1.0}  # fallback minimal
+        # optional on-disk cache (rate_store.RateStore)
+        self.store = store
+        self.source = "fallback"  # "live", "cache" or "fallback"
+        latest = store.latest() if store else None
+        if latest:
+            self.rates = latest["rates"]
+            self.source = "cache"
+        # background fetch state (see fetch_async)
+        self._fetch_lock = threading.Lock()
+        self._fetch_thread = None
+        self._fetch_callbacks = []
+
+    @metrics.timed("rates.fetch")
+    def fetch(self, force=False):
+        """Update self.rates; True if they are live or freshly cached."""
+        if not force and self.store and self.store.is_fresh():
+            self.rates = self.store.latest()["rates"]
+            self.source = "cache"
+            return True
+        try:
+            import requests  # deferred: only needed when we actually fetch
+            metrics.incr("rates.requests")
+            resp = requests.get(self.url, timeout=5)
+            if resp.status_code == 200:
+                data = resp.json()
+                rates = data.get("rates", {})
+                if isinstance(rates, dict) and rates:
+                    self.rates = rates
+                    self.source = "live"
+                    self._remember(rates)
+                    return True
+            # fallthrough -> use fallback
+        except Exception as e:
+            print("Rate fetch error:", e)
+        # stale cache beats the hard-coded guesses
+        latest = self.store.latest() if self.store else None
+        if latest:
+            self.rates = latest["rates"]
+            self.source = "cache"
+            return False
+        # fallback
+        self.rates = self.fallback.copy()
+        self.source = "fallback"
+        return False
+
+    def _remember(self, rates):
+        if not self.store:
+            return
+        try:
+            self.store.record(rates)
+            self.store.save()
+        except Exception as e:
+            print("Rate cache write error:", e)
+
+    def fetch_async(self, callback, force=False):
+        """Run fetch() on a worker thread and call callback(online) from it.
+
+        Calls made while a fetch is in flight join that fetch instead of
+        starting another one.
+        """
+        with self._fetch_lock:
+            if callback not in self._fetch_callbacks:
+                self._fetch_callbacks.append(callback)
+            if self._fetch_thread is not None:
+                return
+            self._fetch_thread = threading.Thread(target=self._fetch_worker, args=(force,), daemon=True)
+            self._fetch_thread.start()
+
+    def _fetch_worker(self, force):
+        online = self.fetch(force)
+        with self._fetch_lock:
+            callbacks, self._fetch_callbacks = self._fetch_callbacks, []
+            self._fetch_thread = None
+        for callback in callbacks:
+            callback(online)
+
+    @property
+    def rates(self):
+        return self._rates
+
+    @rates.setter
+    def rates(self, rates):
+        # the matrix covers the fallback currencies even when a table lacks them
+        self.cross = CrossRates({**self.fallback, **rates})
+        self._rates = rates
+
+    def currencies(self):
+        """Codes the current rate table can convert, sorted."""
+        return self.cross.codes
+
+    def rate(self, currency, day=None):
+        """Units of currency per USD: the cached table closest to ordinal day
+        if the store has history for it, else the current table, else the
+        fallback guess; 0 if unknown."""
+        c = normalize_currency(currency)
+        if c == "USD":
+            return 1.0
+        rate = self.store.rate_on(c, day) if day is not None and self.store else None
+        return rate or self._rates.get(c) or self.fallback.get(c, 0)
+
+    def factor(self, currency, to="USD", date_str=None):
+        """Units of `to` per unit of currency (at date_str's rates if the
+        store has history, else from the cross-rate matrix)."""
+        src, dst = normalize_currency(currency), normalize_currency(to)
+        if src == dst:
+            return 1.0
+        day = date_ordinal(date_str) if date_str and self.store else None
+        if day is None:
+            return self.cross.factor(src, dst)
+        # API: 1 USD = rate (units of currency), so src -> USD -> dst
+        src_rate = self.rate(src, day)
+        return self.rate(dst, day) / src_rate if src_rate else 0.0
+
+    def convert(self, amount, currency, to="USD", date_str=None):
+        """Convert an amount *in currency* to `to`; see factor()."""
+        return safe_float(amount, 0.0) * self.factor(currency, to, date_str)
+
+    def to_usd(self, amount, currency, date_str=None):
+        return self.convert(amount, currency, "USD", date_str)
@@ -0,0 +1,229 @@
+import calendar
+import hashlib
+import json
+import os
+import uuid
+from datetime import date, timedelta
+
+from .config import RECURRING_FILE
+from .helpers import normalize_currency, safe_float
+
+FREQS = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+# ============================================================
+# Recurring expenses
+# ============================================================
+# recurring.json = {"rules": [{"id", "amount", "currency", "category",
+# "payment", "start", "rule", "done", "skip"}, ...]}: one entry per rule,
+# however long it runs. "rule" is "daily", "weekly", "monthly", "yearly"
+# or an RRULE-style "FREQ=MONTHLY;INTERVAL=2;BYMONTHDAY=1,-1;COUNT=12"
+# (also BYDAY=MO,TH for weekly rules and UNTIL=YYYY-MM-DD). "done" is the
+# last date already turned into records and "skip" the dates that were
+# edited or deleted early, so they are never generated again.
+# RecurringRule.dates() is a generator: occurrences are computed up to
+# the date a caller asks for and never stored for all time.
+def parse_rule(text):
+    """{"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"} of a
+    rule string; ValueError if it doesn't parse."""
+    text = (text or "").strip().upper()
+    if text in FREQS:
+        text = "FREQ=" + text
+    parts = {}
+    for part in filter(None, text.split(";")):
+        name, _, value = part.partition("=")
+        parts[name.strip()] = value.strip()
+    unknown = parts.keys() - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"}
+    if unknown:
+        raise ValueError(f"Unsupported rule part(s): {', '.join(sorted(unknown))}.")
+    freq = parts.get("FREQ")
+    if freq not in FREQS:
+        raise ValueError(f"Rule needs FREQ={'|'.join(FREQS)} (got {text!r}).")
+    try:
+        interval = int(parts.get("INTERVAL", 1))
+        count = int(parts["COUNT"]) if "COUNT" in parts else None
+        monthdays = [int(d) for d in parts["BYMONTHDAY"].split(",")] if "BYMONTHDAY" in parts else []
+        until = parts.get("UNTIL")
+        if until:
+            # 20251231, 20251231T000000Z or 2025-12-31
+            until = (date(int(until[:4]), int(until[4:6]), int(until[6:8])) if until[:8].isdigit()
+                     else date.fromisoformat(until))
+    except ValueError:
+        raise ValueError(f"Malformed rule {text!r}.") from None
+    weekdays = [WEEKDAYS.index(d) for d in parts["BYDAY"].split(",") if d in WEEKDAYS] if "BYDAY" in parts else []
+    if interval < 1 or (count is not None and count < 1) or any(not 1 <= abs(d) <= 31 for d in monthdays):
+        raise ValueError(f"Malformed rule {text!r}.")
+    if "BYDAY" in parts and (freq != "WEEKLY" or len(weekdays) != len(parts["BYDAY"].split(","))):
+        raise ValueError("BYDAY takes MO..SU and needs FREQ=WEEKLY.")
+    if monthdays and freq != "MONTHLY":
+        raise ValueError("BYMONTHDAY needs FREQ=MONTHLY.")
+    return {"FREQ": freq, "INTERVAL": interval, "BYDAY": sorted(set(weekdays)),
+            "BYMONTHDAY": monthdays, "COUNT": count, "UNTIL": until}
+
+
+def _month_day(year, month, day):
+    # day of the month; negative counts from the end (-1 = last day)
+    length = calendar.monthrange(year, month)[1]
+    if day < 0:
+        day += length + 1
+    return date(year, month, day) if 1 <= day <= length else None
+
+
+def occurrence_id(rule_id, date_str):
+    """Id of rule_id's record for date_str: the same every time it is
+    generated, so a record is never made twice."""
+    digest = hashlib.blake2b(f"{rule_id}\x1f{date_str}".encode("utf-8"), digest_size=16).digest()
+    return str(uuid.UUID(bytes=digest, version=4))
+
+
+class RecurringRule:
+    __slots__ = ("id", "amount", "currency", "category", "payment", "start", "rule", "done", "skip",
+                 "_parts")
+
+    def __init__(self, amount, currency, category, payment, start, rule="monthly", id=None, done="",
+                 skip=()):
+        if safe_float(amount, None) is None:
+            raise ValueError("Amount must be numeric.")
+        if not (currency and category and payment):
+            raise ValueError("A recurring expense needs a currency, category and payment method.")
+        try:
+            date.fromisoformat(start)
+        except (TypeError, ValueError):
+            raise ValueError("Start must be a valid YYYY-MM-DD.") from None
+        self._parts = parse_rule(rule)
+        self.id = id or str(uuid.uuid4())
+        self.amount = str(amount).strip()
+        self.currency = normalize_currency(currency)
+        self.category = category
+        self.payment = payment
+        self.start = start
+        self.rule = rule.strip()
+        self.done = done       # last date turned into records ("" = none yet)
+        self.skip = set(skip)  # dates edited or deleted before they were due
+
+    def to_json(self):
+        return {"id": self.id, "amount": self.amount, "currency": self.currency, "category": self.category,
+                "payment": self.payment, "start": self.start, "rule": self.rule, "done": self.done,
+                "skip": sorted(self.skip)}
+
+    def record(self, date_str):
+        """The expense record of the occurrence on date_str."""
+        return {"id": occurrence_id(self.id, date_str), "amount": self.amount, "currency": self.currency,
+                "category": self.category, "payment": self.payment, "date": date_str}
+
+    def _all_dates(self, after):
+        # every occurrence from the start, in order, jumping straight to
+        # the first one past `after` when the rule has a fixed stride
+        p = self._parts
+        start = date.fromisoformat(self.start)
+        interval = p["INTERVAL"]
+        if p["FREQ"] == "DAILY" or (p["FREQ"] == "WEEKLY" and not p["BYDAY"]):
+            stride = interval * (1 if p["FREQ"] == "DAILY" else 7)
+            k = 0
+            if after is not None and after >= start and p["COUNT"] is None:
+                k = (after - start).days // stride
+            while True:
+                yield start + timedelta(days=k * stride)
+                k += 1
+        elif p["FREQ"] == "WEEKLY":
+            week = start - timedelta(days=start.weekday())
+            if after is not None and after > start and p["COUNT"] is None:
+                week += timedelta(weeks=(after - week).days // (7 * interval) * interval)
+            while True:
+                for wd in p["BYDAY"]:
+                    day = week + timedelta(days=wd)
+                    if day >= start:
+                        yield day
+                week += timedelta(weeks=interval)
+        elif p["FREQ"] == "MONTHLY":
+            months = start.year * 12 + start.month - 1
+            if after is not None and after > start and p["COUNT"] is None:
+                months += (after.year * 12 + after.month - 1 - months) // interval * interval
+            while True:
+                year, month = divmod(months, 12)
+                if p["BYMONTHDAY"]:
+                    days = sorted(filter(None, (_month_day(year, month + 1, d) for d in p["BYMONTHDAY"])))
+                else:
+                    # the 31st of a 30-day month falls on the 30th
+                    days = [_month_day(year, month + 1, min(start.day, calendar.monthrange(year, month + 1)[1]))]
+                for day in days:
+                    if day >= start:
+                        yield day
+                months += interval
+        else:
+            year = start.year
+            if after is not None and after > start and p["COUNT"] is None:
+                year += (after.year - year) // interval * interval
+            while True:
+                yield _month_day(year, start.month, min(start.day, calendar.monthrange(year, start.month)[1]))
+                year += interval
+
+    def dates(self, date_from=None, date_to=None):
+        """Occurrence dates (YYYY-MM-DD) from date_from to date_to
+        (inclusive, either open), generated lazily; skipped dates left out."""
+        p = self._parts
+        lo = date.fromisoformat(date_from) if date_from else None
+        hi = date.fromisoformat(date_to) if date_to else None
+        if p["UNTIL"] is not None and (hi is None or p["UNTIL"] < hi):
+            hi = p["UNTIL"]
+        for n, day in enumerate(self._all_dates(lo), 1):
+            if hi is not None and day > hi:
+                return
+            if lo is None or day >= lo:
+                date_str = day.isoformat()
+                if date_str not in self.skip:
+                    yield date_str
+            if p["COUNT"] is not None and n >= p["COUNT"]:
+                return
+
+    def next_date(self, after):
+        """First occurrence after the date after (YYYY-MM-DD), or None."""
+        nxt = (date.fromisoformat(after) + timedelta(days=1)).isoformat()
+        return next(self.dates(nxt), None)
+
+
+class RecurringRules:
+    def __init__(self, path=RECURRING_FILE):
+        self.path = path
+        self.rules = {}   # id -> RecurringRule
+        self.load()
+
+    def __iter__(self):
+        return iter(self.rules.values())
+
+    def __len__(self):
+        return len(self.rules)
+
+    def get(self, rule_id):
+        return self.rules.get(rule_id)
+
+    def add(self, rule):
+        self.rules[rule.id] = rule
+        self.save()
+
+    def remove(self, rule_id):
+        rule = self.rules.pop(rule_id, None)
+        if rule is not None:
+            self.save()
+        return rule
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f).get("rules", [])
+            rules = [RecurringRule(**r) for r in saved]
+        except Exception as e:
+            print("Recurring rules read error:", e)
+            return
+        self.rules = {r.id: r for r in rules}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rules": [r.to_json() for r in self.rules.values()]}, f, indent=1)
+        os.replace(tmp, self.path)
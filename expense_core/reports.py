@@ -0,0 +1,80 @@
+from .store import format_minor, to_minor
+
+ROLLUP_FIELDS = ("month", "category", "payment", "currency")
+
+
+# ============================================================
+# Materialized rollups
+# ============================================================
+# Minor-unit sums and counts per (month, category, payment, currency),
+# kept up to date one mutation at a time by the ledger. Group-by and
+# month-range queries then cost O(buckets), not O(expenses): a few
+# years of data is a few thousand buckets however many rows there are.
+class Rollups:
+    def __init__(self):
+        self.sums = {}    # (month, category, payment, currency) -> minor units
+        self.counts = {}  # same key -> number of records
+
+    @staticmethod
+    def key(rec):
+        return (rec["date"][:7], rec["category"], rec["payment"], rec["currency"])
+
+    def add(self, rec):
+        self.add_bucket(self.key(rec), to_minor(rec["amount"]), 1)
+
+    def add_bucket(self, key, minor, count):
+        self.sums[key] = self.sums.get(key, 0) + minor
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def remove(self, rec):
+        key = self.key(rec)
+        if key not in self.counts:
+            return
+        self.counts[key] -= 1
+        if self.counts[key] <= 0:
+            del self.counts[key]
+            del self.sums[key]
+        else:
+            self.sums[key] -= to_minor(rec["amount"])
+
+    def clear(self):
+        self.sums.clear()
+        self.counts.clear()
+
+    def buckets(self, date_from=None, date_to=None, **filters):
+        """(key, minor, count) for the buckets inside the month range
+        (YYYY-MM or full dates; inclusive) that match filters such as
+        category="Rental" or currency="EUR"."""
+        month_from = date_from[:7] if date_from else None
+        month_to = date_to[:7] if date_to else None
+        checks = [(ROLLUP_FIELDS.index(f), v) for f, v in filters.items() if v]
+        for key, minor in self.sums.items():
+            month = key[0]
+            if month_from and month < month_from:
+                continue
+            if month_to and month > month_to:
+                continue
+            if any(key[i] != v for i, v in checks):
+                continue
+            yield key, minor, self.counts[key]
+
+    def total(self, convert, by=("category",), by_date=False, date_from=None, date_to=None, **filters):
+        """{group: (converted total, count)} grouping by fields of ROLLUP_FIELDS;
+        convert(amount, currency, date) is e.g. a rates.Conversion.
+
+        A group is the field's value when by is a single field name, else a
+        tuple of values. With by_date each bucket converts at the rate of the
+        middle of its month, so these totals can differ from the ledger's
+        per-day grand total by a rounding of rates.
+        """
+        single = isinstance(by, str)
+        positions = [ROLLUP_FIELDS.index(f) for f in ((by,) if single else by)]
+        out = {}
+        for key, minor, count in self.buckets(date_from, date_to, **filters):
+            month, currency = key[0], key[3]
+            amount = convert(format_minor(minor), currency,
+                             f"{month}-15" if by_date and len(month) == 7 else None)
+            group = key[positions[0]] if single else tuple(key[i] for i in positions)
+            total, n = out.get(group, (0.0, 0))
+            out[group] = (total + amount, n + count)
+        return out
@@ -0,0 +1,126 @@
+from bisect import bisect_right
+from datetime import date
+
+from .store import MINOR_UNITS, day_ordinal, to_minor
+
+STEPS = ("day", "week", "month")
+
+# ============================================================
+# Spending over time
+# ============================================================
+# DailySums holds minor-unit sums per (day ordinal, category, currency).
+# It is built from the store in one pass the first time a chart asks,
+# then kept up to date by the ledger one mutation at a time (like
+# Rollups). A SpendSeries is its converted view for one (step, currency):
+# {category: {period: total}}, where period is the ordinal of the first
+# day of the day, week (Monday) or month. It too changes in O(1) per
+# mutation, so a chart redraw only sorts and downsamples points, however
+# many expenses there are.
+def period_of(day, step):
+    """Ordinal of the first day of the step-long period holding day."""
+    if step == "day":
+        return day
+    if step == "week":
+        return day - (day - 1) % 7   # ordinal 1 (0001-01-01) is a Monday
+    return day - date.fromordinal(day).day + 1
+
+
+class DailySums:
+    def __init__(self):
+        self.sums = {}    # (day, category, currency) -> minor units
+        self.counts = {}  # same key -> number of records
+
+    @classmethod
+    def from_store(cls, store):
+        out = cls()
+        for key, (minor, count) in store.day_sums().items():
+            out.sums[key] = minor
+            out.counts[key] = count
+        return out
+
+    @staticmethod
+    def key(rec):
+        return (day_ordinal(rec["date"]), rec["category"], rec["currency"])
+
+    def add(self, rec):
+        key = self.key(rec)
+        if not key[0]:
+            return   # no YYYY-MM-DD date, no place on a time axis
+        self.sums[key] = self.sums.get(key, 0) + to_minor(rec["amount"])
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def remove(self, rec):
+        key = self.key(rec)
+        if key not in self.counts:
+            return
+        self.counts[key] -= 1
+        if self.counts[key] <= 0:
+            del self.counts[key]
+            del self.sums[key]
+        else:
+            self.sums[key] -= to_minor(rec["amount"])
+
+
+class SpendSeries:
+    """{category: {period: total}} in one currency, converted by a
+    rates.Conversion (at each day's rate if by_date)."""
+
+    def __init__(self, daily, conversion, step, by_date=False):
+        if step not in STEPS:
+            raise ValueError(f"step must be one of {', '.join(STEPS)} (got {step!r})")
+        self.step = step
+        self.conversion = conversion
+        self.by_date = by_date
+        self.points = {}
+        self._periods = {}   # day -> period
+        for (day, category, currency), minor in daily.sums.items():
+            self._add(day, category, currency, minor)
+
+    def _add(self, day, category, currency, minor):
+        period = self._periods.get(day)
+        if period is None:
+            period = self._periods[day] = period_of(day, self.step)
+        factor = self.conversion.factor(currency, date.fromordinal(day).isoformat() if self.by_date else None)
+        points = self.points.get(category)
+        if points is None:
+            points = self.points[category] = {}
+        points[period] = points.get(period, 0.0) + minor / MINOR_UNITS * factor
+
+    def add(self, rec, sign=1):
+        day = day_ordinal(rec["date"])
+        if day:
+            self._add(day, rec["category"], rec["currency"], sign * to_minor(rec["amount"]))
+
+    def remove(self, rec):
+        self.add(rec, -1)
+
+
+# ---------------- downsampling ----------------
+def decimate(xs, ys, x_min, x_max, columns):
+    """Min/max decimation for a line drawn columns pixels wide over
+    x_min..x_max (xs ascending): per pixel column its lowest and highest
+    point, in x order, so every spike survives. (xs, ys) come back as they
+    are when there are at most two points per column anyway."""
+    n = len(xs)
+    if n <= 2 * columns:
+        return xs, ys
+    out_x, out_y = [], []
+    step = (x_max - x_min) / columns
+    a = 0
+    for c in range(1, columns + 1):
+        b = bisect_right(xs, x_min + c * step, a) if c < columns else n
+        if b - a <= 2:
+            out_x += xs[a:b]
+            out_y += ys[a:b]
+        else:
+            seg = ys[a:b]
+            i, j = seg.index(min(seg)), seg.index(max(seg))
+            if i > j:
+                i, j = j, i
+            out_x.append(xs[a + i])
+            out_y.append(seg[i])
+            if j != i:
+                out_x.append(xs[a + j])
+                out_y.append(seg[j])
+        a = b
+    return out_x, out_y
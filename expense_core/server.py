@@ -0,0 +1,322 @@
+import asyncio
+import json
+from datetime import date
+
+from .config import SERVER_HOST, SERVER_PORT
+from .ledger import MonthsOnDisk
+from .metrics import metrics
+
+# ============================================================
+# Ledger server
+# ============================================================
+# `python -m expense_core serve` keeps one Ledger open and serves it to
+# any number of local clients (the GUI through client.RemoteLedger, or
+# scripts), so several people can share one expenses file safely.
+# Protocol: one JSON object per line, both ways.
+#   request   {"id": 7, "method": "add", "params": {...}}
+#   response  {"id": 7, "result": ...}  or  {"id": 7, "error": "...", "type": "ValueError"}
+#   event     {"event": "changed", "added": [row...], "updated": [row...],
+#              "removed": [id...], "cleared": false}     (after "open")
+#             ("projected": [id...] too when the ids of the coming recurring
+#              rows, which are never saved, have changed)
+#             {"event": "rates", "online": true, "source": "live", "currencies": [...],
+#              "rates": {code: units per USD}}
+#             {"event": "saved", "error": null, "count": 3}
+# A row is [id, amount, currency, category, payment, date] (FIELDS).
+# Every request runs to completion on the event loop before the next one
+# starts, so writes are applied one at a time in arrival order and reads
+# need no locks; what can block (disk writes, rate fetches) happens on the
+# ledger's worker threads. The one exception: a request that needs months
+# still on disk (ledger.defer_loads makes it raise MonthsOnDisk first) waits
+# while they are read on a worker thread, serving other clients meanwhile,
+# and then runs again. A connection's events are written before the
+# response to the request that caused them.
+FIELDS = ("id", "amount", "currency", "category", "payment", "date")
+MAX_REQUEST = 64 * 1024 * 1024   # longest request line (an import)
+MAX_BACKLOG = 32 * 1024 * 1024   # unsent bytes before a stalled client is dropped
+
+
+def encode(msg):
+    return json.dumps(msg, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def parse_address(address):
+    """(host, port) from "host:port", ":port" or "port"."""
+    host, _, port = str(address).rpartition(":")
+    return host or SERVER_HOST, int(port)
+
+
+def _row(rec):
+    return [rec[f] for f in FIELDS]
+
+
+def _rates(rate_mgr):
+    # every currency the server's cross-rate matrix covers
+    return {**rate_mgr.fallback, **rate_mgr.rates}
+
+
+class ExpenseServer:
+    def __init__(self, ledger, host=SERVER_HOST, port=SERVER_PORT):
+        self.ledger = ledger
+        self.host = host
+        self.port = port
+        self.clients = set()       # every connection's StreamWriter
+        self.subscribers = set()   # connections that called "open"
+        self._projected = set()    # projected ids the subscribers know of
+        self._tasks = set()
+        self._server = None
+        self._loop = None
+        ledger.subscribe(self._on_changed)
+        ledger.on_saved = self._on_saved
+        ledger.defer_loads = True
+
+    # ---------------- lifecycle ----------------
+    async def start(self):
+        """Bind and start accepting; with port 0 self.port is the one picked."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._serve_client, self.host, self.port,
+                                                  limit=MAX_REQUEST)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.ledger.rate_mgr.fetch_async(self._on_rates_fetched)
+
+    async def serve_forever(self, ready=None):
+        await self.start()
+        if ready is not None:
+            ready(self)
+        try:
+            await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # let every connection's handler see its socket close and return
+            for writer in list(self.clients):
+                writer.close()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stop(self):
+        """Stop the loop from any thread (serve_forever() then returns)."""
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    async def _serve_client(self, reader, writer):
+        self.clients.add(writer)
+        self._tasks.add(asyncio.current_task())
+        metrics.incr("server.connections")
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(encode({"id": None, "error": "Request too long.", "type": "ValueError"}))
+                    break
+                if not line:
+                    break
+                writer.write(await self._handle(writer, line))
+                if writer.transport.get_write_buffer_size() > 64 * 1024:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            self.subscribers.discard(writer)
+            self._tasks.discard(asyncio.current_task())
+            writer.close()
+
+    async def _handle(self, conn, line):
+        rid = None
+        try:
+            req = json.loads(line)
+            rid = req.get("id")
+            method = req["method"]
+            fn = getattr(self, "rpc_" + method, None)
+            if fn is None:
+                raise ValueError(f"Unknown method {method!r}.")
+            with metrics.timer("server." + method):
+                while True:
+                    try:
+                        result = fn(conn, **req.get("params", {}))
+                        if asyncio.iscoroutine(result):
+                            result = await result
+                        break
+                    except MonthsOnDisk as e:
+                        await self._read_months(e.months)
+            return encode({"id": rid, "result": result})
+        except Exception as e:
+            return encode({"id": rid, "error": str(e), "type": type(e).__name__})
+
+    async def _read_months(self, months):
+        # the disk read runs off the loop; loading what was read is quick
+        loop = asyncio.get_running_loop()
+        with metrics.timer("server.read_months"):
+            records = await loop.run_in_executor(None, self.ledger.read_partitions, months)
+        self.ledger.prefetched.update(records)
+
+    # ---------------- notifications ----------------
+    def _broadcast(self, msg, targets):
+        if not targets:
+            return
+        data = encode(msg)
+        for writer in list(targets):
+            if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                # not reading its events; it would hold the whole history in memory
+                self.clients.discard(writer)
+                self.subscribers.discard(writer)
+                writer.transport.abort()
+                continue
+            writer.write(data)
+
+    def _on_changed(self, changes):
+        get = self.ledger.get
+        msg = {"event": "changed",
+               "added": [_row(get(i)) for i in changes.added],
+               "updated": [_row(get(i)) for i in changes.updated],
+               "removed": list(changes.removed),
+               "cleared": changes.cleared}
+        if self.ledger.projected.keys() != self._projected:
+            self._projected = set(self.ledger.projected)
+            msg["projected"] = list(self._projected)
+        self._broadcast(msg, self.subscribers)
+
+    def _on_saved(self, error, count):
+        # writer thread
+        msg = {"event": "saved", "error": None if error is None else str(error), "count": count}
+        self._call_soon(self._broadcast, msg, self.clients)
+
+    def _on_rates_fetched(self, online):
+        # rate fetch thread
+        self._call_soon(self._rates_fetched, online)
+
+    def _call_soon(self, fn, *args):
+        try:
+            self._loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass   # the loop has stopped (final save on shutdown)
+
+    def _rates_fetched(self, online):
+        self.ledger.rates_changed()
+        rate_mgr = self.ledger.rate_mgr
+        self._broadcast({"event": "rates", "online": online, "source": rate_mgr.source,
+                         "currencies": rate_mgr.currencies(), "rates": _rates(rate_mgr)}, self.clients)
+
+    # ---------------- methods ----------------
+    def _subset(self, ids, filter):
+        # a filter() result can be named by its query instead of its ids
+        if filter is not None:
+            return self.ledger.filter(**filter)
+        return ids
+
+    def rpc_open(self, conn):
+        """Subscribe to "changed" events; returns the loaded rows."""
+        self.subscribers.add(conn)
+        ledger = self.ledger
+        self._projected = set(ledger.projected)
+        return {"rows": [_row(rec) for rec in ledger.records()], "projected": list(self._projected),
+                "count": ledger.count(), "source": ledger.rate_mgr.source,
+                "currencies": ledger.rate_mgr.currencies(), "rates": _rates(ledger.rate_mgr)}
+
+    def rpc_add(self, _conn, amount, currency, category, payment, date, id=None):
+        return self.ledger.add(amount, currency, category, payment, date, exp_id=id)
+
+    def rpc_edit(self, _conn, id, amount, currency, category, payment, date):
+        return self.ledger.edit(id, amount, currency, category, payment, date)
+
+    def rpc_delete(self, _conn, ids):
+        return self.ledger.delete(ids)
+
+    def rpc_recategorize(self, _conn, ids, category):
+        return self.ledger.recategorize(ids, category)
+
+    def rpc_clear(self, _conn):
+        self.ledger.clear()
+
+    def rpc_import(self, _conn, records, replace=True):
+        return self.ledger.import_records(records, replace)
+
+    def rpc_get(self, _conn, ids):
+        return [self.ledger.get(i) for i in ids]
+
+    def rpc_list(self, _conn, offset=0, limit=None, **filters):
+        """Saved expenses only: no coming recurring rows."""
+        ids = self.ledger.filter(**filters)
+        projected = self.ledger.projected
+        ids = list(self.ledger.ids(projected=False)) if ids is None else [i for i in ids if i not in projected]
+        ids = ids[offset:None if limit is None else offset + limit]
+        return [_row(self.ledger.get(i)) for i in ids]
+
+    def rpc_filter(self, _conn, **filters):
+        return self.ledger.filter(**filters)
+
+    def rpc_sort(self, _conn, column, descending=False, ids=None, filter=None):
+        return self.ledger.sorted_ids(column, descending, exp_ids=self._subset(ids, filter))
+
+    # totals take the client's display currency (default: the server's)
+    def rpc_total(self, _conn, ids=None, filter=None, currency=None):
+        return self.ledger.total(self._subset(ids, filter), currency)
+
+    def rpc_total_between(self, _conn, date_from=None, date_to=None, currency=None):
+        return self.ledger.total_between(date_from, date_to, currency)
+
+    def rpc_total_last_days(self, _conn, days, today=None, currency=None):
+        return self.ledger.total_last_days(days, today and date.fromisoformat(today), currency)
+
+    def rpc_report(self, _conn, by="category", date_from=None, date_to=None, in_currency=None, **filters):
+        report = self.ledger.report(by=by, date_from=date_from, date_to=date_to,
+                                    in_currency=in_currency, **filters)
+        # a group is a value, or a tuple of them (a list in JSON)
+        return [[key, usd, count] for key, (usd, count) in report.items()]
+
+    def rpc_spend_series(self, _conn, step="month", currency=None):
+        # period ordinals can't be JSON object keys
+        return {category: list(points.items())
+                for category, points in self.ledger.spend_series(step, currency).items()}
+
+    def rpc_set_budget(self, _conn, category, amount, currency=None):
+        self.ledger.set_budget(category, amount, currency)
+
+    def rpc_budget_limits(self, _conn):
+        return self.ledger.budget_limits()
+
+    def rpc_budget_status(self, _conn, category, month, currency=None):
+        return self.ledger.budget_status(category, month, currency)
+
+    def rpc_budget_report(self, _conn, month, currency=None):
+        return self.ledger.budget_report(month, currency)
+
+    def rpc_recurring(self, _conn):
+        return self.ledger.recurring_rules()
+
+    def rpc_add_recurring(self, _conn, amount, currency, category, payment, start, rule="monthly"):
+        return self.ledger.add_recurring(amount, currency, category, payment, start, rule)
+
+    def rpc_remove_recurring(self, _conn, id):
+        return self.ledger.remove_recurring(id)
+
+    def rpc_apply_recurring(self, _conn):
+        return self.ledger.apply_recurring()
+
+    def rpc_count(self, _conn):
+        return self.ledger.count()
+
+    def rpc_unloaded(self, _conn):
+        return sorted(self.ledger.unloaded)
+
+    def rpc_load_older(self, _conn):
+        return self.ledger.load_older()
+
+    def rpc_load_partitions(self, _conn, months=None):
+        return self.ledger.load_partitions(months)
+
+    def rpc_refresh_rates(self, _conn, force=False):
+        """Fetch rates in the background; every client gets a "rates" event."""
+        self.ledger.rate_mgr.fetch_async(self._on_rates_fetched, force=force)
+
+    async def rpc_flush(self, _conn):
+        # waits for the writer thread, so not on the loop
+        await asyncio.get_running_loop().run_in_executor(None, self.ledger.flush)
+
+
+def serve(ledger, host=SERVER_HOST, port=SERVER_PORT, ready=None):
+    """Serve an open ledger until interrupted (or stop() is called)."""
+    server = ExpenseServer(ledger, host, port)
+    asyncio.run(server.serve_forever(ready))
+    return server
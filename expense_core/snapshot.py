@@ -0,0 +1,188 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .helpers import normalize_currency
+from .store import MINOR_DIGITS, ExpenseStore, Interner
+
+# ============================================================
+# Binary snapshot format
+# ============================================================
+# A snapshot is ExpenseStore's columns written out as they sit in memory,
+# so loading is one mmap and one memcpy per column instead of parsing
+# JSON and decoding every record (little-endian throughout):
+#   header      MAGIC, version, minor digits, row count, the three
+#               dictionary sizes and the number of extras
+#   dictionaries  currency, category and payment strings (u16 length +
+#               UTF-8), in code order
+#   extras      (row u32, kind u8, string): ids that aren't canonical
+#               uuid4 strings, and dates that aren't YYYY-MM-DD
+#   sums        u32 length + JSON: the store's bucket_sums() and
+#               rollup_sums() at write time, so a load can seed the
+#               ledger's totals without a pass over the rows
+#   columns     8-byte aligned, row order: id 16 bytes (binary UUID),
+#               amount int64 minor units, date int32 ordinal, currency /
+#               category / payment uint16 codes
+# Readers reject other versions; JSON stays the import/export format.
+MAGIC = b"EXPSNAP\x00"
+VERSION = 1
+_HEADER = struct.Struct("<8sHHIHHHxxI")
+_LENGTH = struct.Struct("<H")
+_EXTRA = struct.Struct("<IBH")
+_SUMS = struct.Struct("<I")
+_EXTRA_ID, _EXTRA_DATE = 0, 1
+# (attribute, array typecode, bytes per row) after the id column
+_COLUMNS = (("amounts", "q", 8), ("days", "i", 4), ("currency", "H", 2),
+            ("category", "H", 2), ("payment", "H", 2))
+_SWAP = sys.byteorder != "little"
+# where each of a UUID's 32 hex digits goes in its 36-character string
+_UUID_HEX_POS = (*range(0, 8), *range(9, 13), *range(14, 18), *range(19, 23), *range(24, 36))
+
+
+def _uuid_bytes(exp_id):
+    """16 bytes for a canonical (lower-case, dashed) UUID string, else None."""
+    if len(exp_id) != 36 or exp_id.lower() != exp_id or exp_id[8] != "-" or exp_id[13] != "-" \
+            or exp_id[18] != "-" or exp_id[23] != "-":
+        return None
+    try:
+        return bytes.fromhex(exp_id.replace("-", ""))
+    except ValueError:
+        return None
+
+
+def store_from_records(records):
+    """ExpenseStore holding records (dicts in the expenses.json shape)."""
+    store = ExpenseStore()
+    for rec in records:
+        store.add(dict(rec, currency=normalize_currency(rec.get("currency") or "")))
+    return store
+
+
+def write_snapshot(path, store):
+    """Write an ExpenseStore (tombstones are skipped) to path atomically."""
+    if store.dead:
+        store.compact()
+    n = len(store.ids)
+    ids = bytearray(16 * n)
+    extras = []
+    for row, exp_id in enumerate(store.ids):
+        raw = _uuid_bytes(exp_id)
+        if raw is None:
+            extras.append((row, _EXTRA_ID, exp_id))
+        else:
+            ids[16 * row:16 * row + 16] = raw
+    extras.extend((row, _EXTRA_DATE, raw) for row, raw in sorted(store._raw_dates.items()))
+
+    parts = [_HEADER.pack(MAGIC, VERSION, MINOR_DIGITS, n, len(store.currencies.values),
+                          len(store.categories.values), len(store.payments.values), len(extras))]
+    for interner in (store.currencies, store.categories, store.payments):
+        for value in interner.values:
+            data = value.encode("utf-8")
+            parts.append(_LENGTH.pack(len(data)) + data)
+    for row, kind, value in extras:
+        data = value.encode("utf-8")
+        parts.append(_EXTRA.pack(row, kind, len(data)) + data)
+    sums = _encode_sums(store)
+    parts.append(_SUMS.pack(len(sums)) + sums)
+    size = sum(map(len, parts))
+    parts.append(b"\x00" * (-size % 8))
+    parts.append(ids)
+    for attr, _code, _width in _COLUMNS:
+        column = getattr(store, attr)
+        if _SWAP:
+            column = array(column.typecode, column)
+            column.byteswap()
+        parts.append(column.tobytes())
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.writelines(parts)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """ExpenseStore loaded from a snapshot file; ValueError if it isn't one
+    (or is a version this code can't read)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            raise ValueError(f"{path}: not an expense snapshot")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return _decode(path, view)
+
+
+def _decode(path, view):
+    magic, version, digits, n, n_cur, n_cat, n_pay, n_extra = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not an expense snapshot")
+    if version != VERSION or digits != MINOR_DIGITS:
+        raise ValueError(f"{path}: unsupported snapshot version {version}")
+    pos = _HEADER.size
+    interners = []
+    for count in (n_cur, n_cat, n_pay):
+        interner = Interner()
+        for _ in range(count):
+            (length,) = _LENGTH.unpack_from(view, pos)
+            pos += _LENGTH.size
+            interner.code(str(view[pos:pos + length], "utf-8"))
+            pos += length
+        interners.append(interner)
+    extras = []
+    for _ in range(n_extra):
+        row, kind, length = _EXTRA.unpack_from(view, pos)
+        pos += _EXTRA.size
+        extras.append((row, kind, str(view[pos:pos + length], "utf-8")))
+        pos += length
+    (length,) = _SUMS.unpack_from(view, pos)
+    pos += _SUMS.size
+    sums = _decode_sums(bytes(view[pos:pos + length]))
+    pos += length
+    pos += -pos % 8
+    end = pos + 16 * n + sum(width for _attr, _code, width in _COLUMNS) * n
+    if len(view) < end:
+        raise ValueError(f"{path}: truncated snapshot")
+
+    ids = _format_uuids(view[pos:pos + 16 * n], n)
+    pos += 16 * n
+    columns = {}
+    for attr, code, width in _COLUMNS:
+        column = array(code)
+        column.frombytes(view[pos:pos + width * n])
+        if _SWAP:
+            column.byteswap()
+        columns[attr] = column
+        pos += width * n
+    raw_dates = {}
+    for row, kind, value in extras:
+        if kind == _EXTRA_ID:
+            ids[row] = value
+        else:
+            raw_dates[row] = value
+    return ExpenseStore.from_columns(ids, columns, interners, raw_dates, sums)
+
+
+def _format_uuids(raw, n):
+    """The n 16-byte UUIDs in raw as canonical strings. Each digit position
+    is one strided copy over all n ids, so no Python code runs per id."""
+    hexed = raw.hex().encode("ascii")
+    out = bytearray(b"-" * (37 * n))
+    out[36::37] = b"\n" * n
+    for digit, pos in enumerate(_UUID_HEX_POS):
+        out[pos::37] = hexed[digit::32]
+    return out.decode("ascii").split("\n")[:n]
+
+
+def _encode_sums(store):
+    buckets = [[cur, day, minor, count] for (cur, day), (minor, count) in store.bucket_sums().items()]
+    rollups = [[*key, minor, count] for key, (minor, count) in store.rollup_sums().items()]
+    return json.dumps({"buckets": buckets, "rollups": rollups}, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_sums(data):
+    sums = json.loads(data)
+    return ({(cur, day): (minor, count) for cur, day, minor, count in sums["buckets"]},
+            {tuple(key): (minor, count) for *key, minor, count in sums["rollups"]})
@@ -0,0 +1,745 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date
+
+from .config import EAGER_MONTHS
+from .helpers import normalize_currency
+from .snapshot import read_snapshot, store_from_records, write_snapshot
+from .store import ExpenseStore, day_ordinal, to_minor
+
+FIELDS = ("id", "amount", "currency", "category", "payment", "date")
+
+
+# ============================================================
+# Storage interface
+# ============================================================
+class ExpenseStorage:
+    """Backend interface. Records are plain dicts with the keys in FIELDS."""
+
+    load_progress = None    # fraction read by a running stream(), if known
+    needs_rewrite = False   # stream() made up data (ids) that should be saved
+
+    def load(self):
+        """Return {id: record} in insertion order."""
+        raise NotImplementedError
+
+    def stream(self):
+        """Yield the ledger as (op, args) entries (see apply_batch), a few at a
+        time, so callers can load it incrementally. Backends that can read
+        lazily override this."""
+        for rec in self.load().values():
+            yield "add", (rec,)
+
+    def open_columns(self):
+        """(ExpenseStore or None, entries): a columnar snapshot loaded without
+        decoding records, plus the (op, args) entries still to apply on top.
+        Backends without one return (None, self.stream())."""
+        return None, self.stream()
+
+    def rewrite(self, records):
+        """Replace everything stored with records."""
+        self.apply_batch([("clear", ())] + [("add", (rec,)) for rec in records])
+
+    def add(self, rec):
+        raise NotImplementedError
+
+    def update(self, rec):
+        raise NotImplementedError
+
+    def delete(self, exp_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def apply_batch(self, ops):
+        """Persist a list of (op, args) pairs, op in add/update/delete/clear.
+        Backends override this to do it in a single write."""
+        for op, args in ops:
+            getattr(self, op)(*args)
+
+    def close(self):
+        pass
+
+    def bucket_totals(self):
+        """{(currency, date): (minor-unit sum, count)} without loading records,
+        or None if the backend can't aggregate by itself."""
+        return None
+
+    def unloaded_totals(self):
+        """{month: {(currency, date): (minor-unit sum, count)}} for the stored
+        months that stream() left out (see PartitionedStore)."""
+        return {}
+
+    def load_partition(self, month):
+        """Records of one month that stream() left out."""
+        raise NotImplementedError
+
+
+def iter_json_array(f, block_size=1 << 16):
+    """Yield the items of the top-level JSON array in text file f one at a
+    time, reading it in blocks instead of parsing the whole file."""
+    decode = json.JSONDecoder().raw_decode
+    buf, pos, eof, started = "", 0, False, False
+    while True:
+        # skip whitespace and separators, refilling as needed
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(block_size), 0
+            eof = not buf
+        if pos >= len(buf):
+            if started:
+                raise ValueError("Unexpected end of JSON array")
+            return
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            # item cut off at the end of the block
+            more = f.read(block_size)
+            buf, pos, eof = buf[pos:] + more, 0, not more
+            continue
+        yield item
+        pos = end
+
+
+def _apply_to_store(store, op, args):
+    if op == "add" or op == "update":
+        store.add(args[0])
+    elif op == "delete":
+        store.remove(args[0])
+    elif op == "clear":
+        store.clear()
+
+
+def _apply_entry(records, op, args):
+    if op == "add" or op == "update":
+        rec = args[0]
+        if rec["id"] in records:
+            records[rec["id"]].update(rec)
+        else:
+            records[rec["id"]] = rec
+    elif op == "delete":
+        records.pop(args[0], None)
+    elif op == "clear":
+        records.clear()
+
+
+# ============================================================
+# Journal storage
+# ============================================================
+# The ledger lives in two files:
+#   expenses.snap     binary snapshot (see snapshot.py)
+#   expenses.journal  one JSON object per line, appended on every change
+# Loading = read snapshot, then replay the journal on top of it.
+# Once the journal passes COMPACT_BYTES it is rotated away and folded
+# into a fresh snapshot on a background thread.
+# A JSON snapshot (expenses.json, the app's original format) is still read
+# when there is no .snap yet; the first snapshot written replaces it and
+# it is kept as expenses.json.migrated.
+COMPACT_BYTES = 1024 * 1024
+
+
+def _journal_path_for(path):
+    root, _ext = os.path.splitext(path)
+    return root + ".journal"
+
+
+def _snapshot_path_for(path):
+    root, _ext = os.path.splitext(path)
+    return root + ".snap"
+
+
+class JournalStore(ExpenseStorage):
+    def __init__(self, path, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.snap_path = _snapshot_path_for(path)
+        self.journal_path = _journal_path_for(path)
+        self.rotated_path = self.journal_path + ".old"
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._fh = None
+        self._compactor = None
+
+    # ---------------- loading ----------------
+    def load(self):
+        """Return {id: record} rebuilt from the snapshot plus journal."""
+        records = {}
+        for op, args in self.stream():
+            _apply_entry(records, op, args)
+        if self.needs_rewrite:
+            self.rewrite(records.values())
+        return records
+
+    def stream(self):
+        """The snapshot's records as adds (a JSON one parsed incrementally),
+        then the journal entries on top. Sets needs_rewrite after a JSON snapshot."""
+        self.needs_rewrite = False
+        self.load_progress = 0.0
+        if os.path.exists(self.snap_path):
+            for rec in read_snapshot(self.snap_path).records():
+                yield "add", (rec,)
+        elif os.path.exists(self.path):
+            # converted to a binary snapshot once loaded
+            self.needs_rewrite = True
+            size = os.path.getsize(self.path) or 1
+            with open(self.path, "r", encoding="utf-8") as f:
+                for n, rec in enumerate(iter_json_array(f), 1):
+                    if not rec.get("id"):
+                        # old files have no ids; the rewrite saves the generated
+                        # ones so later journal entries can refer to them
+                        rec = dict(rec, id=str(uuid.uuid4()))
+                    yield "add", (rec,)
+                    if n % 1024 == 0:
+                        self.load_progress = f.buffer.tell() / size
+        yield from self._journal_entries()
+
+    def open_columns(self):
+        if not os.path.exists(self.snap_path):
+            return None, self.stream()
+        self.needs_rewrite = False
+        return read_snapshot(self.snap_path), self._journal_entries()
+
+    def _journal_entries(self):
+        # a rotated journal only survives if compaction was interrupted
+        for path in (self.rotated_path, self.journal_path):
+            yield from self._iter_journal(path)
+        self.load_progress = 1.0
+
+    def rewrite(self, records):
+        self._write_snapshot(list(records))
+        self._truncate_journals()
+
+    def _read_store(self):
+        """The snapshot as an ExpenseStore (binary, else JSON, else empty)."""
+        if os.path.exists(self.snap_path):
+            return read_snapshot(self.snap_path)
+        if not os.path.exists(self.path):
+            return ExpenseStore()
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return store_from_records(dict(rec, id=rec.get("id") or str(uuid.uuid4())) for rec in data)
+
+    @staticmethod
+    def _iter_journal(path):
+        """Journal lines as (op, args) entries."""
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn last line from a crash mid-append
+                    continue
+                op = entry.get("op")
+                if op == "add":
+                    yield "add", (entry["rec"],)
+                elif op == "edit":
+                    yield "update", (entry["rec"],)
+                elif op == "del":
+                    yield "delete", (entry["id"],)
+                elif op == "clear":
+                    yield "clear", ()
+
+    # ---------------- appending ----------------
+    @staticmethod
+    def _entry(op, *args):
+        if op == "add":
+            return {"op": "add", "rec": args[0]}
+        if op == "update":
+            return {"op": "edit", "rec": args[0]}
+        if op == "delete":
+            return {"op": "del", "id": args[0]}
+        return {"op": "clear"}
+
+    def add(self, rec):
+        self._append([self._entry("add", rec)])
+
+    def update(self, rec):
+        self._append([self._entry("update", rec)])
+
+    def delete(self, exp_id):
+        self._append([self._entry("delete", exp_id)])
+
+    def clear(self):
+        self._append([self._entry("clear")])
+
+    def apply_batch(self, ops):
+        if ops:
+            self._append([self._entry(op, *args) for op, args in ops])
+
+    def _append(self, entries):
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries)
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.journal_path, "a", encoding="utf-8")
+            self._fh.write(data)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            size = self._fh.tell()
+        if size >= self.compact_bytes:
+            self.compact()
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    # ---------------- compaction ----------------
+    def compact(self):
+        """Rotate the journal and fold it into the snapshot in the background."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            # a leftover rotated journal (interrupted run) is folded in first;
+            # the live journal waits for the next compaction
+            if not os.path.exists(self.rotated_path):
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                if not os.path.exists(self.journal_path):
+                    return
+                os.replace(self.journal_path, self.rotated_path)
+            self._compactor = threading.Thread(target=self._compact_worker, daemon=True)
+            self._compactor.start()
+
+    def _compact_worker(self):
+        try:
+            store = self._read_store()
+            for op, args in self._iter_journal(self.rotated_path):
+                _apply_to_store(store, op, args)
+            write_snapshot(self.snap_path, store)
+            self._retire_json()
+            os.remove(self.rotated_path)
+        except Exception as e:
+            # the rotated journal stays on disk and is replayed next load
+            print("Journal compaction error:", e)
+
+    def _write_snapshot(self, data):
+        write_snapshot(self.snap_path, store_from_records(data))
+        self._retire_json()
+
+    def _retire_json(self):
+        # the binary snapshot now holds everything the JSON one did
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + ".migrated")
+
+    def _truncate_journals(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            for path in (self.rotated_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def remove_files(self):
+        """Delete the snapshot and journals (after any compaction finishes)."""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        self._truncate_journals()
+        for path in (self.snap_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# ============================================================
+# Month-partitioned storage
+# ============================================================
+# expenses_by_month/
+#   2024-03.json (+ .journal)   one JournalStore per month of the record date
+#   undated.json                records without a valid YYYY-MM-DD date
+#   manifest.json               per month: count, per-currency sums and
+#                               per-(day, currency) sums, in minor units
+# stream() reads only the last EAGER_MONTHS months (plus undated and future
+# ones). The ledger counts the other months from the manifest and pulls them
+# in with load_partition() when a query reaches them, so startup cost follows
+# the recent months, not the whole history. The manifest is written on the
+# first change of a session with "clean": false and again on close(); if a
+# crash leaves it unclean it is rebuilt from the partitions on the next open.
+# A flat expenses.json (+ journal) is split up on first open and renamed to
+# *.migrated.
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+UNDATED = "undated"
+
+
+def _partition_dir_for(path):
+    root, _ext = os.path.splitext(path)
+    return root + "_by_month"
+
+
+def partition_of(date_str):
+    """Partition name (YYYY-MM, or UNDATED) for a record date."""
+    return date_str[:7] if day_ordinal(date_str) else UNDATED
+
+
+def _summary_key(rec):
+    date_str = rec.get("date") or ""
+    return (partition_of(date_str), normalize_currency(rec.get("currency") or ""), date_str,
+            to_minor(rec.get("amount") or ""))
+
+
+class PartitionedStore(ExpenseStorage):
+    def __init__(self, directory, legacy_path=None, eager_months=EAGER_MONTHS):
+        self.directory = directory
+        self.legacy_path = legacy_path
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.eager_months = eager_months
+        self.parts = {}      # month -> JournalStore, opened on first use
+        self.buckets = {}    # month -> {(currency, date): [minor, count]}
+        self.known = {}      # id -> (month, currency, date, minor) of loaded/written records
+        self.loaded = set()  # months whose records have all been handed out
+        self._lock = threading.RLock()
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._open_manifest()
+
+    def _part(self, month):
+        part = self.parts.get(month)
+        if part is None:
+            part = self.parts[month] = JournalStore(os.path.join(self.directory, month + ".json"))
+        return part
+
+    def _months_on_disk(self):
+        months = set()
+        for name in os.listdir(self.directory):
+            if name.endswith(".journal.old"):
+                # all that is left of a month whose compaction was interrupted
+                name = name[:-len(".old")]
+            month, ext = os.path.splitext(name)
+            if ext in (".snap", ".json", ".journal") and name != MANIFEST_FILE:
+                months.add(month)
+        return months
+
+    def _is_eager(self, month):
+        today = date.today()
+        year, mon = today.year, today.month - (self.eager_months - 1)
+        while mon < 1:
+            year, mon = year - 1, mon + 12
+        return month == UNDATED or month >= f"{year:04d}-{mon:02d}"
+
+    # ---------------- manifest ----------------
+    def _open_manifest(self):
+        manifest = None
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except ValueError:
+                manifest = None
+        if manifest and manifest.get("version") == MANIFEST_VERSION and manifest.get("clean"):
+            for month, part in manifest["partitions"].items():
+                self.buckets[month] = {(currency, day): list(pair)
+                                       for day, by_currency in part["days"].items()
+                                       for currency, pair in by_currency.items()}
+            return
+        if manifest is None and self.legacy_path and self._migrate():
+            return
+        # missing, unclean or unknown version: recount every partition
+        for month in self._months_on_disk():
+            self._summarize(month, self._part(month).load().values())
+        self._write_manifest(clean=True)
+
+    def _summarize(self, month, records):
+        for rec in records:
+            _month, currency, day, minor = _summary_key(rec)
+            self._bump(month, currency, day, minor, 1)
+
+    def _migrate(self):
+        legacy = JournalStore(self.legacy_path)
+        paths = (legacy.snap_path, legacy.path, legacy.journal_path, legacy.rotated_path)
+        if not any(os.path.exists(p) for p in paths):
+            return False
+        groups = {}
+        for rec in legacy.load().values():
+            groups.setdefault(partition_of(rec.get("date") or ""), []).append(rec)
+        legacy.close()
+        for month, records in groups.items():
+            self._part(month).rewrite(records)
+            self._summarize(month, records)
+        self._write_manifest(clean=True)
+        # the flat files stay around as a backup
+        for path in paths:
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
+        return True
+
+    def _write_manifest(self, clean):
+        partitions = {}
+        for month, buckets in sorted(self.buckets.items()):
+            sums, days, count = {}, {}, 0
+            for (currency, day), (minor, n) in sorted(buckets.items()):
+                sums[currency] = sums.get(currency, 0) + minor
+                days.setdefault(day, {})[currency] = [minor, n]
+                count += n
+            partitions[month] = {"count": count, "sums": sums, "days": days}
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "clean": clean, "partitions": partitions}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def _bump(self, month, currency, day, minor, count):
+        buckets = self.buckets.setdefault(month, {})
+        pair = buckets.get((currency, day))
+        if pair is None:
+            pair = buckets[(currency, day)] = [0, 0]
+        pair[0] += minor
+        pair[1] += count
+        if pair[1] <= 0:
+            del buckets[(currency, day)]
+        if not buckets:
+            del self.buckets[month]
+
+    # ---------------- loading ----------------
+    def stream(self):
+        months = sorted(m for m in self.buckets if self._is_eager(m))
+        self.load_progress = 0.0
+        for n, month in enumerate(months, 1):
+            for rec in self.load_partition(month):
+                yield "add", (rec,)
+            self.load_progress = n / len(months)
+        self.load_progress = 1.0
+
+    def load_partition(self, month):
+        with self._lock:
+            records = list(self._part(month).load().values())
+            for rec in records:
+                self.known[rec["id"]] = _summary_key(rec)
+            self.loaded.add(month)
+        return records
+
+    def unloaded_totals(self):
+        with self._lock:
+            return {month: {key: tuple(pair) for key, pair in buckets.items()}
+                    for month, buckets in self.buckets.items() if month not in self.loaded}
+
+    def bucket_totals(self):
+        out = {}
+        with self._lock:
+            for buckets in self.buckets.values():
+                for key, (minor, n) in buckets.items():
+                    total, count = out.get(key, (0, 0))
+                    out[key] = (total + minor, count + n)
+        return out
+
+    # ---------------- writing ----------------
+    def add(self, rec):
+        self.apply_batch([("add", (rec,))])
+
+    def update(self, rec):
+        self.apply_batch([("update", (rec,))])
+
+    def delete(self, exp_id):
+        self.apply_batch([("delete", (exp_id,))])
+
+    def clear(self):
+        self.apply_batch([("clear", ())])
+
+    def apply_batch(self, ops):
+        """Route each op to its month's journal (an edit that changes the month
+        becomes a delete there and an add in the new one), one append per month."""
+        if not ops:
+            return
+        with self._lock:
+            if not self._dirty:
+                self._write_manifest(clean=False)
+                self._dirty = True
+            pending = {}   # month -> [(op, args)]
+            for op, args in ops:
+                if op == "clear":
+                    pending = {}
+                    self._wipe()
+                    continue
+                rec = None if op == "delete" else args[0]
+                exp_id = args[0] if op == "delete" else rec["id"]
+                old = self.known.pop(exp_id, None)
+                if old is not None:
+                    self._bump(*old[:3], -old[3], -1)
+                new = None
+                if rec is not None:
+                    new = self.known[exp_id] = _summary_key(rec)
+                    if new[0] not in self.buckets:
+                        # a brand-new month: everything in it is in memory
+                        self.loaded.add(new[0])
+                    self._bump(*new, 1)
+                if old is not None and (new is None or new[0] != old[0]):
+                    pending.setdefault(old[0], []).append(("delete", (exp_id,)))
+                if new is not None:
+                    entry = "update" if old is not None and old[0] == new[0] else "add"
+                    pending.setdefault(new[0], []).append((entry, (rec,)))
+            for month, entries in pending.items():
+                self._part(month).apply_batch(entries)
+
+    def _wipe(self):
+        for month in self._months_on_disk() | set(self.parts):
+            self._part(month).remove_files()
+        self.parts.clear()
+        self.buckets.clear()
+        self.known.clear()
+        self.loaded.clear()
+
+    def close(self):
+        with self._lock:
+            for part in self.parts.values():
+                part.close()
+            if self._dirty:
+                self._write_manifest(clean=True)
+                self._dirty = False
+
+
+# ============================================================
+# SQLite storage
+# ============================================================
+# One row per expense, ordered by rowid (= insertion order, kept on
+# UPDATE). Filters and totals are answered from the column indexes.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id       TEXT PRIMARY KEY,
+    amount   TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    category TEXT NOT NULL,
+    payment  TEXT NOT NULL,
+    date     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date     ON expenses(date);
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
+CREATE INDEX IF NOT EXISTS idx_expenses_currency ON expenses(currency);
+CREATE INDEX IF NOT EXISTS idx_expenses_payment  ON expenses(payment);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# statements are constant strings so sqlite3's per-connection
+# statement cache keeps them prepared
+_INSERT_SQL = ("INSERT OR REPLACE INTO expenses (id, amount, currency, category, payment, date) "
+               "VALUES (:id, :amount, :currency, :category, :payment, :date)")
+_UPDATE_SQL = ("UPDATE expenses SET amount = :amount, currency = :currency, category = :category, "
+               "payment = :payment, date = :date WHERE id = :id")
+_DELETE_SQL = "DELETE FROM expenses WHERE id = ?"
+_SELECT_SQL = "SELECT id, amount, currency, category, payment, date FROM expenses"
+
+
+def _row_to_record(row):
+    return dict(zip(FIELDS, row))
+
+
+def _clean_record(rec):
+    return {k: rec.get(k) or "" for k in FIELDS}
+
+
+class SQLiteStore(ExpenseStorage):
+    def __init__(self, path):
+        self.path = path
+        # writes may come from the ledger's write-behind thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def load(self):
+        cur = self.conn.execute(_SELECT_SQL + " ORDER BY rowid")
+        return {row[0]: _row_to_record(row) for row in cur}
+
+    def stream(self):
+        total = self.conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0] or 1
+        self.load_progress = 0.0
+        cur = self.conn.execute(_SELECT_SQL + " ORDER BY rowid")
+        done = 0
+        while True:
+            rows = cur.fetchmany(1024)
+            if not rows:
+                break
+            for row in rows:
+                yield "add", (_row_to_record(row),)
+            done += len(rows)
+            self.load_progress = done / total
+        self.load_progress = 1.0
+
+    def add(self, rec):
+        with self.conn:
+            self.conn.execute(_INSERT_SQL, _clean_record(rec))
+
+    def update(self, rec):
+        with self.conn:
+            self.conn.execute(_UPDATE_SQL, _clean_record(rec))
+
+    def delete(self, exp_id):
+        with self.conn:
+            self.conn.execute(_DELETE_SQL, (exp_id,))
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM expenses")
+
+    def apply_batch(self, ops):
+        # one transaction for the whole batch
+        with self.conn:
+            for op, args in ops:
+                if op == "add":
+                    self.conn.execute(_INSERT_SQL, _clean_record(args[0]))
+                elif op == "update":
+                    self.conn.execute(_UPDATE_SQL, _clean_record(args[0]))
+                elif op == "delete":
+                    self.conn.execute(_DELETE_SQL, (args[0],))
+                elif op == "clear":
+                    self.conn.execute("DELETE FROM expenses")
+
+    def close(self):
+        self.conn.close()
+
+    # ---------------- aggregates ----------------
+    def bucket_totals(self):
+        cur = self.conn.execute(
+            "SELECT currency, date, SUM(CAST(ROUND(CAST(amount AS REAL) * 100) AS INTEGER)), COUNT(*) "
+            "FROM expenses GROUP BY currency, date")
+        return {(currency, day): (total or 0, count) for currency, day, total, count in cur}
+
+    # ---------------- migration ----------------
+    def migrate_from_json(self, json_path):
+        """Copy the journal ledger (snapshot + journal) in once. Returns the row count."""
+        done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        paths = (json_path, _snapshot_path_for(json_path), _journal_path_for(json_path))
+        if done or not any(os.path.exists(p) for p in paths):
+            return 0
+        records = JournalStore(json_path).load()
+        with self.conn:
+            self.conn.executemany(_INSERT_SQL, (_clean_record(r) for r in records.values()))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                              (os.path.abspath(json_path),))
+        return len(records)
+
+
+def open_storage(backend, json_path, db_path):
+    """Build the configured backend ("partitioned", "journal" or "sqlite")."""
+    if backend == "partitioned":
+        return PartitionedStore(_partition_dir_for(json_path), legacy_path=json_path)
+    if backend == "sqlite":
+        store = SQLiteStore(db_path)
+        store.migrate_from_json(json_path)
+        return store
+    if backend == "journal":
+        return JournalStore(json_path)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,411 @@
+from array import array
+from datetime import date
+from decimal import Decimal
+
+from .totals import parse_amount
+
+_np = None
+
+
+def _numpy():
+    """NumPy if installed (imported on first use), else None."""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:  # optional: only speeds up the bulk aggregations
+            numpy = False
+        _np = numpy
+    return _np or None
+
+
+# ============================================================
+# Columnar in-memory expense store
+# ============================================================
+# One row per expense, one typed array per column:
+#   amounts   int64 minor units (cents; amounts are rounded to 2 places)
+#   days      date ordinals (0 = empty or non-YYYY-MM-DD date string,
+#             kept verbatim in _raw_dates)
+#   currency / category / payment   uint16 codes into an Interner
+# Deleted rows are tombstoned in `alive` and squeezed out by compact().
+MINOR_UNITS = 100
+MINOR_DIGITS = 2
+
+
+def to_minor(amount):
+    """Amount string -> integer minor units (half-even rounding)."""
+    return int((parse_amount(amount) * MINOR_UNITS).to_integral_value())
+
+
+def format_minor(value):
+    return f"{Decimal(value).scaleb(-MINOR_DIGITS):.{MINOR_DIGITS}f}"
+
+
+def day_ordinal(date_str):
+    """Ordinal of a canonical YYYY-MM-DD string, else 0."""
+    try:
+        day = date.fromisoformat(date_str or "").toordinal()
+    except ValueError:
+        return 0
+    return day if date.fromordinal(day).isoformat() == date_str else 0
+
+
+class Interner:
+    """Maps repeated strings (currency, category, payment) to small ints."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+
+class ExpenseStore:
+    def __init__(self):
+        self.currencies = Interner()
+        self.categories = Interner()
+        self.payments = Interner()
+        self.generation = 0           # bumped whenever rows are renumbered
+        self.saved_sums = None        # see from_columns(); not kept up to date
+        self._reset()
+
+    def _reset(self):
+        self.ids = []                 # row -> expense id (None once deleted)
+        self.index = {}               # expense id -> row
+        self.amounts = array("q")
+        self.days = array("i")
+        self.currency = array("H")
+        self.category = array("H")
+        self.payment = array("H")
+        self.alive = bytearray()
+        self._raw_dates = {}          # row -> date string that isn't ISO
+        self.dead = 0
+        self.generation += 1
+
+    @classmethod
+    def from_columns(cls, ids, columns, interners, raw_dates, saved_sums=None):
+        """A store adopting ready-made columns (see snapshot.read_snapshot):
+        ids list, {"amounts": array, ...}, the (currency, category, payment)
+        Interners and {row: raw date string}. No row is decoded.
+        saved_sums is (bucket_sums(), rollup_sums()) as they were when the
+        columns were saved, if known."""
+        store = cls()
+        store.currencies, store.categories, store.payments = interners
+        store.ids = ids
+        store.index = dict(zip(ids, range(len(ids))))
+        for attr, column in columns.items():
+            setattr(store, attr, column)
+        store.alive = bytearray(b"\x01" * len(ids))
+        store._raw_dates = raw_dates
+        store.saved_sums = saved_sums
+        return store
+
+    # ---------------- mapping-style access ----------------
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, exp_id):
+        return exp_id in self.index
+
+    def __iter__(self):
+        """Expense ids in row order."""
+        return (exp_id for exp_id in self.ids if exp_id is not None)
+
+    def row_of(self, exp_id):
+        return self.index.get(exp_id)
+
+    def get(self, exp_id):
+        """The record as a plain dict (a copy), or None."""
+        row = self.index.get(exp_id)
+        return None if row is None else self._record(row)
+
+    def records(self):
+        for row, exp_id in enumerate(self.ids):
+            if exp_id is not None:
+                yield self._record(row)
+
+    def chunks(self, rows=None, size=10_000):
+        """Records in lists of up to size: of the given row numbers (see
+        row_of), or of every live row."""
+        if rows is None:
+            rows = (row for row, exp_id in enumerate(self.ids) if exp_id is not None)
+        chunk = []
+        for row in rows:
+            chunk.append(self._record(row))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def frozen(self):
+        """A copy another thread can read while this one keeps changing
+        (exporter.py). Columns are copied as arrays, not decoded into
+        records, so it costs a few memcpys and one dict copy."""
+        copy = ExpenseStore()
+        for name in ("currencies", "categories", "payments"):
+            src, dst = getattr(self, name), getattr(copy, name)
+            dst.values, dst.codes = list(src.values), dict(src.codes)
+        copy.ids = list(self.ids)
+        copy.index = dict(self.index)
+        for name in ("amounts", "days", "currency", "category", "payment"):
+            setattr(copy, name, getattr(self, name)[:])
+        copy.alive = bytearray(self.alive)
+        copy._raw_dates = dict(self._raw_dates)
+        copy.dead = self.dead
+        return copy
+
+    def row_values(self, exp_id):
+        """(amount, currency, category, payment, date) for the table."""
+        row = self.index[exp_id]
+        return (format_minor(self.amounts[row]), self.currencies[self.currency[row]],
+                self.categories[self.category[row]], self.payments[self.payment[row]],
+                self.date_str(row))
+
+    def order_by(self, field):
+        """Live ids ordered by a category/payment/currency column (ties in
+        row order): one bucket pass over the codes, no comparison sort."""
+        col = getattr(self, field)
+        interner = {"category": self.categories, "payment": self.payments,
+                    "currency": self.currencies}[field]
+        buckets = [[] for _ in interner.values]
+        for code, exp_id in zip(col, self.ids):
+            if exp_id is not None:
+                buckets[code].append(exp_id)
+        out = []
+        for code in sorted(range(len(buckets)), key=interner.values.__getitem__):
+            out.extend(buckets[code])
+        return out
+
+    def _record(self, row):
+        return {
+            "id": self.ids[row],
+            "amount": format_minor(self.amounts[row]),
+            "currency": self.currencies[self.currency[row]],
+            "category": self.categories[self.category[row]],
+            "payment": self.payments[self.payment[row]],
+            "date": self.date_str(row),
+        }
+
+    def date_str(self, row):
+        day = self.days[row]
+        return date.fromordinal(day).isoformat() if day else self._raw_dates.get(row, "")
+
+    def _encode_date(self, row, date_str):
+        date_str = date_str or ""
+        day = day_ordinal(date_str)
+        if day:
+            self._raw_dates.pop(row, None)
+            return day
+        self._raw_dates[row] = date_str
+        return 0
+
+    # ---------------- mutation ----------------
+    def add(self, rec):
+        exp_id = rec["id"]
+        if exp_id in self.index:
+            self.update(rec)
+            return
+        row = len(self.ids)
+        self.ids.append(exp_id)
+        self.index[exp_id] = row
+        self.amounts.append(to_minor(rec.get("amount", "")))
+        self.days.append(self._encode_date(row, rec.get("date", "")))
+        self.currency.append(self.currencies.code(rec.get("currency", "")))
+        self.category.append(self.categories.code(rec.get("category", "")))
+        self.payment.append(self.payments.code(rec.get("payment", "")))
+        self.alive.append(1)
+
+    def update(self, rec):
+        row = self.index[rec["id"]]
+        self.amounts[row] = to_minor(rec.get("amount", ""))
+        self.days[row] = self._encode_date(row, rec.get("date", ""))
+        self.currency[row] = self.currencies.code(rec.get("currency", ""))
+        self.category[row] = self.categories.code(rec.get("category", ""))
+        self.payment[row] = self.payments.code(rec.get("payment", ""))
+
+    def remove(self, exp_id):
+        """Delete exp_id and return its last record (None if unknown)."""
+        row = self.index.pop(exp_id, None)
+        if row is None:
+            return None
+        rec = self._record(row)
+        self.alive[row] = 0
+        self.ids[row] = None
+        self._raw_dates.pop(row, None)
+        self.dead += 1
+        if self.dead > 1024 and self.dead * 2 > len(self.ids):
+            self.compact()
+        return rec
+
+    def revive(self, row, generation, rec):
+        """Undo a remove(): put rec back in its old row if the rows haven't
+        been renumbered since, else append it."""
+        if generation != self.generation or self.ids[row] is not None or rec["id"] in self.index:
+            self.add(rec)
+            return
+        self.ids[row] = rec["id"]
+        self.index[rec["id"]] = row
+        self.alive[row] = 1
+        self.dead -= 1
+        self.update(rec)
+
+    def clear(self):
+        self._reset()
+
+    def compact(self):
+        """Drop tombstoned rows; rows are renumbered, ids are not."""
+        keep = [row for row, exp_id in enumerate(self.ids) if exp_id is not None]
+        ids, raw = self.ids, self._raw_dates
+        self.amounts = array("q", (self.amounts[r] for r in keep))
+        self.days = array("i", (self.days[r] for r in keep))
+        self.currency = array("H", (self.currency[r] for r in keep))
+        self.category = array("H", (self.category[r] for r in keep))
+        self.payment = array("H", (self.payment[r] for r in keep))
+        self.alive = bytearray(b"\x01" * len(keep))
+        self.ids = [ids[r] for r in keep]
+        self.index = {exp_id: row for row, exp_id in enumerate(self.ids)}
+        self._raw_dates = {new: raw[old] for new, old in enumerate(keep) if old in raw}
+        self.dead = 0
+        self.generation += 1
+
+    # ---------------- aggregation ----------------
+    def bucket_sums(self, exp_ids=None):
+        """{(currency, date string): (minor-unit sum, count)} over live rows,
+        or over just the rows of exp_ids."""
+        np = _numpy()
+        if exp_ids is not None:
+            rows = [self.index[exp_id] for exp_id in exp_ids if exp_id in self.index]
+            raw_rows = [(row, self._raw_dates.get(row, "")) for row in rows if not self.days[row]]
+        else:
+            rows = self.index.values()
+            raw_rows = self._raw_dates.items()
+        if np is not None and self.ids and exp_ids is None:
+            out = self._bucket_sums_numpy(np)
+        else:
+            out = {}
+            for row in rows:
+                if not self.days[row]:
+                    continue
+                key = (self.currency[row], self.days[row])
+                total, count = out.get(key, (0, 0))
+                out[key] = (total + self.amounts[row], count + 1)
+        result = {}
+        for (code, day), (total, count) in out.items():
+            result[(self.currencies[code], date.fromordinal(day).isoformat())] = (total, count)
+        # rows with free-form (or empty) dates are rare; bucket them one by one
+        for row, raw in raw_rows:
+            key = (self.currencies[self.currency[row]], raw)
+            total, count = result.get(key, (0, 0))
+            result[key] = (total + self.amounts[row], count + 1)
+        return result
+
+    def _bucket_sums_numpy(self, np):
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        days = np.frombuffer(self.days, dtype=np.int32)
+        mask = alive & (days > 0)
+        keys = (np.frombuffer(self.currency, dtype=np.uint16)[mask].astype(np.int64) << 32) | days[mask]
+        amounts = np.frombuffer(self.amounts, dtype=np.int64)[mask]
+        return {(int(k >> 32), int(k & 0xFFFFFFFF)): (s, c)
+                for k, s, c in _group_sums(np, keys, amounts)}
+
+    def rollup_sums(self):
+        """{(month, category, payment, currency): (minor-unit sum, count)} over
+        live rows; month is the "YYYY-MM" prefix of the date."""
+        np = _numpy()
+        if np is not None and self.ids:
+            out = self._rollup_sums_numpy(np)
+        else:
+            out = {}
+            months = {}   # day ordinal -> "YYYY-MM"
+            for row in self.index.values():
+                day = self.days[row]
+                if not day:
+                    continue
+                month = months.get(day)
+                if month is None:
+                    month = months[day] = date.fromordinal(day).isoformat()[:7]
+                key = (month, self.category[row], self.payment[row], self.currency[row])
+                total, count = out.get(key, (0, 0))
+                out[key] = (total + self.amounts[row], count + 1)
+        result = {}
+        for (month, cat, pay, cur), (total, count) in out.items():
+            key = (month, self.categories[cat], self.payments[pay], self.currencies[cur])
+            result[key] = (total, count)
+        for row, raw in self._raw_dates.items():
+            key = (raw[:7], self.categories[self.category[row]], self.payments[self.payment[row]],
+                   self.currencies[self.currency[row]])
+            total, count = result.get(key, (0, 0))
+            result[key] = (total + self.amounts[row], count + 1)
+        return result
+
+    def _rollup_sums_numpy(self, np):
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        days = np.frombuffer(self.days, dtype=np.int32)
+        mask = alive & (days > 0)
+        if not mask.any():
+            return {}
+        # month number (year * 12 + month - 1) per distinct day
+        uniq, inverse = np.unique(days[mask], return_inverse=True)
+        month_of = np.array([d.year * 12 + d.month - 1 for d in map(date.fromordinal, uniq.tolist())],
+                            dtype=np.int64)
+        keys = ((month_of[inverse] << 48)
+                | (np.frombuffer(self.category, dtype=np.uint16)[mask].astype(np.int64) << 32)
+                | (np.frombuffer(self.payment, dtype=np.uint16)[mask].astype(np.int64) << 16)
+                | np.frombuffer(self.currency, dtype=np.uint16)[mask].astype(np.int64))
+        amounts = np.frombuffer(self.amounts, dtype=np.int64)[mask]
+        out = {}
+        for k, s, c in _group_sums(np, keys, amounts):
+            m = k >> 48
+            month = f"{m // 12:04d}-{m % 12 + 1:02d}"
+            out[(month, (k >> 32) & 0xFFFF, (k >> 16) & 0xFFFF, k & 0xFFFF)] = (s, c)
+        return out
+
+    def day_sums(self):
+        """{(day ordinal, category, currency): (minor-unit sum, count)} over
+        live rows with a YYYY-MM-DD date."""
+        np = _numpy()
+        if np is not None and self.ids:
+            out = self._day_sums_numpy(np)
+        else:
+            out = {}
+            for row in self.index.values():
+                day = self.days[row]
+                if not day:
+                    continue
+                key = (day, self.category[row], self.currency[row])
+                total, count = out.get(key, (0, 0))
+                out[key] = (total + self.amounts[row], count + 1)
+        return {(day, self.categories[cat], self.currencies[cur]): sums
+                for (day, cat, cur), sums in out.items()}
+
+    def _day_sums_numpy(self, np):
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        days = np.frombuffer(self.days, dtype=np.int32)
+        mask = alive & (days > 0)
+        keys = ((days[mask].astype(np.int64) << 32)
+                | (np.frombuffer(self.category, dtype=np.uint16)[mask].astype(np.int64) << 16)
+                | np.frombuffer(self.currency, dtype=np.uint16)[mask].astype(np.int64))
+        amounts = np.frombuffer(self.amounts, dtype=np.int64)[mask]
+        return {(k >> 32, (k >> 16) & 0xFFFF, k & 0xFFFF): (s, c)
+                for k, s, c in _group_sums(np, keys, amounts)}
+
+
+def _group_sums(np, keys, amounts):
+    """[(key, sum, count)] for int64 key/amount arrays, via one sort."""
+    if not len(keys):
+        return []
+    order = np.argsort(keys, kind="stable")
+    keys, amounts = keys[order], amounts[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sums = np.add.reduceat(amounts, starts)
+    counts = np.diff(np.r_[starts, len(keys)])
+    return [(int(k), int(s), int(c)) for k, s, c in zip(keys[starts], sums, counts)]
@@ -0,0 +1,102 @@
+from decimal import Decimal, InvalidOperation
+from operator import mul
+
+
+def parse_amount(s):
+    """Exact Decimal for an amount string; 0 for anything unparsable."""
+    try:
+        value = Decimal(str(s).strip())
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+    return value if value.is_finite() else Decimal(0)
+
+
+# ============================================================
+# Running totals
+# ============================================================
+class CurrencyTotals:
+    """Exact sums per (currency, date), kept up to date one mutation at a time.
+
+    Converting to the display currency then only touches one number per
+    currency (or per currency and day, when converting at each expense's
+    date) instead of every record in the ledger.
+    """
+
+    def __init__(self):
+        self.sums = {}    # (currency, date) -> Decimal
+        self.counts = {}  # (currency, date) -> number of records
+
+    def add(self, amount, currency, date_str=""):
+        key = (currency, date_str)
+        self.sums[key] = self.sums.get(key, Decimal(0)) + parse_amount(amount)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def add_bucket(self, currency, date_str, amount, count):
+        """Fold in a pre-aggregated bucket (e.g. from ExpenseStore.bucket_sums)."""
+        key = (currency, date_str)
+        self.sums[key] = self.sums.get(key, Decimal(0)) + Decimal(amount)
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def remove_bucket(self, currency, date_str, amount, count):
+        """Take back a bucket folded in with add_bucket()."""
+        key = (currency, date_str)
+        if key not in self.counts:
+            return
+        self.counts[key] -= count
+        if self.counts[key] <= 0:
+            del self.counts[key]
+            del self.sums[key]
+        else:
+            self.sums[key] -= Decimal(amount)
+
+    def remove(self, amount, currency, date_str=""):
+        key = (currency, date_str)
+        if key not in self.counts:
+            return
+        self.counts[key] -= 1
+        if self.counts[key] <= 0:
+            del self.counts[key]
+            del self.sums[key]
+        else:
+            self.sums[key] -= parse_amount(amount)
+
+    def clear(self):
+        self.sums.clear()
+        self.counts.clear()
+
+    def currency_sums(self):
+        """{currency: Decimal} with the dates folded together."""
+        out = {}
+        for (currency, _date), amount in self.sums.items():
+            out[currency] = out.get(currency, Decimal(0)) + amount
+        return out
+
+    def between(self, date_from=None, date_to=None):
+        """A copy holding only the buckets dated date_from..date_to
+        (inclusive YYYY-MM-DD strings; either may be None)."""
+        out = CurrencyTotals()
+        for key, amount in self.sums.items():
+            d = key[1]
+            if len(d) != 10 or (date_from and d < date_from) or (date_to and d > date_to):
+                continue
+            out.sums[key] = amount
+            out.counts[key] = self.counts[key]
+        return out
+
+    def total(self, conversion, by_date=False):
+        """Sum of the buckets converted by a rates.Conversion: one factor
+        per currency, or per (currency, date) if by_date."""
+        if by_date:
+            sums = self.sums
+        else:
+            sums = {(currency, None): amount for currency, amount in self.currency_sums().items()}
+        factors = conversion.factors
+        for key in sums.keys() - factors.keys():
+            conversion.factor(*key)
+        # with every factor known, the sum of products runs in C
+        return sum(map(mul, map(float, sums.values()), map(factors.__getitem__, sums.keys())))
+
+    def total_usd(self, to_usd):
+        """Sum of to_usd(amount, currency) per currency; for callers with
+        their own rate table (Expense_tracker.py) rather than a Conversion."""
+        return sum(to_usd(amount, currency) for currency, amount in self.currency_sums().items())
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from .metrics import metrics
+
+
+# ============================================================
+# Write-behind persistence
+# ============================================================
+# Ledger batches are queued here and written by one worker thread, so
+# the caller never waits on disk. Batches that arrive within `delay`
+# seconds of each other are merged into a single apply_batch() call (one
+# journal append + fsync, or one SQLite transaction); a steady stream of
+# changes is still written at least every `max_delay` seconds.
+# A write that fails is put back at the front of the queue and retried
+# (after `max_delay`, or at once by flush()); last_error keeps the failure
+# until a write of those ops succeeds.
+# on_done(error, op_count) is called on the worker thread after each write.
+class WriteBehind:
+    def __init__(self, storage, delay=0.3, max_delay=None, on_done=None):
+        self.storage = storage
+        self.delay = delay
+        self.max_delay = max_delay if max_delay is not None else delay * 10
+        self.on_done = on_done
+        self._cond = threading.Condition()
+        self._pending = []
+        self._first = 0.0       # when the oldest pending batch arrived
+        self._last = 0.0        # when the newest pending batch arrived
+        self._writing = False
+        self._flushers = 0
+        self._closing = False
+        self._attempts = 0      # writes started
+        self._failed = 0        # number of the last write that failed
+        self._retry_at = 0.0    # no retry before this after a failure
+        self.last_error = None  # why the queued ops could not be written
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, ops):
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("Writer is closed.")
+            now = time.monotonic()
+            if not self._pending:
+                self._first = now
+            self._last = now
+            self._pending.extend(ops)
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending) + (1 if self._writing else 0)
+
+    def flush(self):
+        """Write everything queued so far and wait until it is on disk, or
+        until a write started since fails (see last_error; the ops stay
+        queued)."""
+        with self._cond:
+            self._flushers += 1
+            started = self._attempts
+            self._cond.notify_all()
+            while (self._pending or self._writing) and self._failed <= started:
+                self._cond.wait()
+            self._flushers -= 1
+
+    def close(self, discard=False):
+        """Flush and stop the worker. Ops that still can't be written are
+        dropped (last_error says why); discard=True drops them unwritten."""
+        if not discard:
+            self.flush()
+        with self._cond:
+            self._closing = True
+            if discard:
+                self._pending = []
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _next_ops(self):
+        # called with the lock held; None means shut down
+        while not self._pending:
+            if self._closing:
+                return None
+            self._cond.wait()
+        # debounce: wait for a quiet period unless someone is flushing
+        while not self._flushers and not self._closing:
+            now = time.monotonic()
+            due = max(min(self._last + self.delay, self._first + self.max_delay), self._retry_at)
+            if due <= now:
+                break
+            self._cond.wait(due - now)
+        ops, self._pending = self._pending, []
+        self._writing = True
+        self._attempts += 1
+        return ops
+
+    def _run(self):
+        while True:
+            with self._cond:
+                ops = self._next_ops()
+            if ops is None:
+                return
+            error = None
+            try:
+                with metrics.timer("storage.save"):
+                    self.storage.apply_batch(ops)
+                metrics.incr("storage.saved_ops", len(ops))
+            except Exception as e:
+                error = e
+            with self._cond:
+                if error is None:
+                    self.last_error = None
+                elif not self._closing:
+                    # keep them, ahead of anything queued since
+                    self._pending[:0] = ops
+                    self._first = time.monotonic()
+                    self._retry_at = self._first + self.max_delay
+                    self.last_error = error
+                    self._failed = self._attempts
+                else:
+                    self.last_error = error
+                self._writing = False
+                self._cond.notify_all()
+            if self.on_done is not None:
+                self.on_done(error, len(ops))
@@ -0,0 +1,83 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from expense_core.metrics import metrics
+
+# ============================================================
+# MetricsPanel (debug)
+# ============================================================
+# Opened with F12: per-operation latency (count, mean, p50, p99, max)
+# and counters from expense_core.metrics, refreshed once a second, with
+# buttons to export the snapshot as JSON or start counting afresh.
+REFRESH_MS = 1000
+
+
+class MetricsPanel:
+    def __init__(self, parent, on_close=None):
+        self.on_close = on_close
+
+        top = tk.Toplevel(parent)
+        top.title("Metrics")
+        top.geometry("620x420")
+        top.protocol("WM_DELETE_WINDOW", self.close)
+        self.top = top
+
+        cf = ttk.Frame(top, padding=(10, 10))
+        cf.pack(fill="x")
+        ttk.Button(cf, text="Export JSON...", command=self._export).pack(side="left", padx=5)
+        ttk.Button(cf, text="Reset", command=self._reset).pack(side="left", padx=5)
+
+        tf = ttk.Frame(top, padding=(10, 0, 10, 10))
+        tf.pack(fill="both", expand=True)
+        cols = ("Operation", "Count", "Mean ms", "p50 ms", "p99 ms", "Max ms")
+        tv = ttk.Treeview(tf, columns=cols, show="headings")
+        for c, width in zip(cols, (200, 70, 80, 80, 80, 80)):
+            tv.heading(c, text=c)
+            tv.column(c, width=width, anchor="w" if c == "Operation" else "e")
+        vsb = ttk.Scrollbar(tf, orient="vertical", command=tv.yview)
+        tv.configure(yscrollcommand=vsb.set)
+        vsb.pack(side="right", fill="y")
+        tv.pack(side="left", fill="both", expand=True)
+        tv.tag_configure("counter", foreground="gray25")
+        self.tree = tv
+
+        self._job = None
+        self._render()
+
+    def _render(self):
+        snap = metrics.snapshot()
+        tv = self.tree
+        tv.delete(*tv.get_children())
+        for name, s in snap["operations"].items():
+            tv.insert("", "end", values=(name, s["count"], f"{s['mean_ms']:.2f}", f"{s['p50_ms']:.2f}",
+                                         f"{s['p99_ms']:.2f}", f"{s['max_ms']:.2f}"))
+        for name, n in snap["counters"].items():
+            tv.insert("", "end", values=(name, n, "", "", "", ""), tags=("counter",))
+        self._job = self.top.after(REFRESH_MS, self._render)
+
+    def _export(self):
+        path = filedialog.asksaveasfilename(parent=self.top, defaultextension=".json",
+                                            initialfile="metrics.json",
+                                            filetypes=(("JSON", "*.json"), ("All files", "*")))
+        if not path:
+            return
+        try:
+            metrics.dump(path)
+        except Exception as e:
+            messagebox.showerror("Export failed", str(e), parent=self.top)
+
+    def _reset(self):
+        metrics.reset()
+        self.top.after_cancel(self._job)
+        self._render()
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        if self._job is not None:
+            self.top.after_cancel(self._job)
+        self.top.destroy()
+        if self.on_close is not None:
+            self.on_close()
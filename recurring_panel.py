@@ -0,0 +1,77 @@
+import tkinter as tk
+from tkinter import ttk
+
+# ============================================================
+# RecurringPanel
+# ============================================================
+# A separate window listing the recurring expenses (added from the main
+# form with "Repeat") with their next date, and a button to stop one.
+# Stopping a rule removes its coming (projected) rows; what it already
+# recorded stays in the ledger.
+class RecurringPanel:
+    def __init__(self, parent, ledger, on_close=None):
+        self.ledger = ledger
+        self.on_close = on_close
+        self._refresh_pending = False
+
+        top = tk.Toplevel(parent)
+        top.title("Recurring expenses")
+        top.geometry("640x320")
+        top.protocol("WM_DELETE_WINDOW", self.close)
+        self.top = top
+
+        tf = ttk.Frame(top, padding=(10, 10, 10, 5))
+        tf.pack(fill="both", expand=True)
+        cols = ("Amount", "Currency", "Category", "Payment", "Repeats", "Next")
+        tv = ttk.Treeview(tf, columns=cols, show="headings", selectmode="browse")
+        for c, width in zip(cols, (80, 70, 110, 100, 160, 90)):
+            tv.heading(c, text=c)
+            tv.column(c, width=width, anchor="w" if c == "Repeats" else "center")
+        tv.pack(fill="both", expand=True)
+        self.tree = tv
+
+        bf = ttk.Frame(top, padding=(10, 5, 10, 10))
+        bf.pack(fill="x")
+        ttk.Button(bf, text="Stop Selected", command=self._on_stop).grid(row=0, column=0, padx=5)
+        self.message = ttk.Label(bf, foreground="gray25")
+        self.message.grid(row=0, column=1, sticky="w", padx=5)
+
+        self.refresh()
+
+    def refresh(self):
+        """Re-list the rules on the next idle tick (coalesced)."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.top.after_idle(self._render)
+
+    def _render(self):
+        self._refresh_pending = False
+        tv = self.tree
+        tv.delete(*tv.get_children())
+        rules = sorted(self.ledger.recurring_rules(), key=lambda r: (r["next"] or "9999", r["category"]))
+        for rule in rules:
+            tv.insert("", "end", iid=rule["id"],
+                      values=(rule["amount"], rule["currency"], rule["category"], rule["payment"],
+                              f"{rule['rule']} from {rule['start']}", rule["next"] or "ended"))
+        self.message.config(text="" if rules else "None yet: add an expense with Repeat set.")
+
+    def _on_stop(self):
+        selection = self.tree.selection()
+        if not selection:
+            self.message.config(text="Select a recurring expense to stop.")
+            return
+        try:
+            self.ledger.remove_recurring(selection[0])
+        except Exception as e:
+            self.message.config(text=str(e))
+            return
+        self.refresh()
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        self.top.destroy()
+        if self.on_close is not None:
+            self.on_close()
@@ -0,0 +1,97 @@
+import tkinter as tk
+from tkinter import ttk
+
+# ============================================================
+# ReportPanel
+# ============================================================
+# A separate window with totals in the display currency grouped by
+# month / category / payment / currency over an optional month range.
+# Every query is answered from the ledger's rollups, so refreshing
+# after each change costs O(buckets) regardless of how many expenses
+# there are.
+GROUPINGS = {
+    "Category": ("category",),
+    "Payment": ("payment",),
+    "Currency": ("currency",),
+    "Month": ("month",),
+    "Month x Category": ("month", "category"),
+    "Month x Payment": ("month", "payment"),
+    "Category x Payment": ("category", "payment"),
+}
+
+
+class ReportPanel:
+    def __init__(self, parent, ledger, on_close=None):
+        self.ledger = ledger
+        self.on_close = on_close
+        self._refresh_pending = False
+
+        top = tk.Toplevel(parent)
+        top.title("Reports")
+        top.geometry("560x420")
+        top.protocol("WM_DELETE_WINDOW", self.close)
+        self.top = top
+
+        cf = ttk.Frame(top, padding=(10, 10))
+        cf.pack(fill="x")
+        ttk.Label(cf, text="Group by").grid(row=0, column=0, sticky="w", padx=5)
+        self.group_var = tk.StringVar(value="Category")
+        group = ttk.Combobox(cf, textvariable=self.group_var, values=list(GROUPINGS),
+                             state="readonly", width=18)
+        group.grid(row=0, column=1, padx=5)
+        group.bind("<<ComboboxSelected>>", lambda _e: self.refresh())
+
+        ttk.Label(cf, text="From (YYYY-MM)").grid(row=0, column=2, sticky="w", padx=5)
+        self.from_var = tk.StringVar()
+        ttk.Entry(cf, textvariable=self.from_var, width=9).grid(row=0, column=3, padx=5)
+        ttk.Label(cf, text="To").grid(row=0, column=4, sticky="w", padx=5)
+        self.to_var = tk.StringVar()
+        ttk.Entry(cf, textvariable=self.to_var, width=9).grid(row=0, column=5, padx=5)
+        ttk.Button(cf, text="Apply", command=self.refresh).grid(row=0, column=6, padx=5)
+
+        tf = ttk.Frame(top, padding=(10, 0, 10, 10))
+        tf.pack(fill="both", expand=True)
+        cols = ("Group", "Expenses", "Total")
+        tv = ttk.Treeview(tf, columns=cols, show="headings")
+        for c, width, anchor in zip(cols, (260, 90, 120), ("w", "e", "e")):
+            tv.heading(c, text=c)
+            tv.column(c, width=width, anchor=anchor)
+        vsb = ttk.Scrollbar(tf, orient="vertical", command=tv.yview)
+        tv.configure(yscrollcommand=vsb.set)
+        vsb.pack(side="right", fill="y")
+        tv.pack(side="left", fill="both", expand=True)
+        tv.tag_configure("total", background="yellow", font=("Arial", 11, "bold"))
+        self.tree = tv
+
+        self.refresh()
+
+    def refresh(self):
+        """Re-query the rollups on the next idle tick (coalesced)."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.top.after_idle(self._render)
+
+    def _render(self):
+        self._refresh_pending = False
+        by = GROUPINGS[self.group_var.get()]
+        report = self.ledger.report(by=by, date_from=self.from_var.get().strip() or None,
+                                    date_to=self.to_var.get().strip() or None)
+        tv = self.tree
+        tv.heading("Total", text=self.ledger.display_currency)
+        tv.delete(*tv.get_children())
+        grand_total = total_count = 0
+        for key, (total, count) in sorted(report.items()):
+            label = "  /  ".join(v or "-" for v in key)
+            tv.insert("", "end", values=(label, count, f"{total:.2f}"))
+            grand_total += total
+            total_count += count
+        tv.insert("", "end", values=("TOTAL", total_count, f"{grand_total:.2f}"), tags=("total",))
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        self.top.destroy()
+        if self.on_close is not None:
+            self.on_close()
@@ -0,0 +1,59 @@
+import os
+import random
+import sys
+
+import pytest
+
+# the tests run against the checkout, like the GUI and benchmarks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expense_core import Ledger  # noqa: E402
+from expense_core.rates import RateManager  # noqa: E402
+
+
+@pytest.fixture
+def rate_mgr():
+    """The offline fallback rates: no network, no rate cache file."""
+    rate_mgr = RateManager(store=None)
+    rate_mgr.rates = rate_mgr.fallback.copy()
+    return rate_mgr
+
+
+@pytest.fixture
+def make_ledger(tmp_path, rate_mgr):
+    """make_ledger(backend, **options) -> a Ledger (not opened yet) whose
+    files all live in tmp_path; called again it opens the same files, as a
+    restart would. Every one is closed after the test."""
+    ledgers = []
+
+    def make(backend="journal", **options):
+        options.setdefault("budget_file", str(tmp_path / "budgets.json"))
+        options.setdefault("recurring_file", str(tmp_path / "recurring.json"))
+        ledger = Ledger(backend=backend, data_file=str(tmp_path / "expenses.json"),
+                        db_file=str(tmp_path / "expenses.db"), rate_mgr=rate_mgr, **options)
+        ledgers.append(ledger)
+        return ledger
+
+    yield make
+    for ledger in ledgers:
+        ledger.close()
+
+
+@pytest.fixture
+def filled_ledger(make_ledger):
+    """An open ledger with a few hundred random expenses that have been
+    through edits and deletes, for checking indexes against a plain scan."""
+    rng = random.Random(7)
+    ledger = make_ledger()
+    ledger.open()
+
+    def random_fields():
+        return (f"{rng.randint(0, 500)}.{rng.randint(0, 99):02d}", rng.choice(["USD", "EUR", "GBP", "EGP"]),
+                rng.choice(["Food", "Gas", "Rental", "Grocery"]), rng.choice(["Cash", "Card"]),
+                f"{rng.choice([2023, 2024])}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+
+    ids = [ledger.add(*random_fields()) for _ in range(300)]
+    for exp_id in rng.sample(ids, 60):
+        ledger.edit(exp_id, *random_fields())
+    ledger.delete(rng.sample(ids, 40))
+    return ledger
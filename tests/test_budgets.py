@@ -0,0 +1,95 @@
+import pytest
+
+from expense_core.budgets import MonthlySpend, budget_state
+
+
+@pytest.mark.parametrize("spent, state", [(0, "ok"), (89.99, "ok"), (90, "near"), (100, "near"), (100.01, "over")])
+def test_budget_state(spent, state):
+    assert budget_state(spent, 100) == state
+
+
+def test_status_follows_every_change(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.set_budget("Grocery", "100", "USD")
+    assert ledger.budget_status("Grocery", "2024-03").state == "ok"
+
+    first = ledger.add("60", "USD", "Grocery", "Cash", "2024-03-02")
+    second = ledger.add("35", "USD", "Grocery", "Cash", "2024-03-20")
+    ledger.add("500", "USD", "Rental", "Cash", "2024-03-01")     # other category
+    ledger.add("500", "USD", "Grocery", "Cash", "2024-04-01")    # other month
+    status = ledger.budget_status("Grocery", "2024-03")
+    assert (status.spent, status.limit, status.state) == (pytest.approx(95), pytest.approx(100), "near")
+
+    ledger.edit(second, "45", "USD", "Grocery", "Cash", "2024-03-20")
+    assert ledger.budget_status("Grocery", "2024-03").state == "over"
+    ledger.recategorize([first], "Food")
+    assert ledger.budget_status("Grocery", "2024-03").spent == pytest.approx(45)
+    ledger.delete([second])
+    assert ledger.budget_status("Grocery", "2024-03").spent == 0
+
+    ledger.begin()
+    ledger.add("1000", "USD", "Grocery", "Cash", "2024-03-05")
+    assert ledger.budget_status("Grocery", "2024-03").state == "over"
+    ledger.rollback()
+    assert ledger.budget_status("Grocery", "2024-03").state == "ok"
+
+    # the incremental sums match a rebuild from the rollups
+    def nonzero(sums):
+        return {key: {c: v for c, v in bucket.items() if v} for key, bucket in sums.items() if any(bucket.values())}
+    assert nonzero(ledger.spend.sums) == nonzero(MonthlySpend.from_rollups(ledger.rollups).sums)
+
+
+def test_limits_and_spend_are_converted(make_ledger, rate_mgr):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.set_budget("Food", "92", "EUR")
+    ledger.add("51", "USD", "Food", "Cash", "2024-03-02")
+    ledger.add("46", "EUR", "Food", "Cash", "2024-03-03")
+    in_usd = ledger.budget_status("Food", "2024-03", "USD")
+    assert in_usd.limit == pytest.approx(92 / rate_mgr.rates["EUR"])
+    assert in_usd.spent == pytest.approx(51 + 46 / rate_mgr.rates["EUR"])
+    assert in_usd.state == "over"
+    in_eur = ledger.budget_status("Food", "2024-03", "EUR")
+    assert in_eur.limit == pytest.approx(92)
+    assert in_eur.state == "over"
+
+
+def test_budget_report_and_no_budget(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.set_budget("Rental", "1000", "USD")
+    ledger.set_budget("Gas", "50", "USD")
+    ledger.add("49", "USD", "Gas", "Cash", "2024-03-02")
+    assert [(s.category, s.state) for s in ledger.budget_report("2024-03")] == [("Gas", "near"), ("Rental", "ok")]
+    assert ledger.budget_status("Food", "2024-03") is None
+
+
+def test_limits_are_saved_and_validated(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.set_budget("Grocery", "300", "eur")
+    ledger.set_budget("Gas", "40", "USD")
+    ledger.set_budget("Gas", "")          # removes it
+    with pytest.raises(ValueError):
+        ledger.set_budget("Grocery", "lots")
+    with pytest.raises(ValueError):
+        ledger.set_budget("Grocery", "-5")
+    ledger.close()
+
+    reopened = make_ledger()
+    assert reopened.budget_limits() == {"Grocery": ("300.00", "EUR")}
+
+
+def test_status_of_a_month_still_on_disk(make_ledger):
+    ledger = make_ledger("partitioned")
+    ledger.open()
+    ledger.set_budget("Grocery", "100", "USD")
+    ledger.add("120", "USD", "Grocery", "Cash", "2024-03-02")
+    ledger.close()
+
+    reopened = make_ledger("partitioned")
+    reopened.open(all_months=False)
+    assert "2024-03" in reopened.unloaded
+    assert reopened.budget_status("Grocery", "2024-03").state == "over"
+    assert "2024-03" not in reopened.unloaded
@@ -0,0 +1,100 @@
+import csv
+import json
+import threading
+
+import pytest
+
+from expense_core.exporter import ExportJob, format_for
+
+
+def _ledger(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    for n in range(25):
+        ledger.add(f"{n}.50", ["USD", "EUR", "EGP"][n % 3], "Food" if n % 2 else "Gas", "Cash",
+                   f"2024-03-{n + 1:02d}")
+    return ledger
+
+
+def test_format_for():
+    assert format_for("out.CSV") == "csv"
+    assert format_for("a/b.jsonl") == "ndjson"
+    assert format_for("x.pq") == "parquet"
+    with pytest.raises(ValueError):
+        format_for("out.xlsx")
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "json"])
+def test_exports_every_record(make_ledger, tmp_path, fmt):
+    ledger = _ledger(make_ledger)
+    path = str(tmp_path / f"out.{fmt}")
+    seen = []
+    job = ExportJob(ledger, path, chunk_size=10)
+    assert job.run(progress=lambda job: seen.append(job.count)) == 25
+    assert seen == [10, 20, 25] and job.progress == 1.0
+
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            rows = list(csv.DictReader(f))
+        elif fmt == "ndjson":
+            rows = [json.loads(line) for line in f]
+        else:
+            text = f.read()
+            rows = json.loads(text)
+            assert text == json.dumps(rows, indent=2)
+    assert rows == list(ledger.records())
+    assert not (tmp_path / f"out.{fmt}.part").exists()
+
+
+def test_subset_and_conversions(make_ledger, tmp_path):
+    ledger = _ledger(make_ledger)
+    food = ledger.filter(category="Food")
+    path = str(tmp_path / "food.ndjson")
+    ExportJob(ledger, path, exp_ids=food, convert_to=["usd", "euro"]).run()
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["id"] for row in rows] == food
+    for row in rows:
+        assert float(row["amount_usd"]) == pytest.approx(ledger.rate_mgr.convert(row["amount"], row["currency"]),
+                                                         abs=0.005)
+        assert float(row["amount_eur"]) == pytest.approx(
+            ledger.rate_mgr.convert(row["amount"], row["currency"], "EUR"), abs=0.005)
+
+
+def test_background_export_sees_the_ledger_as_it_was(make_ledger, tmp_path):
+    ledger = _ledger(make_ledger)
+    before = list(ledger.records())
+    path = str(tmp_path / "out.csv")
+    done = threading.Event()
+    job = ExportJob(ledger, path, chunk_size=4)
+    ledger.delete(list(ledger.ids())[:5])
+    ledger.add("1", "USD", "Food", "Cash", "2024-04-01")
+    job.start(on_done=lambda job: done.set())
+    assert done.wait(5) and job.wait(5)
+    assert job.error is None and not job.cancelled
+    with open(path, encoding="utf-8", newline="") as f:
+        assert list(csv.DictReader(f)) == before
+
+
+def test_cancel_leaves_no_file(make_ledger, tmp_path):
+    ledger = _ledger(make_ledger)
+    path = tmp_path / "out.json"
+    job = ExportJob(ledger, str(path), chunk_size=5)
+    job.run(progress=lambda job: job.cancel())
+    assert job.cancelled and job.count == 5
+    assert not path.exists() and not (tmp_path / "out.json.part").exists()
+
+
+def test_parquet(make_ledger, tmp_path):
+    ledger = _ledger(make_ledger)
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        with pytest.raises(RuntimeError, match="pyarrow"):
+            ExportJob(ledger, str(tmp_path / "out.parquet"))
+        return
+    path = str(tmp_path / "out.parquet")
+    ExportJob(ledger, path, convert_to=["USD"], chunk_size=10).run()
+    table = pq.read_table(path)
+    assert table.num_rows == 25
+    assert [str(v) for v in table.column("amount").to_pylist()] == [rec["amount"] for rec in ledger.records()]
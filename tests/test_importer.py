@@ -0,0 +1,140 @@
+import pytest
+
+from expense_core.importer import AmbiguousDates, DateParser, import_statement, parse_amount
+
+HEADER = "Date,Description,Amount,Currency\n"
+
+
+def _statement(tmp_path, name, lines, header=HEADER):
+    path = tmp_path / name
+    path.write_text(header + "".join(line + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def _dates(ledger):
+    return sorted(rec["date"] for rec in ledger.records())
+
+
+def test_import_skips_incoming_money_and_rejects_bad_rows(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    path = _statement(tmp_path, "march.csv", [
+        "2024-03-01,Carrefour Maadi,-45.10,EGP",
+        "2024-03-02,Salary,5000.00,EGP",
+        "2024-03-03,Uber trip,-120.00,EGP",
+        "2024-03-04,Mystery,-abc,EGP",
+        "someday,Shell,-10.00,EGP",
+    ])
+    stats = import_statement(ledger, path)
+    assert (stats.rows, stats.added, stats.skipped, stats.invalid) == (5, 2, 1, 2)
+    assert sorted(rec["amount"] for rec in ledger.records()) == ["120.00", "45.10"]
+    assert {rec["currency"] for rec in ledger.records()} == {"EGP"}
+
+
+def test_reimport_and_overlap_add_nothing_twice(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    first = _statement(tmp_path, "a.csv", [
+        "2024-03-01,Coffee,-3.50,USD",
+        "2024-03-01,Coffee,-3.50,USD",   # two real purchases, same day
+        "2024-03-02,Lunch,-12.00,USD",
+    ])
+    assert import_statement(ledger, first).added == 3
+    again = import_statement(ledger, first)
+    assert (again.added, again.duplicates) == (0, 3)
+
+    overlap = _statement(tmp_path, "b.csv", [
+        "2024-03-02,Lunch,-12.00,USD",
+        "2024-03-03,Dinner,-20.00,USD",
+    ])
+    stats = import_statement(ledger, overlap)
+    assert (stats.added, stats.duplicates) == (1, 1)
+    assert len(ledger) == 4
+
+
+def test_duplicates_are_recognized_after_a_restart(make_ledger, tmp_path):
+    path = _statement(tmp_path, "a.csv", ["2024-03-01,Coffee,-3.50,USD", "2024-04-01,Tea,-2.00,USD"])
+    ledger = make_ledger("partitioned")
+    ledger.open()
+    import_statement(ledger, path)
+    ledger.close()
+
+    reopened = make_ledger("partitioned")
+    reopened.open(all_months=False)
+    assert import_statement(reopened, path).duplicates == 2
+    assert reopened.count() == 2
+
+
+def test_month_first_statement(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    # 03/05 alone could be either; 04/15 can only be month first
+    path = _statement(tmp_path, "us.csv", [
+        "03/05/2024,A,-1.00,USD",
+        "04/01/2024,B,-1.00,USD",
+        "04/15/2024,C,-1.00,USD",
+        "05/02/2024,D,-1.00,USD",
+    ])
+    import_statement(ledger, path)
+    assert _dates(ledger) == ["2024-03-05", "2024-04-01", "2024-04-15", "2024-05-02"]
+
+
+def test_day_first_statement(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    path = _statement(tmp_path, "eu.csv", [
+        "03/05/2024,A,-1.00,USD",
+        "25/05/2024,B,-1.00,USD",
+        "01/06/2024,C,-1.00,USD",
+    ])
+    import_statement(ledger, path)
+    assert _dates(ledger) == ["2024-05-03", "2024-05-25", "2024-06-01"]
+
+
+def test_ambiguous_statement_needs_a_date_format(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    path = _statement(tmp_path, "unclear.csv", ["03/05/2024,A,-1.00,USD", "04/01/2024,B,-1.00,USD"])
+    with pytest.raises(AmbiguousDates) as raised:
+        import_statement(ledger, path)
+    assert raised.value.formats == ("%d/%m/%Y", "%m/%d/%Y")
+    assert len(ledger) == 0
+
+    import_statement(ledger, path, date_format="%m/%d/%Y")
+    assert _dates(ledger) == ["2024-03-05", "2024-04-01"]
+
+
+def test_date_parser_keeps_one_format():
+    parse = DateParser()
+    assert parse("2024-03-05") == "2024-03-05"
+    # the file is ISO: a day-first date doesn't fit it
+    assert parse("05/03/2024") is None
+    assert parse("2024-02-30") is None
+
+
+def test_ofx_statement(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    path = tmp_path / "s.ofx"
+    path.write_text(
+        "OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>EUR\n"
+        "<BANKTRANLIST>\n"
+        "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240310120000<TRNAMT>-9.99<NAME>Netflix</STMTTRN>\n"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240311<TRNAMT>100.00<NAME>Refund</STMTTRN>\n"
+        "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n", encoding="utf-8")
+    stats = import_statement(ledger, str(path))
+    assert (stats.added, stats.skipped) == (1, 1)
+    (rec,) = ledger.records()
+    assert (rec["amount"], rec["currency"], rec["date"]) == ("9.99", "EUR", "2024-03-10")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("-1,234.50", "-1234.50"),
+    ("(12.00)", "-12.00"),
+    ("12,50 EGP", "12.50"),
+    ("$8", "8"),
+    ("abc", None),
+])
+def test_parse_amount(text, expected):
+    value = parse_amount(text)
+    assert (None if value is None else str(value)) == expected
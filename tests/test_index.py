@@ -0,0 +1,60 @@
+import pytest
+
+from expense_core.helpers import normalize_currency
+from expense_core.index import ExpenseIndex
+
+
+def _scan(ledger, category=None, payment=None, currency=None, date="", amount=""):
+    return [rec["id"] for rec in ledger.records()
+            if (not category or rec["category"] == category) and (not payment or rec["payment"] == payment)
+            and (not currency or rec["currency"] == normalize_currency(currency)) and rec["date"].startswith(date)
+            and rec["amount"].startswith(amount)]
+
+
+@pytest.mark.parametrize("filters", [
+    {"category": "Food"},
+    {"category": "Gas", "payment": "Card"},
+    {"currency": "euro"},
+    {"date": "2024"},
+    {"date": "2023-07"},
+    {"category": "Rental", "date": "2024-03"},
+    {"amount": "4"},
+    {"amount": "12."},
+    {"currency": "USD", "amount": "1"},
+    {"category": "Nothing"},
+])
+def test_filter_matches_a_scan(filled_ledger, filters):
+    assert filled_ledger.filter(**filters) == _scan(filled_ledger, **filters)
+
+
+def test_no_filter(filled_ledger):
+    assert filled_ledger.filter() is None
+    assert filled_ledger.filter(category="", date="  ") is None
+
+
+def test_index_follows_mutations(filled_ledger):
+    ledger = filled_ledger
+    assert ledger.filter(category="Gas")   # builds the index
+    new = ledger.add("7.25", "USD", "Charity", "Cash", "2025-06-01")
+    assert ledger.filter(category="Charity", date="2025-06") == [new]
+    ledger.edit(new, "7.25", "USD", "Charity", "Cash", "2025-07-01")
+    assert ledger.filter(date="2025-06") == []
+    assert ledger.filter(date="2025") == [new]
+    ledger.delete([new])
+    assert ledger.filter(category="Charity") == []
+
+    # incremental updates end up where a rebuild does
+    rebuilt = ExpenseIndex.from_store(ledger.expenses)
+    assert rebuilt.fields == ledger.index.fields
+    assert rebuilt.dates == ledger.index.dates
+    assert rebuilt.amounts == ledger.index.amounts
+
+
+def test_date_range(filled_ledger):
+    ledger = filled_ledger
+    expected = [rec["id"] for rec in ledger.records() if "2023-11-15" <= rec["date"] <= "2024-01-31"]
+    assert ledger.filter(date_from="2023-11-15", date_to="2024-01-31") == expected
+    assert ledger.filter(date_from="2024-12-01") == [rec["id"] for rec in ledger.records()
+                                                     if rec["date"] >= "2024-12-01"]
+    with pytest.raises(ValueError):
+        ledger.filter(date_to="2024-13-01")
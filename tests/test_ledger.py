@@ -0,0 +1,108 @@
+import pytest
+
+
+def _state(ledger):
+    """Everything a rollback has to put back, as plain values."""
+    return (sorted(ledger.records(), key=lambda rec: rec["id"]),
+            round(ledger.total(currency="USD"), 6),
+            ledger.report(by="category", in_currency="USD"),
+            ledger.filter(category="Food"),
+            ledger.sorted_ids("date"),
+            ledger.sorted_ids("amount"))
+
+
+def _fill(ledger):
+    a = ledger.add("10", "USD", "Food", "Cash", "2024-03-01")
+    b = ledger.add("20", "EUR", "Rental", "Card", "2024-03-02")
+    c = ledger.add("5", "GBP", "Food", "Cash", "2024-02-15")
+    return a, b, c
+
+
+def test_commit_persists_once_and_notifies_once(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    writes, changes = [], []
+    apply_batch = ledger.storage.apply_batch
+    ledger.storage.apply_batch = lambda ops: (writes.append(list(ops)), apply_batch(ops))
+    ledger.subscribe(changes.append)
+
+    ledger.begin()
+    a, b, c = _fill(ledger)
+    ledger.edit(b, "25", "EUR", "Rental", "Card", "2024-03-02")
+    ledger.delete([c])
+    assert not writes and not changes
+    ledger.commit()
+
+    assert [[op for op, _args in ops] for ops in writes] == [["add", "add", "add", "update", "delete"]]
+    assert len(changes) == 1
+    # c came and went inside the batch; b's edit is part of its add
+    assert list(changes[0].added) == [a, b]
+    assert not changes[0].updated and not changes[0].removed
+
+
+def test_rollback_restores_every_view(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    a, b, c = _fill(ledger)
+    before = _state(ledger)
+
+    ledger.begin()
+    ledger.add("99", "USD", "Food", "Cash", "2024-01-01")
+    ledger.edit(a, "1000", "EGP", "Gas", "Card", "2023-05-05")
+    ledger.delete([b])
+    ledger.recategorize([c], "Gas")
+    assert _state(ledger) != before
+    ledger.rollback()
+
+    assert _state(ledger) == before
+    assert list(ledger.ids()) == [a, b, c]
+
+
+def test_rollback_of_clear(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    _fill(ledger)
+    before = _state(ledger)
+
+    ledger.begin()
+    ledger.clear()
+    ledger.add("1", "USD", "Gas", "Cash", "2024-05-01")
+    ledger.rollback()
+    assert _state(ledger) == before
+
+
+def test_batch_context_rolls_back_on_error(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    kept = ledger.add("1", "USD", "Food", "Cash", "2024-03-01")
+    changes = []
+    ledger.subscribe(changes.append)
+
+    with pytest.raises(KeyError):
+        with ledger.batch():
+            ledger.add("2", "USD", "Food", "Cash", "2024-03-02")
+            ledger.delete([kept])
+            raise KeyError("boom")
+    assert list(ledger.ids()) == [kept]
+    assert not changes
+
+    # delete() and recategorize() join the open batch
+    with ledger.batch():
+        new = ledger.add("3", "USD", "Food", "Cash", "2024-03-03")
+        ledger.recategorize([kept, new], "Gas")
+        ledger.delete([kept])
+    assert len(changes) == 1
+    assert list(changes[0].added) == [new] and changes[0].removed == {kept}
+
+
+def test_batch_misuse_raises(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    with pytest.raises(RuntimeError):
+        ledger.commit()
+    with pytest.raises(RuntimeError):
+        ledger.rollback()
+    ledger.begin()
+    with pytest.raises(RuntimeError):
+        ledger.begin()
+    ledger.rollback()
@@ -0,0 +1,73 @@
+import pytest
+
+from expense_core.rate_store import RateStore
+from expense_core.rates import Conversion, CrossRates, RateManager
+
+RATES = {"USD": 1.0, "EUR": 0.8, "GBP": 0.5, "EGP": 50, "XXX": 0}
+
+
+def test_cross_rates():
+    cross = CrossRates(RATES)
+    assert cross.codes == ["EGP", "EUR", "GBP", "USD"]   # XXX has no rate
+    assert cross.factor("USD", "EUR") == pytest.approx(0.8)
+    assert cross.factor("EUR", "USD") == pytest.approx(1.25)
+    assert cross.factor("GBP", "EUR") == pytest.approx(1.6)
+    assert cross.factor("EGP", "GBP") == pytest.approx(0.01)
+    assert cross.factor("EUR", "EUR") == 1.0
+    assert cross.factor("EUR", "XXX") == 0.0
+    assert cross.factor("JPY", "USD") == 0.0
+    # every pair goes both ways
+    for src in cross.codes:
+        for dst in cross.codes:
+            assert cross.factor(src, dst) * cross.factor(dst, src) == pytest.approx(1.0)
+
+
+def test_rate_manager_converts_between_any_two(rate_mgr):
+    rate_mgr.rates = {"USD": 1.0, "EURO": 0.8, "GBP": 0.5}
+    # "EURO" is normalized; EGP comes from the fallback table
+    assert rate_mgr.convert("10", "euro", "GBP") == pytest.approx(6.25)
+    assert rate_mgr.convert("97", "EGP", "USD") == pytest.approx(2.0)
+    assert rate_mgr.convert("5", "GBP", "gbp") == 5.0
+    assert rate_mgr.convert("oops", "GBP", "USD") == 0.0
+    assert "EGP" in rate_mgr.currencies()
+
+
+def test_historical_rates_by_date(tmp_path):
+    store = RateStore(str(tmp_path / "rates.json"))
+    store.record({"USD": 1.0, "EUR": 0.5}, ts=1_700_000_000)    # 2023-11-14
+    store.record({"USD": 1.0, "EUR": 1.0}, ts=1_710_000_000)    # 2024-03-09
+    rate_mgr = RateManager(store=store)
+    assert rate_mgr.source == "cache"
+    assert rate_mgr.convert("10", "EUR", "USD", "2023-11-01") == pytest.approx(20)
+    assert rate_mgr.convert("10", "EUR", "USD", "2024-06-01") == pytest.approx(10)
+    # no date: the latest table
+    assert rate_mgr.convert("10", "EUR", "USD") == pytest.approx(10)
+
+
+def test_conversion_looks_each_factor_up_once(rate_mgr):
+    conversion = Conversion(rate_mgr, "GBP")
+    calls = []
+    factor = conversion._factor
+    conversion._factor = lambda *args: calls.append(args) or factor(*args)
+    assert conversion("100", "USD") == pytest.approx(79)
+    assert conversion("50", "USD") == pytest.approx(39.5)
+    assert conversion("92", "EUR", "2024-03-01") == pytest.approx(79)
+    assert calls == [("USD", "GBP", None), ("EUR", "GBP", "2024-03-01")]
+
+
+def test_ledger_totals_in_any_currency(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.add("100", "USD", "Food", "Cash", "2024-03-01")
+    ledger.add("92", "EUR", "Food", "Cash", "2024-03-02")
+    ledger.add("97", "EGP", "Gas", "Cash", "2024-03-03")
+    assert ledger.total(currency="USD") == pytest.approx(202)
+    assert ledger.total(currency="EUR") == pytest.approx(185.84)
+    ledger.set_display_currency("euro")
+    assert ledger.total() == pytest.approx(185.84)
+    assert ledger.report(by="category")["Food"][0] == pytest.approx(184)
+
+    # new rates reach the totals once the ledger is told
+    ledger.rate_mgr.rates = {"USD": 1.0, "EUR": 1.0, "EGP": 97}
+    ledger.rates_changed()
+    assert ledger.total() == pytest.approx(193)
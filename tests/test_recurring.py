@@ -0,0 +1,158 @@
+from datetime import date
+from itertools import islice
+
+import pytest
+
+from expense_core.exporter import ExportJob
+from expense_core.recurring import RecurringRule, occurrence_id, parse_rule
+
+TODAY = date(2024, 3, 15)
+
+
+def _rule(start, rule, **kwargs):
+    return RecurringRule("10", "USD", "Rental", "Cash", start, rule, **kwargs)
+
+
+@pytest.mark.parametrize("rule, start, expected", [
+    ("daily", "2024-02-27", ["2024-02-27", "2024-02-28", "2024-02-29", "2024-03-01"]),
+    ("FREQ=DAILY;INTERVAL=10", "2024-01-01", ["2024-01-01", "2024-01-11", "2024-01-21", "2024-01-31"]),
+    ("weekly", "2024-03-01", ["2024-03-01", "2024-03-08", "2024-03-15", "2024-03-22"]),
+    ("FREQ=WEEKLY;BYDAY=MO,TH", "2024-03-01", ["2024-03-04", "2024-03-07", "2024-03-11", "2024-03-14"]),
+    ("monthly", "2024-01-31", ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"]),
+    ("FREQ=MONTHLY;BYMONTHDAY=1,-1", "2024-01-15", ["2024-01-31", "2024-02-01", "2024-02-29", "2024-03-01"]),
+    ("FREQ=MONTHLY;INTERVAL=3", "2024-01-10", ["2024-01-10", "2024-04-10", "2024-07-10", "2024-10-10"]),
+    ("yearly", "2024-02-29", ["2024-02-29", "2025-02-28", "2026-02-28", "2027-02-28"]),
+])
+def test_dates(rule, start, expected):
+    # the generator never ends by itself; take what is needed
+    assert list(islice(_rule(start, rule).dates(), 4)) == expected
+
+
+def test_count_until_and_window():
+    assert list(_rule("2024-01-05", "FREQ=MONTHLY;COUNT=3").dates()) == ["2024-01-05", "2024-02-05", "2024-03-05"]
+    assert list(_rule("2024-01-05", "FREQ=MONTHLY;UNTIL=20240310").dates()) == [
+        "2024-01-05", "2024-02-05", "2024-03-05"]
+    # a window far from the start skips straight to it
+    assert list(_rule("2000-01-01", "daily").dates("2024-03-01", "2024-03-03")) == [
+        "2024-03-01", "2024-03-02", "2024-03-03"]
+    # COUNT counts from the start even when the window starts later
+    assert list(_rule("2024-01-05", "FREQ=MONTHLY;COUNT=3").dates("2024-02-01")) == ["2024-02-05", "2024-03-05"]
+    skipping = _rule("2024-01-05", "monthly", skip=["2024-02-05"])
+    assert list(skipping.dates("2024-01-01", "2024-03-31")) == ["2024-01-05", "2024-03-05"]
+    assert skipping.next_date("2024-01-05") == "2024-03-05"
+
+
+@pytest.mark.parametrize("rule", ["", "hourly", "FREQ=MONTHLY;BYDAY=MO", "FREQ=WEEKLY;BYDAY=XX",
+                                  "FREQ=DAILY;BYMONTHDAY=3", "FREQ=DAILY;INTERVAL=0", "FREQ=DAILY;COUNT=x",
+                                  "FREQ=DAILY;BYSETPOS=1"])
+def test_bad_rules(rule):
+    with pytest.raises(ValueError):
+        parse_rule(rule)
+
+
+def test_occurrence_ids_are_stable():
+    assert occurrence_id("r1", "2024-03-01") == occurrence_id("r1", "2024-03-01")
+    assert occurrence_id("r1", "2024-03-01") != occurrence_id("r1", "2024-03-02")
+    assert occurrence_id("r1", "2024-03-01") != occurrence_id("r2", "2024-03-01")
+
+
+def _saved(ledger):
+    return sorted(rec["date"] for rec in ledger.records(projected=False))
+
+
+def _projected(ledger):
+    return sorted(ledger.get(i)["date"] for i in ledger.projected)
+
+
+def test_due_dates_are_recorded_and_coming_ones_projected(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.add_recurring("10", "USD", "Gas", "Cash", "2024-02-20", "weekly", today=TODAY)
+    assert _saved(ledger) == ["2024-02-20", "2024-02-27", "2024-03-05", "2024-03-12"]
+    assert _projected(ledger) == ["2024-03-19", "2024-03-26", "2024-04-02", "2024-04-09"]
+    # projected rows count like any other in memory
+    assert len(ledger) == 8
+    assert ledger.total(currency="USD") == pytest.approx(80)
+    ledger.close()
+
+    reopened = make_ledger()
+    reopened.open()
+    assert _saved(reopened) == ["2024-02-20", "2024-02-27", "2024-03-05", "2024-03-12"]
+    assert not reopened.projected
+    # the same day again makes nothing new; a week later records one more
+    assert reopened.apply_recurring(today=TODAY) == 0
+    assert reopened.apply_recurring(today=date(2024, 3, 22)) == 1
+    assert _saved(reopened)[-1] == "2024-03-19"
+    assert _projected(reopened)[0] == "2024-03-26"
+    ids = list(reopened.ids())
+    assert len(ids) == len(set(ids))
+
+
+def test_editing_or_deleting_a_projected_row(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    rule_id = ledger.add_recurring("10", "USD", "Gas", "Cash", "2024-03-01", "weekly", today=TODAY)
+    coming = sorted(ledger.projected, key=lambda i: ledger.get(i)["date"])
+    edited, deleted = coming[0], coming[1]
+    edited_date, deleted_date = ledger.get(edited)["date"], ledger.get(deleted)["date"]
+
+    ledger.edit(edited, "12", "USD", "Gas", "Card", edited_date)
+    ledger.delete([deleted])
+    assert edited not in ledger.projected
+    assert deleted not in ledger
+    assert ledger.recurring.get(rule_id).skip == {edited_date, deleted_date}
+    ledger.close()
+
+    reopened = make_ledger()
+    reopened.open()
+    assert reopened.get(edited)["amount"] == "12.00"
+    # due now: the edited row is not made again, the deleted one stays gone
+    reopened.apply_recurring(today=date(2024, 4, 30))
+    dates = _saved(reopened)
+    assert dates.count(edited_date) == 1
+    assert deleted_date not in dates
+
+
+def test_rollback_of_an_apply_makes_the_dates_due_again(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.add_recurring("10", "USD", "Gas", "Cash", "2024-03-01", "weekly", today=date(2024, 2, 1))
+    rule = next(iter(ledger.recurring))
+    ledger.begin()
+    assert ledger.apply_recurring(today=TODAY) == 3
+    ledger.rollback()
+    assert _saved(ledger) == []
+    assert rule.done == "2024-02-01"
+    assert ledger.apply_recurring(today=TODAY) == 3
+
+
+def test_rollback_of_a_projected_delete(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    rule_id = ledger.add_recurring("10", "USD", "Gas", "Cash", "2024-03-01", "weekly", today=TODAY)
+    exp_id = next(iter(ledger.projected))
+    ledger.begin()
+    ledger.delete([exp_id])
+    ledger.rollback()
+    assert exp_id in ledger.projected
+    assert ledger.recurring.get(rule_id).skip == set()
+
+
+def test_removing_a_rule_keeps_its_records(make_ledger):
+    ledger = make_ledger()
+    ledger.open()
+    rule_id = ledger.add_recurring("10", "USD", "Gas", "Cash", "2024-03-01", "weekly", today=TODAY)
+    assert ledger.remove_recurring(rule_id)
+    assert not ledger.projected
+    assert _saved(ledger) == ["2024-03-01", "2024-03-08", "2024-03-15"]
+    assert not ledger.remove_recurring(rule_id)
+    assert ledger.recurring_rules() == []
+
+
+def test_projected_rows_are_not_exported(make_ledger, tmp_path):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.add_recurring("10", "USD", "Gas", "Cash", "2024-03-01", "weekly", today=TODAY)
+    path = tmp_path / "out.ndjson"
+    ExportJob(ledger, str(path)).run()
+    assert len(path.read_text().splitlines()) == 3
@@ -0,0 +1,57 @@
+import pytest
+
+from expense_core.reports import Rollups
+
+
+def _scan(ledger, by, date_from=None, date_to=None, **filters):
+    """What report() should say, from the records one by one."""
+    out = {}
+    for rec in ledger.records():
+        month = rec["date"][:7]
+        if (date_from and month < date_from[:7]) or (date_to and month > date_to[:7]):
+            continue
+        if any(rec[f] != v for f, v in filters.items()):
+            continue
+        values = {"month": month, **rec}
+        group = values[by] if isinstance(by, str) else tuple(values[f] for f in by)
+        total, count = out.get(group, (0.0, 0))
+        out[group] = (total + ledger.rate_mgr.convert(rec["amount"], rec["currency"], "USD"), count + 1)
+    return out
+
+
+def _assert_same(report, expected):
+    assert report.keys() == expected.keys()
+    for group, (total, count) in expected.items():
+        assert report[group] == (pytest.approx(total), count)
+
+
+@pytest.mark.parametrize("by", ["category", "month", ("month", "category"), ("category", "payment", "currency")])
+def test_report_matches_a_scan(filled_ledger, by):
+    _assert_same(filled_ledger.report(by=by, in_currency="USD"), _scan(filled_ledger, by))
+
+
+def test_report_range_and_filters(filled_ledger):
+    _assert_same(filled_ledger.report(by="month", date_from="2023-11-20", date_to="2024-02", in_currency="USD",
+                                      category="Food", currency="EUR"),
+                 _scan(filled_ledger, "month", "2023-11", "2024-02", category="Food", currency="EUR"))
+
+
+def test_rollups_follow_mutations_and_rollback(filled_ledger):
+    ledger = filled_ledger
+    before = ledger.report(by=("month", "payment"), in_currency="USD")
+    ledger.begin()
+    ledger.clear()
+    ledger.add("1", "USD", "Food", "Cash", "2024-01-01")
+    assert ledger.report(by="category", in_currency="USD") == {"Food": (1.0, 1)}
+    ledger.rollback()
+    assert ledger.report(by=("month", "payment"), in_currency="USD") == before
+
+    # a bucket that empties goes away instead of reporting a zero
+    only = ledger.add("2", "USD", "Charity", "Cash", "2030-01-01")
+    ledger.delete([only])
+    assert "Charity" not in ledger.report(by="category")
+
+    rebuilt = Rollups()
+    for rec in ledger.records():
+        rebuilt.add(rec)
+    assert rebuilt.sums == ledger.rollups.sums and rebuilt.counts == ledger.rollups.counts
@@ -0,0 +1,78 @@
+import math
+import random
+from datetime import date
+
+import pytest
+
+from expense_core.series import decimate, period_of
+from expense_core.store import day_ordinal
+
+
+def test_period_of():
+    day = date(2024, 3, 14).toordinal()   # a Thursday
+    assert period_of(day, "day") == day
+    assert date.fromordinal(period_of(day, "week")) == date(2024, 3, 11)
+    assert date.fromordinal(period_of(day, "month")) == date(2024, 3, 1)
+
+
+def test_decimate_keeps_every_spike():
+    rng = random.Random(3)
+    xs = list(range(10_000))
+    ys = [math.sin(x / 300) + rng.random() for x in xs]
+    ys[4321], ys[8000] = 50.0, -50.0
+    out_x, out_y = decimate(xs, ys, 0, 9999, 200)
+    assert len(out_x) <= 400
+    assert out_x == sorted(out_x) and all(ys[x] == y for x, y in zip(out_x, out_y))
+    assert 4321 in out_x and 8000 in out_x
+    # each column's extremes survive
+    step = 9999 / 200
+    for c in range(200):
+        column = [y for x, y in zip(xs, ys) if c * step < x <= (c + 1) * step]
+        kept = [y for x, y in zip(out_x, out_y) if c * step < x <= (c + 1) * step]
+        if column:
+            assert max(kept) == max(column) and min(kept) == min(column)
+
+
+def test_decimate_leaves_sparse_lines_alone():
+    xs, ys = [1, 5, 9], [3.0, 1.0, 2.0]
+    assert decimate(xs, ys, 0, 10, 100) == (xs, ys)
+
+
+def _scan(ledger, step, currency):
+    out = {}
+    for rec in ledger.records():
+        day = day_ordinal(rec["date"])
+        if not day:
+            continue
+        points = out.setdefault(rec["category"], {})
+        period = period_of(day, step)
+        points[period] = points.get(period, 0.0) + ledger.rate_mgr.convert(rec["amount"], rec["currency"], currency)
+    return out
+
+
+def _assert_same(series, expected):
+    # a period emptied by removals stays as a zero point
+    for category in series.keys() | expected.keys():
+        points, want = series.get(category, {}), expected.get(category, {})
+        for period in points.keys() | want.keys():
+            assert points.get(period, 0.0) == pytest.approx(want.get(period, 0.0), abs=1e-6)
+
+
+@pytest.mark.parametrize("step", ["day", "week", "month"])
+def test_series_follow_mutations(filled_ledger, step):
+    ledger = filled_ledger
+    _assert_same(ledger.spend_series(step, "EUR"), _scan(ledger, step, "EUR"))
+
+    new = ledger.add("40", "GBP", "Charity", "Card", "2024-06-09")
+    old = next(iter(ledger.ids()))
+    ledger.edit(old, "1", "USD", "Food", "Cash", "2022-01-01")
+    ledger.delete([list(ledger.ids())[5]])
+    ledger.add("9", "USD", "Gas", "Cash", "not a date")
+    _assert_same(ledger.spend_series(step, "EUR"), _scan(ledger, step, "EUR"))
+    assert ledger.spend_series(step, "EUR")["Charity"] == {
+        period_of(day_ordinal("2024-06-09"), step): pytest.approx(40 / 0.79 * 0.92)}
+    ledger.delete([new])
+    assert not any(ledger.spend_series(step, "EUR")["Charity"].values())
+
+    with pytest.raises(ValueError):
+        ledger.spend_series("year")
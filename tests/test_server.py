@@ -0,0 +1,153 @@
+import json
+import socket
+import threading
+from datetime import date
+
+import pytest
+
+from expense_core.client import RemoteLedger
+from expense_core.server import serve
+
+
+@pytest.fixture
+def start_server(rate_mgr):
+    """start_server(ledger) -> "host:port" of a server for the opened
+    ledger, running on a thread until the test ends."""
+    # the server fetches rates on start; stay offline
+    rate_mgr.fetch = lambda force=False: False
+    running = []
+
+    def start(ledger):
+        ready = threading.Event()
+        thread = threading.Thread(target=serve, args=(ledger, "127.0.0.1", 0),
+                                  kwargs={"ready": lambda server: (running.append(server), ready.set())},
+                                  daemon=True)
+        thread.start()
+        assert ready.wait(5)
+        running[-1].thread = thread
+        return f"127.0.0.1:{running[-1].port}"
+
+    yield start
+    for server in running:
+        server.stop()
+        server.thread.join(5)
+
+
+@pytest.fixture
+def connect():
+    clients = []
+
+    def make(address):
+        client = RemoteLedger(address)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def _request(sock, reader, rid, method, **params):
+    sock.sendall(json.dumps({"id": rid, "method": method, "params": params}).encode() + b"\n")
+    while True:
+        msg = json.loads(reader.readline())
+        if "event" not in msg:
+            return msg
+
+
+def test_line_protocol(make_ledger, start_server):
+    ledger = make_ledger()
+    ledger.open()
+    host, port = start_server(ledger).split(":")
+    with socket.create_connection((host, int(port)), 5) as sock:
+        reader = sock.makefile("rb")
+        added = _request(sock, reader, 1, "add", amount="5", currency="euro", category="Food",
+                         payment="Cash", date="2024-03-01")
+        assert added["id"] == 1 and added["result"] in ledger
+        assert _request(sock, reader, 2, "list") == {
+            "id": 2, "result": [[added["result"], "5.00", "EUR", "Food", "Cash", "2024-03-01"]]}
+
+        assert _request(sock, reader, 3, "nope") == {"id": 3, "error": "Unknown method 'nope'.",
+                                                     "type": "ValueError"}
+        bad = _request(sock, reader, 4, "filter", date_from="March")
+        assert bad["type"] == "ValueError" and "YYYY-MM-DD" in bad["error"]
+        sock.sendall(b"not json\n")
+        assert json.loads(reader.readline())["id"] is None
+        # the connection survives its errors
+        assert _request(sock, reader, 5, "count")["result"] == 1
+
+
+def test_clients_see_each_others_changes(make_ledger, start_server, connect):
+    ledger = make_ledger()
+    ledger.open()
+    ledger.add("10", "USD", "Food", "Cash", "2024-03-01")
+    address = start_server(ledger)
+    alice, bob = connect(address), connect(address)
+    assert alice.open() == bob.open() == 1
+    seen = []
+    bob.subscribe(seen.append)
+
+    first = alice.add("20", "EUR", "Rental", "Card", "2024-03-02")
+    second = alice.add("7", "GBP", "Gas", "Cash", "2024-02-10")
+    alice.edit(first, "25", "EUR", "Rental", "Card", "2024-03-02")
+    alice.delete([second])
+    bob.count()   # a request applies the events that arrived before its answer
+    assert sorted(bob.records(), key=lambda rec: rec["id"]) == \
+        sorted(ledger.records(), key=lambda rec: rec["id"])
+    assert bob.get(first)["amount"] == "25.00"
+    assert second not in bob
+    assert first in {i for changes in seen for i in changes.added}
+
+    # queries are answered by the server's ledger
+    assert bob.total() == pytest.approx(ledger.total(currency=bob.display_currency))
+    food = bob.filter(category="Food")
+    assert list(food) == ledger.filter(category="Food")
+    assert bob.total(food) == pytest.approx(10)
+    assert bob.sorted_ids("amount", descending=True)[0] == first
+    assert bob.report(by=("month", "category"), in_currency="USD") == \
+        ledger.report(by=("month", "category"), in_currency="USD")
+
+    # the ledger's validation errors come back as ValueError
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        bob.filter(date_from="March")
+
+
+def test_projected_rows_are_mirrored_but_not_listed(make_ledger, start_server, connect):
+    ledger = make_ledger()
+    ledger.open()
+    address = start_server(ledger)
+    client = connect(address)
+    client.open()
+    today = date.today()
+    client.add_recurring("9", "USD", "Gym", "Card", today.replace(day=1).isoformat())
+    client.count()
+
+    assert client.projected and client.projected == set(ledger.projected)
+    assert not client.projected & set(client.ids(projected=False))
+    listed = {row[0] for row in client.call("list")}
+    assert listed == set(ledger.ids(projected=False))
+
+
+def test_months_on_disk_are_read_for_a_request(make_ledger, start_server, connect):
+    ledger = make_ledger("partitioned")
+    ledger.open()
+    old = ledger.add("3", "USD", "Food", "Cash", "2020-01-15")
+    ledger.add("4", "USD", "Food", "Cash", date.today().isoformat())
+    ledger.close()
+
+    served = make_ledger("partitioned", save_delay=0.01)
+    served.open(all_months=False)
+    client = connect(start_server(served))
+    assert client.open(all_months=False) == 1
+    assert client.unloaded == ["2020-01"]
+    assert list(client.filter(date_from="2020-01-01", date_to="2020-01-31")) == [old]
+    assert client.unloaded == []
+    assert old in client
+
+    # writes reach the disk once flushed
+    client.delete([old])
+    client.flush()
+    served.close()
+    reopened = make_ledger("partitioned")
+    reopened.open()
+    assert old not in reopened and reopened.count() == 1
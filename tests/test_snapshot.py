@@ -0,0 +1,85 @@
+import json
+import struct
+import uuid
+
+import pytest
+
+from expense_core.snapshot import read_snapshot, store_from_records, write_snapshot
+
+RECORDS = [
+    {"id": str(uuid.uuid4()), "amount": "12.50", "currency": "USD", "category": "Grocery",
+     "payment": "Cash", "date": "2024-03-05"},
+    {"id": "legacy-7", "amount": "-3.10", "currency": "euro", "category": "Café",
+     "payment": "Card", "date": "2024-02-29"},
+    {"id": str(uuid.uuid4()).upper(), "amount": "1000000", "currency": "EGP", "category": "Rental",
+     "payment": "Paypal", "date": "05/03/2024"},
+    {"id": str(uuid.uuid4()), "amount": "0.07", "currency": "GBP", "category": "",
+     "payment": "Cash", "date": ""},
+]
+
+
+def _records(store):
+    return sorted(store.records(), key=lambda rec: rec["id"])
+
+
+def test_round_trip(tmp_path):
+    store = store_from_records(RECORDS)
+    gone = str(uuid.uuid4())
+    store.add({"id": gone, "amount": "5", "currency": "USD", "category": "Gas", "payment": "Cash",
+               "date": "2024-01-01"})
+    store.remove(gone)
+    path = str(tmp_path / "expenses.snap")
+    write_snapshot(path, store)
+
+    loaded = read_snapshot(path)
+    assert _records(loaded) == _records(store)
+    assert list(loaded) == [rec["id"] for rec in RECORDS]
+    assert loaded.get("legacy-7")["currency"] == "EUR"
+    # the non-canonical id and dates come back as written
+    assert RECORDS[2]["id"] in loaded
+    assert loaded.get(RECORDS[2]["id"])["date"] == "05/03/2024"
+    # the sums saved alongside match the rows
+    assert loaded.saved_sums == (store.bucket_sums(), store.rollup_sums())
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "empty.snap")
+    write_snapshot(path, store_from_records([]))
+    assert len(read_snapshot(path)) == 0
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "expenses.snap"
+    path.write_text(json.dumps(RECORDS))
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
+
+    write_snapshot(str(path), store_from_records(RECORDS))
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<H", data, 8, 99)   # version
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="version"):
+        read_snapshot(str(path))
+
+    write_snapshot(str(path), store_from_records(RECORDS))
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError, match="truncated"):
+        read_snapshot(str(path))
+
+
+def test_json_ledger_is_converted_once(make_ledger, tmp_path):
+    legacy = [dict(rec) for rec in RECORDS[:2]] + [{"amount": "4", "currency": "USD", "category": "Gas",
+                                                    "payment": "Cash", "date": "2024-03-01"}]
+    (tmp_path / "expenses.json").write_text(json.dumps(legacy))
+
+    ledger = make_ledger("journal")
+    assert ledger.open() == 3
+    assert (tmp_path / "expenses.snap").exists()
+    assert not (tmp_path / "expenses.json").exists()
+    before = sorted(ledger.records(), key=lambda rec: rec["id"])
+    ledger.close()
+
+    reopened = make_ledger("journal")
+    reopened.open()
+    # the generated id of the record that had none was saved
+    assert sorted(reopened.records(), key=lambda rec: rec["id"]) == before
@@ -0,0 +1,68 @@
+import pytest
+
+from expense_core.index import SortedIndex
+from expense_core.store import day_ordinal
+
+
+def test_sorted_index():
+    index = SortedIndex.build([5, 1, 3, 1, 9], ["e", "a", "c", None, "f"])
+    assert index.ids == ["a", "c", "e", "f"]
+    index.add(3, "d")
+    index.add(1, "b")
+    assert index.ids == ["a", "b", "c", "d", "e", "f"]   # equal keys keep insertion order
+    assert index.range(2, 5) == ["c", "d", "e"]
+    assert index.range(None, 1) == ["a", "b"]
+    assert index.range(6) == ["f"]
+    assert index.range(10) == []
+    index.remove(3, "c")
+    index.remove(3, "zz")   # not there: no-op
+    index.remove(4, "d")    # wrong key: no-op
+    assert index.ids == ["a", "b", "d", "e", "f"] and len(index) == 5
+
+
+def _usd(ledger, rec):
+    return ledger.rate_mgr.convert(rec["amount"], rec["currency"], "USD")
+
+
+def test_sorted_ids_match_a_sort(filled_ledger):
+    ledger = filled_ledger
+    records = list(ledger.records())
+    by_date = [rec["id"] for rec in sorted(records, key=lambda rec: day_ordinal(rec["date"]))]
+    assert ledger.sorted_ids("date") == by_date
+    assert ledger.sorted_ids("date", descending=True) == by_date[::-1]
+    by_amount = ledger.sorted_ids("amount")
+    amounts = [_usd(ledger, ledger.get(i)) for i in by_amount]
+    assert amounts == sorted(amounts) and len(by_amount) == len(records)
+    for column in ("category", "payment", "currency"):
+        assert ledger.sorted_ids(column) == [rec["id"] for rec in sorted(records, key=lambda rec: rec[column])]
+
+    food = ledger.filter(category="Food")
+    assert ledger.sorted_ids("date", exp_ids=food) == [i for i in by_date if i in set(food)]
+
+
+def test_sort_indexes_follow_mutations(filled_ledger):
+    ledger = filled_ledger
+    ledger.sorted_ids("date"), ledger.sorted_ids("amount")   # build both
+    big = ledger.add("100000", "EUR", "Rental", "Cash", "2019-01-01")
+    assert ledger.sorted_ids("date")[0] == big
+    assert ledger.sorted_ids("amount")[-1] == big
+    ledger.edit(big, "0.01", "EUR", "Rental", "Cash", "2030-01-01")
+    assert ledger.sorted_ids("date")[-1] == big
+    assert ledger.sorted_ids("amount")[0] == big
+
+    # new rates swapped in before the ledger hears of it: a delete still
+    # finds the row under the key it was added with
+    ledger.rate_mgr.rates = {"USD": 1.0, "EUR": 0.01, "GBP": 100, "EGP": 1}
+    ledger.delete([big])
+    assert big not in ledger.by_usd.ids
+    ledger.rates_changed()
+    amounts = [_usd(ledger, ledger.get(i)) for i in ledger.sorted_ids("amount")]
+    assert amounts == sorted(amounts)
+
+
+@pytest.mark.parametrize("column", ["date", "amount"])
+def test_date_and_amount_ties_keep_table_order(make_ledger, column):
+    ledger = make_ledger()
+    ledger.open()
+    ids = [ledger.add("5", "USD", "Food", "Cash", "2024-03-01") for _ in range(4)]
+    assert ledger.sorted_ids(column) == ids
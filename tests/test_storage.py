@@ -0,0 +1,126 @@
+import os
+from datetime import date
+
+import pytest
+
+BACKENDS = ["journal", "sqlite", "partitioned"]
+
+
+def _rows(ledger):
+    return sorted(ledger.records(), key=lambda rec: rec["id"])
+
+
+def _fill(ledger):
+    keep = ledger.add("12.50", "USD", "Grocery", "Cash", "2024-03-05")
+    edited = ledger.add("7", "EUR", "Food", "Card", "2024-03-06")
+    gone = ledger.add("100", "EGP", "Rental", "Cash", "2024-02-01")
+    ledger.edit(edited, "8.25", "EUR", "Food", "Card", "2024-04-01")
+    ledger.delete([gone])
+    with ledger.batch():
+        ledger.add("3", "GBP", "Gas", "Card", "2023-12-31")
+        ledger.recategorize([keep], "Food")
+    return keep, edited, gone
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_reopen_round_trip(make_ledger, backend):
+    ledger = make_ledger(backend)
+    ledger.open()
+    keep, edited, gone = _fill(ledger)
+    before, total = _rows(ledger), ledger.total()
+    ledger.close()
+
+    reopened = make_ledger(backend)
+    assert reopened.open() == 3
+    assert _rows(reopened) == before
+    assert reopened.get(keep)["category"] == "Food"
+    assert reopened.get(edited)["amount"] == "8.25"
+    assert gone not in reopened
+    assert reopened.total() == pytest.approx(total)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_rollback_is_not_persisted(make_ledger, backend):
+    ledger = make_ledger(backend)
+    ledger.open()
+    kept = ledger.add("1", "USD", "Food", "Cash", "2024-01-01")
+    ledger.begin()
+    ledger.add("2", "USD", "Food", "Cash", "2024-01-02")
+    ledger.delete([kept])
+    ledger.rollback()
+    ledger.close()
+
+    reopened = make_ledger(backend)
+    reopened.open()
+    assert list(reopened.ids()) == [kept]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_clear_then_add_survives_reopen(make_ledger, backend):
+    ledger = make_ledger(backend)
+    ledger.open()
+    _fill(ledger)
+    ledger.clear()
+    new = ledger.add("4", "USD", "Gas", "Cash", "2024-05-05")
+    ledger.close()
+
+    reopened = make_ledger(backend)
+    reopened.open()
+    assert list(reopened.ids()) == [new]
+
+
+def test_sqlite_migrates_the_json_ledger(make_ledger):
+    journal = make_ledger("journal")
+    journal.open()
+    _fill(journal)
+    before = _rows(journal)
+    journal.close()
+
+    sqlite = make_ledger("sqlite")
+    sqlite.open()
+    assert _rows(sqlite) == before
+
+
+def test_partitioned_loads_old_months_lazily(make_ledger):
+    ledger = make_ledger("partitioned")
+    ledger.open()
+    _fill(ledger)
+    recent = ledger.add("9", "USD", "Food", "Cash", date.today().isoformat())
+    before, total = _rows(ledger), ledger.total()
+    ledger.close()
+
+    reopened = make_ledger("partitioned")
+    assert reopened.open(all_months=False) == 1
+    assert list(reopened.ids()) == [recent]
+    assert sorted(reopened.unloaded) == ["2023-12", "2024-03", "2024-04"]
+    # counts and totals include the months still on disk
+    assert reopened.count() == 4
+    assert reopened.total() == pytest.approx(total)
+
+    # a date range only brings in the months it reaches
+    assert len(reopened.filter(date_from="2024-03-01", date_to="2024-03-31")) == 1
+    assert sorted(reopened.unloaded) == ["2023-12", "2024-04"]
+
+    reopened.load_partitions()
+    assert not reopened.unloaded
+    assert _rows(reopened) == before
+    assert reopened.total() == pytest.approx(total)
+
+
+def test_partitioned_recounts_a_month_left_in_a_rotated_journal(make_ledger, tmp_path):
+    ledger = make_ledger("partitioned")
+    ledger.open()
+    exp_id = ledger.add("5", "USD", "Food", "Cash", "2024-03-05")
+    ledger.close()
+
+    # compaction interrupted after rotating the journal, manifest not rewritten
+    directory = tmp_path / "expenses_by_month"
+    os.replace(directory / "2024-03.journal", directory / "2024-03.journal.old")
+    os.remove(directory / "manifest.json")
+
+    reopened = make_ledger("partitioned")
+    reopened.open(all_months=False)
+    assert sorted(reopened.unloaded) == ["2024-03"]
+    assert reopened.total() == pytest.approx(5)
+    reopened.load_partitions()
+    assert list(reopened.ids()) == [exp_id]
@@ -0,0 +1,103 @@
+import pytest
+
+from expense_core.writer import WriteBehind
+
+
+class FlakyStorage:
+    """apply_batch() fails the first `failures` times, then records the ops."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.ops = []
+
+    def apply_batch(self, ops):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.ops.extend(ops)
+
+
+def test_batches_are_merged_and_flushed():
+    storage = FlakyStorage()
+    writer = WriteBehind(storage, delay=10)
+    writer.submit([1, 2])
+    writer.submit([3])
+    writer.flush()
+    assert storage.ops == [1, 2, 3]
+    assert writer.pending() == 0
+    writer.close()
+
+
+def test_failed_write_is_kept_and_retried():
+    storage = FlakyStorage(failures=2)
+    outcomes = []
+    writer = WriteBehind(storage, delay=10, on_done=lambda error, count: outcomes.append((error, count)))
+    writer.submit([1, 2])
+    for _attempt in range(3):
+        writer.flush()
+        if writer.last_error is None:
+            break
+    writer.submit([3])
+    writer.close()
+    # nothing lost, nothing written twice
+    assert storage.ops == [1, 2, 3]
+    assert [(error is None, count) for error, count in outcomes] == [
+        (False, 2), (False, 2), (True, 2), (True, 1)]
+
+
+def test_flush_returns_while_the_disk_keeps_failing():
+    storage = FlakyStorage(failures=10 ** 6)
+    writer = WriteBehind(storage, delay=10)
+    writer.submit([1])
+    writer.flush()
+    assert isinstance(writer.last_error, OSError)
+    assert writer.pending() == 1
+    writer.close(discard=True)
+    assert storage.ops == []
+
+
+def test_background_writes_reach_disk_on_close(make_ledger):
+    ledger = make_ledger("journal", save_delay=0.05)
+    ledger.open()
+    ids = [ledger.add(str(i), "USD", "Food", "Cash", f"2024-01-{i:02d}") for i in range(1, 21)]
+    ledger.close()
+
+    reopened = make_ledger("journal")
+    reopened.open()
+    assert sorted(reopened.ids()) == sorted(ids)
+
+
+def test_close_stays_open_until_the_write_succeeds(make_ledger):
+    ledger = make_ledger("journal", save_delay=0.05)
+    ledger.open()
+    apply_batch = ledger.storage.apply_batch
+    failures = [2]
+
+    def flaky(ops):
+        if failures[0]:
+            failures[0] -= 1
+            raise OSError("disk full")
+        apply_batch(ops)
+
+    ledger.storage.apply_batch = flaky
+    first = ledger.add("1", "USD", "Food", "Cash", "2024-01-01")
+    with pytest.raises(OSError):
+        ledger.close()
+    assert ledger.writer is not None and ledger.storage is not None
+    second = ledger.add("2", "USD", "Food", "Cash", "2024-01-02")
+    ledger.close()
+
+    reopened = make_ledger("journal")
+    reopened.open()
+    assert sorted(reopened.ids()) == sorted([first, second])
+
+
+def test_close_discard_drops_what_cannot_be_written(make_ledger):
+    ledger = make_ledger("journal", save_delay=0.05)
+    ledger.open()
+    ledger.storage.apply_batch = FlakyStorage(failures=10 ** 6).apply_batch
+    ledger.add("1", "USD", "Food", "Cash", "2024-01-01")
+    with pytest.raises(OSError):
+        ledger.close()
+    ledger.close(discard=True)
+    assert ledger.storage is None
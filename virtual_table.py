@@ -0,0 +1,256 @@
+from tkinter import ttk
+
+from expense_core.metrics import metrics
+
+# ============================================================
+# VirtualTable
+# ============================================================
+# A ttk.Treeview only ever holds the rows that fit on screen (plus a
+# small buffer). The full ordering lives in self.ids; each visible
+# Treeview item is a reusable "slot" that is re-filled on scroll.
+# Callers work with expense ids only, never with Treeview iids.
+ROW_BUFFER = 3
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+
+class VirtualTable:
+    def __init__(self, parent, columns, row_values, height=10, sort_command=None, end_command=None,
+                 row_tags=None):
+        """row_values(exp_id) -> tuple of column values for that row;
+        sort_command(column), if given, is called on a header click;
+        end_command(), if given, once the last row is on screen (to append more);
+        row_tags(exp_id, values), if given, -> Treeview tags of that row."""
+        self.row_values = row_values
+        self.row_tags = row_tags
+        self.columns = columns
+        self.end_command = end_command
+        self.ids = []             # display order
+        self._positions = {}      # expense id -> index in self.ids (None: rebuild on use)
+        self.offset = 0           # index of the first visible row
+        self.visible_rows = height
+        self._slots = []          # Treeview iids currently materialized
+        self._slot_ids = {}       # Treeview iid -> expense id
+        self._slot_rows = {}      # Treeview iid -> index in self._slots
+        self._selected = {}       # ordered set of selected expense ids
+        self._render_pending = False
+
+        frame = ttk.Frame(parent)
+        frame.pack(fill="both", expand=True)
+        self.frame = frame
+
+        body = ttk.Frame(frame)
+        body.pack(fill="both", expand=True)
+
+        tv = ttk.Treeview(body, columns=columns, show="headings", height=height)
+        for c in columns:
+            if sort_command is not None:
+                tv.heading(c, text=c, command=lambda c=c: sort_command(c))
+            else:
+                tv.heading(c, text=c)
+            tv.column(c, width=150, anchor="center")
+        self.tree = tv
+
+        # the scrollbar tracks our offset, not the Treeview's own view
+        vsb = ttk.Scrollbar(body, orient="vertical", command=self._on_scrollbar)
+        vsb.pack(side="right", fill="y")
+        tv.pack(side="left", fill="both", expand=True)
+        self.scrollbar = vsb
+
+        # one-row footer pinned under the table (used for the TOTAL row)
+        footer = ttk.Treeview(frame, columns=columns, show="", height=1, selectmode="none")
+        for c in columns:
+            footer.column(c, width=150, anchor="center")
+        footer.pack(fill="x")
+        self.footer = footer
+        self._footer_iid = None
+
+        tv.bind("<Configure>", self._on_configure)
+        tv.bind("<ButtonPress-1>", self._on_button_press, add="+")
+        tv.bind("<<TreeviewSelect>>", self._on_tree_select)
+        tv.bind("<MouseWheel>", self._on_mousewheel)
+        tv.bind("<Button-4>", lambda _e: self._scroll_by(-3))
+        tv.bind("<Button-5>", lambda _e: self._scroll_by(3))
+        tv.bind("<Up>", lambda _e: self._on_arrow(-1))
+        tv.bind("<Down>", lambda _e: self._on_arrow(1))
+        tv.bind("<Prior>", lambda _e: self._scroll_by(-self.visible_rows))
+        tv.bind("<Next>", lambda _e: self._scroll_by(self.visible_rows))
+
+    # ---------------- data ----------------
+    def set_ids(self, ids):
+        self.ids = list(ids)
+        self._positions = None
+        if self._selected:
+            keep = set(self.ids)
+            self._selected = {i: None for i in self._selected if i in keep}
+        self._clamp_offset()
+        self.refresh()
+
+    def extend(self, exp_ids):
+        positions = self._positions
+        for exp_id in exp_ids:
+            if positions is not None:
+                positions[exp_id] = len(self.ids)
+            self.ids.append(exp_id)
+        self.refresh()
+
+    def remove(self, exp_ids):
+        exp_ids = set(exp_ids)
+        if len(exp_ids) == 1:
+            (exp_id,) = exp_ids
+            if exp_id in self.ids:
+                self.ids.remove(exp_id)
+        elif exp_ids:
+            self.ids = [i for i in self.ids if i not in exp_ids]
+        self._positions = None
+        for exp_id in exp_ids:
+            self._selected.pop(exp_id, None)
+        self._clamp_offset()
+        self.refresh()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------- selection ----------------
+    def selection(self):
+        """Selected expense ids, including rows scrolled out of view."""
+        return list(self._selected)
+
+    def id_at(self, y):
+        """Expense id of the row under pixel y, or None."""
+        return self._slot_ids.get(self.tree.identify_row(y))
+
+    def _on_button_press(self, evt):
+        # a plain click replaces the selection, including off-screen rows;
+        # Shift/Control clicks extend it
+        if evt.state & (SHIFT_MASK | CONTROL_MASK):
+            return
+        if self.tree.identify_region(evt.x, evt.y) == "cell":
+            self._selected = {}
+
+    def _on_tree_select(self, _evt):
+        # mirror the on-screen selection into self._selected
+        chosen = set(self.tree.selection())
+        for iid, exp_id in self._slot_ids.items():
+            if iid in chosen:
+                self._selected[exp_id] = None
+            else:
+                self._selected.pop(exp_id, None)
+
+    def mark_sorted(self, column, descending=False):
+        """Show a sort arrow on column (None clears it)."""
+        for c in self.columns:
+            arrow = (" \u25bc" if descending else " \u25b2") if c == column else ""
+            self.tree.heading(c, text=c + arrow)
+
+    # ---------------- footer ----------------
+    def set_footer(self, values, tags=()):
+        if self._footer_iid is None:
+            self._footer_iid = self.footer.insert("", "end", values=values, tags=tags)
+        else:
+            self.footer.item(self._footer_iid, values=values, tags=tags)
+
+    # ---------------- scrolling ----------------
+    def _clamp_offset(self):
+        max_offset = max(0, len(self.ids) - self.visible_rows)
+        self.offset = min(max(0, self.offset), max_offset)
+
+    def _scroll_to(self, offset):
+        old = self.offset
+        self.offset = offset
+        self._clamp_offset()
+        if self.offset != old:
+            self.refresh()
+        return "break"
+
+    def _scroll_by(self, rows):
+        return self._scroll_to(self.offset + rows)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(float(value) * len(self.ids)))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self._scroll_by(int(value) * step)
+
+    def _on_mousewheel(self, evt):
+        return self._scroll_by(-3 if evt.delta > 0 else 3)
+
+    def _on_arrow(self, step):
+        focus = self.tree.focus()
+        index = self._slot_rows.get(focus)
+        if index is None:
+            return None
+        last = min(self.visible_rows, len(self._slots)) - 1
+        if (step < 0 and index > 0) or (step > 0 and index < last):
+            # let the Treeview move within the page
+            self._selected = {}
+            return None
+        # at the edge of the page: scroll and keep the cursor on the edge row
+        target = self.offset + index + step
+        if not 0 <= target < len(self.ids):
+            return "break"
+        self._selected = {self.ids[target]: None}
+        self._scroll_by(step)
+        self.refresh()
+        self.tree.focus(self._slots[index])
+        return "break"
+
+    def see(self, exp_id):
+        """Scroll so exp_id is on screen."""
+        if self._positions is None:
+            self._positions = {i: n for n, i in enumerate(self.ids)}
+        index = self._positions.get(exp_id)
+        if index is None:
+            return
+        if not self.offset <= index < self.offset + self.visible_rows:
+            self._scroll_to(index - self.visible_rows // 2)
+
+    def _on_configure(self, evt):
+        style = ttk.Style()
+        row_height = int(style.lookup("Treeview", "rowheight") or 20)
+        # minus the heading row
+        rows = max(1, (evt.height - row_height - 4) // row_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self._clamp_offset()
+            self.refresh()
+
+    # ---------------- rendering ----------------
+    def refresh(self):
+        """Re-render the visible rows on the next idle tick (coalesced)."""
+        if not self._render_pending:
+            self._render_pending = True
+            self.tree.after_idle(self._render)
+
+    @metrics.timed("table.render")
+    def _render(self):
+        self._render_pending = False
+        window = self.ids[self.offset:self.offset + self.visible_rows + ROW_BUFFER]
+        tv = self.tree
+        while len(self._slots) < len(window):
+            self._slots.append(tv.insert("", "end"))
+        while len(self._slots) > len(window):
+            tv.delete(self._slots.pop())
+        self._slot_ids = {}
+        self._slot_rows = {}
+        selected = []
+        row_tags = self.row_tags
+        for n, (iid, exp_id) in enumerate(zip(self._slots, window)):
+            values = self.row_values(exp_id)
+            tv.item(iid, values=values, tags=row_tags(exp_id, values) if row_tags is not None else ())
+            self._slot_ids[iid] = exp_id
+            self._slot_rows[iid] = n
+            if exp_id in self._selected:
+                selected.append(iid)
+        tv.selection_set(selected)
+        self._update_scrollbar()
+        if self.end_command is not None and self.offset + self.visible_rows >= len(self.ids):
+            tv.after_idle(self.end_command)
+
+    def _update_scrollbar(self):
+        n = len(self.ids)
+        if n == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        self.scrollbar.set(self.offset / n, min(1.0, (self.offset + self.visible_rows) / n))